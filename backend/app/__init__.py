@@ -2,19 +2,38 @@ from flask import Flask
 from flask_cors import CORS
 from flask_socketio import SocketIO
 from flask_sqlalchemy import SQLAlchemy
+from flask_caching import Cache
 from celery import Celery
 
 from app.config import get_config
+from app.json_request import OrjsonRequest
 
 # 拡張機能の初期化
 db = SQLAlchemy()
 socketio = SocketIO()
 celery = Celery()
+cache = Cache()
+
+# 登録するBlueprint: (モジュール名, 属性名, URLプレフィックス)
+# URLプレフィックスがNoneの場合はBlueprint側の定義を使用
+BLUEPRINTS = (
+    ('app.api.agents', 'agents_bp', '/api/agents'),
+    ('app.api.agents_async', 'agents_async_bp', '/api/async/agents'),
+    ('app.api.tasks', 'tasks_bp', '/api/tasks'),
+    ('app.api.teams', 'teams_bp', '/api/teams'),
+    ('app.api.tools', 'tools_bp', '/api/tools'),
+    ('app.api.settings', 'settings_bp', '/api/settings'),
+    ('app.api.task_analysis', 'task_analysis_bp', '/api/task-analysis'),
+    ('app.api.approvals', 'approvals_bp', '/api/approvals'),
+    ('app.api.task_interactions', 'bp', None),
+)
 
 
 def create_app(config_name=None):
     """Flaskアプリケーションファクトリ"""
     app = Flask(__name__)
+    # request.get_json() をorjsonで解析
+    app.request_class = OrjsonRequest
     
     # 設定の読み込み
     if config_name is None:
@@ -27,21 +46,36 @@ def create_app(config_name=None):
     
     # 拡張機能の初期化
     db.init_app(app)
+    cache.init_app(app)
     CORS(app, origins=app.config['CORS_ORIGINS'])
     socketio.init_app(
         app,
         cors_allowed_origins=app.config['SOCKETIO_CORS_ALLOWED_ORIGINS'],
         async_mode=app.config['SOCKETIO_ASYNC_MODE'],
-        logger=True,
-        engineio_logger=True,
-        ping_timeout=60,
-        ping_interval=25
+        logger=app.config.get('SOCKETIO_LOGGER', app.debug),
+        engineio_logger=app.config.get('SOCKETIO_ENGINEIO_LOGGER', app.debug),
+        ping_timeout=app.config.get('SOCKETIO_PING_TIMEOUT', 60),
+        ping_interval=app.config.get('SOCKETIO_PING_INTERVAL', 25),
+        message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE')
     )
     
     # Celeryの設定
     celery.conf.update(
         broker_url=app.config['CELERY_BROKER_URL'],
-        result_backend=app.config['CELERY_RESULT_BACKEND']
+        result_backend=app.config['CELERY_RESULT_BACKEND'],
+        # 長時間タスクが後続タスクを抱え込まないよう1件ずつ取得し、完了後にACK
+        worker_prefetch_multiplier=app.config.get('CELERY_PREFETCH_MULTIPLIER', 1),
+        task_acks_late=True,
+        broker_pool_limit=app.config.get('CELERY_BROKER_POOL_LIMIT', 50),
+        broker_connection_retry_on_startup=True,
+        task_default_queue='default',
+        task_routes={
+            'app.run_task': {'queue': 'task_execution'},
+            'app.resume_task': {'queue': 'task_execution'}
+        },
+        broker_transport_options={
+            'visibility_timeout': app.config.get('CELERY_VISIBILITY_TIMEOUT', 5400)
+        }
     )
     
     # ログ設定
@@ -53,11 +87,12 @@ def create_app(config_name=None):
     # WebSocketイベントハンドラの登録
     register_socketio_events()
     
-    # データベースの初期化
-    with app.app_context():
-        # モデルをインポート（db.create_all()の直前）
-        from app.models import agent, task, team, tool, execution_log, llm_setting, tool_approval, task_interaction  # noqa: F401
-        db.create_all()
+    # データベースの初期化（本番環境ではsetup.py / マイグレーションで管理）
+    if app.config.get('AUTO_CREATE_TABLES', False):
+        with app.app_context():
+            # モデルをインポート（app.modelsが全モデルを読み込む）
+            from app import models  # noqa: F401
+            db.create_all()
     
     # エラーハンドラーの登録
     register_error_handlers(app)
@@ -73,35 +108,30 @@ def register_error_handlers(app):
     @app.errorhandler(Exception)
     def handle_exception(e):
         """全ての例外をキャッチして詳細を出力"""
-        app.logger.error(f"Unhandled exception: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        # logger.exceptionがトレースバックを付けて記録する
+        app.logger.exception("Unhandled exception: %s", e)
         
-        return jsonify({
+        response = {
             'success': False,
-            'error': str(e),
-            'traceback': traceback.format_exc()
-        }), 500
+            'error': str(e)
+        }
+        # トレースバックはデバッグ時のみレスポンスに含める
+        if app.config.get('DEBUG') or app.config.get('INCLUDE_TRACEBACK_IN_RESPONSE'):
+            response['traceback'] = traceback.format_exc()
+        
+        return jsonify(response), 500
 
 
 def register_blueprints(app):
     """Blueprintの登録"""
-    from app.api.agents import agents_bp
-    from app.api.tasks import tasks_bp
-    from app.api.teams import teams_bp
-    from app.api.tools import tools_bp
-    from app.api.settings import settings_bp
-    from app.api.task_analysis import task_analysis_bp
-    from app.api.approvals import approvals_bp
-    from app.api.task_interactions import bp as task_interactions_bp
-    
-    app.register_blueprint(agents_bp, url_prefix='/api/agents')
-    app.register_blueprint(tasks_bp, url_prefix='/api/tasks')
-    app.register_blueprint(teams_bp, url_prefix='/api/teams')
-    app.register_blueprint(tools_bp, url_prefix='/api/tools')
-    app.register_blueprint(settings_bp, url_prefix='/api/settings')
-    app.register_blueprint(task_analysis_bp, url_prefix='/api/task-analysis')
-    app.register_blueprint(approvals_bp, url_prefix='/api/approvals')
-    app.register_blueprint(task_interactions_bp)
+    from importlib import import_module
+    
+    for module_name, attr_name, url_prefix in BLUEPRINTS:
+        blueprint = getattr(import_module(module_name), attr_name)
+        if url_prefix:
+            app.register_blueprint(blueprint, url_prefix=url_prefix)
+        else:
+            app.register_blueprint(blueprint)
 
 
 def register_socketio_events():
@@ -111,9 +141,14 @@ def register_socketio_events():
 
 def setup_logging(app):
     """ログ設定"""
+    import atexit
     import logging
     import os
-    from logging.handlers import RotatingFileHandler
+    from app.log_handlers import FastRotatingFileHandler, PeriodicFlushMemoryHandler
+    
+    # バックグラウンド実行ごとにcreate_appが呼ばれるため、ハンドラの重複登録を防ぐ
+    if any(isinstance(h, PeriodicFlushMemoryHandler) for h in app.logger.handlers):
+        return
     
     # ログディレクトリの作成
     log_dir = os.path.dirname(app.config['LOG_FILE'])
@@ -124,7 +159,7 @@ def setup_logging(app):
     log_level = getattr(logging, app.config['LOG_LEVEL'].upper(), logging.INFO)
     
     # ファイルハンドラの設定
-    file_handler = RotatingFileHandler(
+    file_handler = FastRotatingFileHandler(
         app.config['LOG_FILE'],
         maxBytes=10485760,  # 10MB
         backupCount=10
@@ -134,6 +169,16 @@ def setup_logging(app):
         '[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
     ))
     
+    # ファイル出力はバッファリングし、ERROR以上または一定間隔でフラッシュ
+    buffered_handler = PeriodicFlushMemoryHandler(
+        capacity=app.config['LOG_BUFFER_CAPACITY'],
+        flushLevel=logging.ERROR,
+        target=file_handler,
+        flushOnClose=True,
+        flush_interval=app.config['LOG_FLUSH_INTERVAL']
+    )
+    atexit.register(buffered_handler.close)
+    
     # コンソールハンドラの設定
     console_handler = logging.StreamHandler()
     console_handler.setLevel(log_level)
@@ -142,7 +187,7 @@ def setup_logging(app):
     ))
     
     # ロガーの設定
-    app.logger.addHandler(file_handler)
+    app.logger.addHandler(buffered_handler)
     app.logger.addHandler(console_handler)
     app.logger.setLevel(log_level)
     
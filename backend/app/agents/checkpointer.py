@@ -0,0 +1,61 @@
+"""
+LangGraphチェックポイント用SqliteSaverの共有管理
+
+SqliteSaverは内部でロックを持ちスレッド間で共有できるため、
+DBファイルごとに長寿命の接続を1本だけ開いて使い回します。
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# デフォルト: backend/app/data/agent_memory.db
+DEFAULT_CHECKPOINT_DB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "data", "agent_memory.db"
+)
+
+_checkpointers: Dict[str, SqliteSaver] = {}
+_lock = threading.Lock()
+
+
+def tune_sqlite(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """
+    チェックポイント書き込み向けにSQLite接続を調整
+
+    WALで読み書きを並行させ、fsyncはWALのチェックポイント時のみに抑えます。
+    WALのチェックポイントはSQLiteの自動（PASSIVE）に任せます。
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=1073741824")  # 1GB
+    conn.execute("PRAGMA cache_size=-65536")  # 64MB
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def get_checkpointer(db_path: str | None = None) -> SqliteSaver:
+    """
+    DBファイルごとに共有されるSqliteSaverを取得
+
+    Args:
+        db_path: SQLiteデータベースファイルのパス（Noneの場合はデフォルトパスを使用）
+
+    Returns:
+        SqliteSaver: 共有のチェックポインター
+    """
+    db_path = os.path.abspath(db_path or DEFAULT_CHECKPOINT_DB_PATH)
+    checkpointer = _checkpointers.get(db_path)
+    if checkpointer is not None:
+        return checkpointer
+
+    with _lock:
+        checkpointer = _checkpointers.get(db_path)
+        if checkpointer is None:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            checkpointer = SqliteSaver(tune_sqlite(conn))
+            _checkpointers[db_path] = checkpointer
+        return checkpointer
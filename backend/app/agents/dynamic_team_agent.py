@@ -4,14 +4,56 @@ Dynamic Team Agent
 
 タスクごとに異なるチームメンバーとリーダーを指定して実行します。
 """
-from typing import Dict, Any, List, Optional
+import contextvars
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple
 from langgraph.graph import StateGraph, END
+from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, BaseMessage
 from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import ensure_config
 from langchain_core.tools import BaseTool
 from langgraph.checkpoint.sqlite import SqliteSaver
 from typing import TypedDict, Annotated
 from operator import add
+from app.tools.process_pool import offload_cpu_bound_tools
+
+logger = logging.getLogger(__name__)
+
+# ツール実行結果が空だった場合のメンバー結果
+DEFAULT_MEMBER_RESULT = "作業を完了しました。"
+
+# リーダーのレビュー結果から追加作業の要否を判定するパターン
+_NEEDS_MORE_WORK_RE = re.compile("追加作業が必要|再度|もう一度")
+
+
+def _extract_content(response: Any) -> str:
+    """LLMの応答からcontentを取り出す（contentが無い場合は文字列化）"""
+    content = getattr(response, 'content', None)
+    return content if content is not None else str(response)
+
+
+def _message_text(message: BaseMessage) -> str:
+    """メッセージ本文を文字列で取得（コンテンツブロックの場合は文字列化）"""
+    content = message.content
+    return content if isinstance(content, str) else str(content)
+
+
+def _content_length(message: BaseMessage) -> int:
+    """メッセージ本文の文字数"""
+    return len(_message_text(message))
+
+
+def _count_leading_human_messages(messages: List[BaseMessage]) -> int:
+    """先頭から連続するHumanMessage（タスク本文とユーザーメッセージ）の数"""
+    count = 0
+    for message in messages:
+        if not isinstance(message, HumanMessage):
+            break
+        count += 1
+    return count
 
 
 class TeamState(TypedDict):
@@ -21,6 +63,9 @@ class TeamState(TypedDict):
     member_results: Dict[str, str]  # agent_name -> result
     final_result: str
     next_action: str
+    iteration: int  # leader_reviewの実行回数
+    messages_summary: str  # 要約済みの過去メッセージの要約
+    summarized_count: int  # messagesのうち要約に含めた先頭からの件数
 
 
 class DynamicTeamAgent:
@@ -45,7 +90,9 @@ class DynamicTeamAgent:
         leader_tools: List[BaseTool],
         member_tools: Dict[int, List[BaseTool]],
         task_id: int,
-        checkpointer: Optional[SqliteSaver] = None
+        checkpointer: Optional[SqliteSaver] = None,
+        max_iterations: int = 3,
+        summary_threshold_chars: int = 8000
     ):
         """
         Args:
@@ -56,7 +103,9 @@ class DynamicTeamAgent:
             leader_tools: リーダーが使用可能なツールのリスト
             member_tools: メンバーが使用可能なツールの辞書 {agent_id: tools}
             task_id: タスクID
-            checkpointer: チェックポイント保存用
+            checkpointer: チェックポイント保存用（app.agents.checkpointer.get_checkpointerで共有のものを渡す）
+            max_iterations: リーダーレビュー→メンバー再実行ループの最大回数
+            summary_threshold_chars: 再実行前に過去メッセージを要約する文字数の閾値
         """
         self.leader_llm = leader_llm
         self.member_llms = member_llms
@@ -66,13 +115,231 @@ class DynamicTeamAgent:
         self.member_tools = member_tools
         self.task_id = task_id
         self.checkpointer = checkpointer
+        self.max_iterations = max_iterations
+        self.summary_threshold_chars = summary_threshold_chars
+        
+        # リーダーのプロンプトはチーム構成から決まるため事前に構築
+        self._leader_plan_prompt = (
+            f"""あなたは{leader_agent_config['name']}です。
+役割: {leader_agent_config['role']}
+
+チームメンバー:
+"""
+            + "".join(f"- {c['name']} ({c['role']})\n" for c in member_agent_configs.values())
+            + """
+タスクを分析し、各メンバーに適切な作業を割り当ててください。
+各メンバーの専門性を活かした効率的な作業分担を考えてください。
+
+作業計画を以下の形式で出力してください:
+【作業計画】
+1. メンバーA: 担当作業の説明
+2. メンバーB: 担当作業の説明
+...
+"""
+        )
+        self._leader_review_prompt_header = f"""あなたは{leader_agent_config['name']}です。
+
+チームメンバーの作業結果:
+"""
+        self._leader_review_prompt_footer = """
+これらの結果をレビューし、統合してください。
+追加作業が必要な場合は「追加作業が必要」と明記してください。
+完了している場合は最終結果をまとめてください。
+"""
+        
+        # メンバーごとのReActエージェントとプロンプトの固定部分を事前に構築
+        # （レビュー後の再実行ループで毎回作り直さないため）
+        self._member_agents = self._build_member_agents()
+        self._member_system_prompt_prefix = {
+            agent_id: f"""あなたは{config['name']}です。
+役割: {config['role']}
+
+リーダーからの指示:
+"""
+            for agent_id, config in member_agent_configs.items()
+        }
         
         # グラフを構築
-        print(f"[DynamicTeamAgent] Initializing for task {task_id}")
-        print(f"[DynamicTeamAgent] Leader: {leader_agent_config.get('name')}")
-        print(f"[DynamicTeamAgent] Members: {[c.get('name') for c in member_agent_configs.values()]}")
+        logger.debug("[DynamicTeamAgent] Initializing for task %s", task_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[DynamicTeamAgent] Leader: %s", leader_agent_config.get('name'))
+            logger.debug("[DynamicTeamAgent] Members: %s", [c.get('name') for c in member_agent_configs.values()])
         self.graph = self._build_graph()
-        print("[DynamicTeamAgent] Graph built successfully")
+        logger.debug("[DynamicTeamAgent] Graph built successfully")
+    
+    def _build_member_agents(self) -> Dict[int, Any]:
+        """
+        ツールを持つメンバーのReActエージェントを構築
+        
+        metadataで cpu_bound が指定されたツールはプロセスプールで実行されます。
+        
+        Returns:
+            Dict[int, Any]: {agent_id: コンパイル済みエージェント}
+        """
+        member_agents = {}
+        for agent_id in self.member_agent_configs:
+            member_llm = self.member_llms.get(agent_id)
+            member_tools = self.member_tools.get(agent_id)
+            if member_llm and member_tools:
+                # メンバー自体はスレッドで並列実行し、CPUバウンドなツールだけ別プロセスで実行
+                member_agents[agent_id] = create_react_agent(member_llm, offload_cpu_bound_tools(member_tools))
+        return member_agents
+    
+    def _stream_llm(self, llm: BaseChatModel, messages: List[BaseMessage], agent_name: str):
+        """
+        LLMをストリーミングで呼び出す
+        
+        トークンはグラフを stream_mode="messages" で実行している呼び出し元（ExecutionService）へ
+        LangGraphのコールバック経由で逐次届きます。
+        
+        Args:
+            llm: 呼び出すLLM
+            messages: 入力メッセージ
+            agent_name: 呼び出し元のエージェント名（metadataのagent_nameとして付与）
+            
+        Returns:
+            全チャンクを結合したメッセージ
+        """
+        # 実行中の設定を引き継ぎ、ストリーミング出力の送信元が分かるようエージェント名を付与
+        config = ensure_config()
+        config["metadata"] = {**config.get("metadata", {}), "agent_name": agent_name}
+        
+        response = None
+        for chunk in llm.stream(messages, config=config):
+            # チャンク同士の加算でcontent（文字列/コンテンツブロック）を正しく結合
+            response = chunk if response is None else response + chunk
+        
+        if response is None:
+            return AIMessage(content="")
+        return response
+    
+    def _context_messages(self, state: TeamState) -> List[BaseMessage]:
+        """
+        LLMに渡すメッセージ履歴を取得
+        
+        要約がある場合は、タスク本文 + 要約 + 要約以降のメッセージを返します。
+        呼び出し元が先頭にSystemMessageを付けるため、要約はSystemMessageではなく
+        HumanMessageとして挿入します（途中のSystemMessageを受け付けないプロバイダーがあるため）。
+        """
+        messages = state["messages"]
+        summary = state.get("messages_summary", "")
+        if not summary:
+            return messages
+        
+        head = _count_leading_human_messages(messages)
+        return [
+            *messages[:head],
+            HumanMessage(content=f"これまでの作業経緯の要約:\n{summary}"),
+            *messages[max(state.get("summarized_count", 0), head):]
+        ]
+    
+    def _summarize_if_needed(self, state: TeamState, review_message: AIMessage) -> Dict[str, Any]:
+        """
+        未要約のメッセージが閾値を超えた場合、リーダーLLMで要約する
+        
+        Args:
+            state: 現在の状態
+            review_message: このノードで追加するレビューメッセージ
+            
+        Returns:
+            Dict[str, Any]: 状態の更新（要約不要の場合は空）
+        """
+        messages = state["messages"]
+        head = _count_leading_human_messages(messages)
+        start = max(state.get("summarized_count", 0), head)
+        pending = [*messages[start:], review_message]
+        if sum(_content_length(m) for m in pending) <= self.summary_threshold_chars:
+            return {}
+        
+        previous_summary = state.get("messages_summary", "")
+        summary_prompt = "これまでのチームの作業経緯を、次の作業に必要な情報を残して簡潔に要約してください。"
+        if previous_summary:
+            summary_prompt += f"\n\n以前の要約:\n{previous_summary}"
+        
+        # pendingはAIMessageから始まり得るため、最初のターンがユーザーになるよう1つのHumanMessageにまとめる
+        transcript = "\n\n".join(_message_text(m) for m in pending)
+        
+        logger.debug("[Leader] Summarizing %d messages", len(pending))
+        response = self.leader_llm.invoke([
+            SystemMessage(content=summary_prompt),
+            HumanMessage(content=f"作業経緯:\n{transcript}")
+        ])
+        return {
+            "messages_summary": _extract_content(response),
+            # レビューメッセージはaddで追加されるため、その分も要約済みとして数える
+            "summarized_count": len(messages) + 1
+        }
+    
+    def _run_member(
+        self,
+        agent_id: int,
+        config: Dict[str, Any],
+        messages: Tuple[BaseMessage, ...],
+        leader_plan: str
+    ) -> Optional[Tuple[str, str, AIMessage]]:
+        """
+        メンバー1人分の作業を実行
+        
+        Args:
+            agent_id: メンバーのエージェントID
+            config: メンバーの設定
+            messages: これまでのメッセージ（全メンバーで共有）
+            leader_plan: リーダーの作業計画
+            
+        Returns:
+            Optional[Tuple[str, str, AIMessage]]: (メンバー名, 作業結果, 結果メッセージ)。LLMが無い場合はNone
+        """
+        member_name = config['name']
+        logger.debug("[Member] Processing: %s", member_name)
+        
+        # メンバーのシステムプロンプト
+        member_prompt = self._member_system_prompt_prefix[agent_id] + f"""{leader_plan}
+
+あなたの担当部分を実行してください。
+"""
+        
+        # メンバーエージェントで作業を実行
+        member_llm = self.member_llms.get(agent_id)
+        member_tools = self.member_tools.get(agent_id, [])
+        
+        if not member_llm:
+            logger.warning("[Member] No LLM found for %s", member_name)
+            return None
+        
+        logger.debug("[Member] %s has %d tools", member_name, len(member_tools))
+        
+        # システムメッセージを先頭に付け、共有のメッセージ履歴をそのまま続ける
+        member_messages = [SystemMessage(content=member_prompt), *messages]
+        
+        # ツールがある場合はcreate_react_agentを使用
+        if member_tools:
+            # 事前に構築したメンバーエージェントを使用
+            member_agent = self._member_agents[agent_id]
+            
+            # エージェントを実行（スレッドIDはメンバーごとに分離）
+            logger.debug("[Member] %s invoking agent with tools...", member_name)
+            agent_result = member_agent.invoke(
+                {"messages": member_messages},
+                config={"configurable": {"thread_id": f"member_{agent_id}"}}
+            )
+            
+            # 最後のメッセージを取得
+            result_messages = agent_result.get("messages", [])
+            if result_messages:
+                last_message = result_messages[-1]
+                member_result = _extract_content(last_message)
+            else:
+                member_result = DEFAULT_MEMBER_RESULT
+        else:
+            # ツールがない場合はLLMを直接呼び出し
+            logger.debug("[Member] %s invoking LLM (no tools)...", member_name)
+            response = self._stream_llm(member_llm, member_messages, member_name)
+            member_result = _extract_content(response)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[Member] %s result: %s...", member_name, member_result[:100])
+        
+        return member_name, member_result, AIMessage(content=f"[{member_name}の作業結果]\n{member_result}")
     
     def _build_graph(self) -> StateGraph:
         """
@@ -90,37 +357,19 @@ class DynamicTeamAgent:
         # リーダーノード: タスク分析と計画
         def leader_plan_node(state: TeamState) -> Dict[str, Any]:
             """リーダーがタスクを分析し、各メンバーに作業を割り当て"""
-            print("\n=== Leader Plan Node ===")
             messages = state["messages"]
-            print(f"Input messages: {len(messages)}")
-            
-            # リーダーのシステムプロンプト
-            leader_prompt = f"""あなたは{self.leader_agent_config['name']}です。
-役割: {self.leader_agent_config['role']}
-
-チームメンバー:
-"""
-            for agent_id, config in self.member_agent_configs.items():
-                leader_prompt += f"- {config['name']} ({config['role']})\n"
-            
-            leader_prompt += """
-タスクを分析し、各メンバーに適切な作業を割り当ててください。
-各メンバーの専門性を活かした効率的な作業分担を考えてください。
-
-作業計画を以下の形式で出力してください:
-【作業計画】
-1. メンバーA: 担当作業の説明
-2. メンバーB: 担当作業の説明
-...
-"""
+            logger.debug("=== Leader Plan Node === (input messages: %d)", len(messages))
             
             # SystemMessageを先頭に追加
-            messages_with_system = [SystemMessage(content=leader_prompt)] + messages
+            messages_with_system = [SystemMessage(content=self._leader_plan_prompt)] + messages
             
-            print("[Leader] Invoking LLM...")
-            response = self.leader_llm.invoke(messages_with_system)
-            plan = response.content if hasattr(response, 'content') else str(response)
-            print(f"[Leader] Plan generated: {plan[:100]}...")
+            logger.debug("[Leader] Invoking LLM...")
+            response = self._stream_llm(
+                self.leader_llm, messages_with_system, self.leader_agent_config['name']
+            )
+            plan = _extract_content(response)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[Leader] Plan generated: %s...", plan[:100])
             
             # 新しいメッセージのみを返す（addで既存のものと結合される）
             return {
@@ -132,75 +381,42 @@ class DynamicTeamAgent:
         # メンバー実行ノード
         def execute_members_node(state: TeamState) -> Dict[str, Any]:
             """各メンバーが並行して作業を実行"""
-            print("\n=== Execute Members Node ===")
-            messages = state["messages"]
+            logger.debug("=== Execute Members Node ===")
+            # メッセージ履歴は全メンバー共通のため、変更不可のタプルとして一度だけ用意
+            shared_messages = tuple(self._context_messages(state))
             leader_plan = state["leader_plan"]
+            member_items = list(self.member_agent_configs.items())
+            if not member_items:
+                return {
+                    "messages": [],
+                    "member_results": {},
+                    "next_action": "leader_review"
+                }
+            
+            # 各メンバーのLLM呼び出しは独立しているため並列に実行
+            outcomes = {}
+            with ThreadPoolExecutor(max_workers=len(member_items)) as executor:
+                # コンテキストをコピーして渡し、stream_mode="messages"でメンバーのトークンも取得できるようにする
+                futures = {
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        self._run_member, agent_id, config, shared_messages, leader_plan
+                    ): agent_id
+                    for agent_id, config in member_items
+                }
+                for future in as_completed(futures):
+                    outcomes[futures[future]] = future.result()
+            
+            # 結果はメンバー定義順に並べる（完了順に依存させない）
             member_results = {}
             new_messages = []
-            
-            for agent_id, config in self.member_agent_configs.items():
-                member_name = config['name']
-                print(f"[Member] Processing: {member_name}")
-                
-                # メンバーのシステムプロンプト
-                member_prompt = f"""あなたは{member_name}です。
-役割: {config['role']}
-
-リーダーからの指示:
-{leader_plan}
-
-あなたの担当部分を実行してください。
-"""
-                
-                # メンバーエージェントで作業を実行
-                member_llm = self.member_llms.get(agent_id)
-                member_tools = self.member_tools.get(agent_id, [])
-                
-                if not member_llm:
-                    print(f"[Member] Warning: No LLM found for {member_name}")
+            for agent_id, _ in member_items:
+                outcome = outcomes.get(agent_id)
+                if outcome is None:
                     continue
-                
-                print(f"[Member] {member_name} has {len(member_tools)} tools")
-                
-                # ツールがある場合はcreate_react_agentを使用
-                if member_tools:
-                    from langgraph.prebuilt import create_react_agent
-                    
-                    # システムメッセージを追加
-                    member_messages = [SystemMessage(content=member_prompt)] + messages
-                    
-                    # メンバーエージェントを作成
-                    member_agent = create_react_agent(
-                        member_llm,
-                        member_tools
-                    )
-                    
-                    # エージェントを実行
-                    print(f"[Member] {member_name} invoking agent with tools...")
-                    agent_result = member_agent.invoke(
-                        {"messages": member_messages},
-                        config={"configurable": {"thread_id": f"member_{agent_id}"}}
-                    )
-                    
-                    # 最後のメッセージを取得
-                    result_messages = agent_result.get("messages", [])
-                    if result_messages:
-                        last_message = result_messages[-1]
-                        member_result = last_message.content if hasattr(last_message, 'content') else str(last_message)
-                    else:
-                        member_result = "作業を完了しました。"
-                else:
-                    # ツールがない場合はLLMを直接呼び出し
-                    member_messages = [SystemMessage(content=member_prompt)] + messages
-                    
-                    print(f"[Member] {member_name} invoking LLM (no tools)...")
-                    response = member_llm.invoke(member_messages)
-                    member_result = response.content if hasattr(response, 'content') else str(response)
-                
-                print(f"[Member] {member_name} result: {member_result[:100]}...")
-                
+                member_name, member_result, message = outcome
                 member_results[member_name] = member_result
-                new_messages.append(AIMessage(content=f"[{member_name}の作業結果]\n{member_result}"))
+                new_messages.append(message)
             
             return {
                 "messages": new_messages,
@@ -211,43 +427,61 @@ class DynamicTeamAgent:
         # リーダーレビューノード
         def leader_review_node(state: TeamState) -> Dict[str, Any]:
             """リーダーがメンバーの結果をレビューし、統合"""
-            print("\n=== Leader Review Node ===")
-            messages = state["messages"]
+            logger.debug("=== Leader Review Node ===")
+            messages = self._context_messages(state)
             member_results = state["member_results"]
+            iteration = state.get("iteration", 0) + 1
+            
+            # 有効な作業結果が無い場合はレビューのLLM呼び出しを省略して終了
+            if not any(r.strip() and r != DEFAULT_MEMBER_RESULT for r in member_results.values()):
+                logger.debug("[Leader] No meaningful member results, skipping review")
+                final_result = "メンバーから有効な作業結果が得られませんでした。"
+                return {
+                    "messages": [AIMessage(content=f"[リーダーレビュー]\n{final_result}")],
+                    "final_result": final_result,
+                    "next_action": "end",
+                    "iteration": iteration
+                }
             
             # リーダーのレビュープロンプト
-            review_prompt = f"""あなたは{self.leader_agent_config['name']}です。
-
-チームメンバーの作業結果:
-"""
+            review_prompt = self._leader_review_prompt_header
             for member_name, result in member_results.items():
                 review_prompt += f"\n【{member_name}】\n{result}\n"
-            
-            review_prompt += """
-これらの結果をレビューし、統合してください。
-追加作業が必要な場合は「追加作業が必要」と明記してください。
-完了している場合は最終結果をまとめてください。
-"""
+            review_prompt += self._leader_review_prompt_footer
             
             # SystemMessageを先頭に追加
             review_messages = [SystemMessage(content=review_prompt)] + messages
             
-            print("[Leader] Reviewing results...")
-            response = self.leader_llm.invoke(review_messages)
-            final_result = response.content if hasattr(response, 'content') else str(response)
-            print(f"[Leader] Review: {final_result[:100]}...")
+            logger.debug("[Leader] Reviewing results...")
+            response = self._stream_llm(
+                self.leader_llm, review_messages, self.leader_agent_config['name']
+            )
+            final_result = _extract_content(response)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[Leader] Review: %s...", final_result[:100])
             
             # 追加作業が必要かどうかを判断
-            needs_more_work = "追加作業が必要" in final_result or "再度" in final_result or "もう一度" in final_result
+            needs_more_work = bool(_NEEDS_MORE_WORK_RE.search(final_result))
             next_action = "execute_members" if needs_more_work else "end"
+            if next_action != "end" and iteration >= self.max_iterations:
+                logger.warning("[Leader] Reached max iterations (%d), ending", self.max_iterations)
+                next_action = "end"
             
-            print(f"[Leader] Next action: {next_action}")
+            logger.debug("[Leader] Next action: %s", next_action)
             
-            return {
-                "messages": [AIMessage(content=f"[リーダーレビュー]\n{final_result}")],
+            review_message = AIMessage(content=f"[リーダーレビュー]\n{final_result}")
+            update = {
+                "messages": [review_message],
                 "final_result": final_result,
-                "next_action": next_action
+                "next_action": next_action,
+                "iteration": iteration
             }
+            
+            # 再実行する場合、履歴が長ければ要約してメンバーへ渡す量を抑える
+            if next_action == "execute_members":
+                update.update(self._summarize_if_needed(state, review_message))
+            
+            return update
         
         # ノードを追加
         workflow.add_node("leader_plan", leader_plan_node)
@@ -275,10 +509,10 @@ class DynamicTeamAgent:
         
         # チェックポイント付きでコンパイル
         if self.checkpointer:
-            print("[DynamicTeamAgent] Compiling graph WITH checkpointer")
+            logger.debug("[DynamicTeamAgent] Compiling graph WITH checkpointer")
             return workflow.compile(checkpointer=self.checkpointer)
         else:
-            print("[DynamicTeamAgent] Compiling graph WITHOUT checkpointer")
+            logger.debug("[DynamicTeamAgent] Compiling graph WITHOUT checkpointer")
             return workflow.compile()
     
     def execute(self, task_description: str, user_message: Optional[str] = None) -> Dict[str, Any]:
@@ -305,7 +539,10 @@ class DynamicTeamAgent:
                 "leader_plan": "",
                 "member_results": {},
                 "final_result": "",
-                "next_action": ""
+                "next_action": "",
+                "iteration": 0,
+                "messages_summary": "",
+                "summarized_count": 0
             },
             config=config
         )
@@ -327,12 +564,12 @@ class DynamicTeamAgent:
             user_message: ユーザーからの追加メッセージ（オプション）
             
         Yields:
-            Dict[str, Any]: 実行ステップごとの結果
+            Tuple[str, Any]: (ストリームモード, データ)
+                - ("updates", {ノード名: 更新内容}): ノードごとの状態更新
+                - ("messages", (メッセージチャンク, メタデータ)): LLMのトークン単位の出力
         """
-        print(f"\n{'='*60}")
-        print(f"[DynamicTeamAgent] Starting stream execution")
-        print(f"[DynamicTeamAgent] Task: {task_description[:100]}...")
-        print(f"{'='*60}\n")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[DynamicTeamAgent] Starting stream execution: %s...", task_description[:100])
         
         # 初期メッセージ
         messages = [HumanMessage(content=task_description)]
@@ -346,27 +583,25 @@ class DynamicTeamAgent:
             "leader_plan": "",
             "member_results": {},
             "final_result": "",
-            "next_action": ""
+            "next_action": "",
+            "iteration": 0,
+            "messages_summary": "",
+            "summarized_count": 0
         }
         
-        print(f"[DynamicTeamAgent] Initial state prepared")
-        print(f"[DynamicTeamAgent] Config: {config}")
+        logger.debug("[DynamicTeamAgent] Initial state prepared (config: %s)", config)
         
         step_count = 0
         try:
-            # stream_mode="updates"を指定して、各ノードの更新を取得
-            for step in self.graph.stream(initial_state, config=config, stream_mode="updates"):
-                step_count += 1
-                node_name = list(step.keys())[0] if step else "unknown"
-                print(f"\n[DynamicTeamAgent] Step {step_count}: {node_name}")
-                print(f"[DynamicTeamAgent] Step data keys: {list(step.get(node_name, {}).keys())}")
-                yield step
+            # ノードごとの更新とLLMのトークン出力を同時に取得
+            for mode, data in self.graph.stream(initial_state, config=config, stream_mode=["updates", "messages"]):
+                if mode == "updates":
+                    step_count += 1
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("[DynamicTeamAgent] Step %d: %s", step_count, list(data.keys()))
+                yield mode, data
             
-            print(f"\n[DynamicTeamAgent] Stream completed. Total steps: {step_count}")
-        except Exception as e:
-            print(f"\n[DynamicTeamAgent] ERROR in stream: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.debug("[DynamicTeamAgent] Stream completed. Total steps: %d", step_count)
+        except Exception:
+            logger.exception("[DynamicTeamAgent] ERROR in stream")
             raise
-        
-        print(f"{'='*60}\n")
@@ -1,10 +1,13 @@
 """
 LangGraphベースのAgent実装（標準ReActエージェント使用）
 """
-from typing import Dict, Any, List
-import os
+from typing import Dict, Any, Final, List
+import asyncio
+import functools
+import logging
 from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.sqlite import SqliteSaver
+from app.agents.checkpointer import DEFAULT_CHECKPOINT_DB_PATH, get_checkpointer
+from app.agents.llm_cache import freeze_config
 from langchain_core.messages import HumanMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
@@ -18,6 +21,124 @@ try:
 except ImportError:
     WATSONX_AVAILABLE = False
 
+logger = logging.getLogger(__name__)
+
+# 自動実行モードの指示
+AUTO_MODE_INSTRUCTION: Final[str] = """[自動実行モード]
+あなたは自律的にタスクを完了する必要があります。
+不明な情報がある場合は、合理的な仮定を立てて進めてください。
+human_inputツールは使用しないでください。"""
+
+# 対話実行モードの指示
+INTERACTIVE_MODE_INSTRUCTION: Final[str] = """[対話実行モード - 最重要指示]
+
+あなたは対話型エージェントです。以下のルールに**絶対に**従ってください：
+
+【ルール1】不明な情報がある場合は、**必ず**human_inputツールを呼び出してください
+【ルール2】直接回答を返すことは**完全に禁止**されています
+【ルール3】質問が必要な場合は、human_inputツールを使用する以外の選択肢はありません
+
+必須のツール使用ケース：
+- ファイルパスが不明 → human_input("ファイルパスを教えてください")
+- 処理方法が不明 → human_input("どのように処理しますか？")
+- 確認が必要 → human_input("〜してもよろしいですか？")
+- 詳細が不明確 → human_input("詳細を教えてください")
+
+【重要な例】
+タスク: "ファイルを読み取り、要約し、出力する"
+
+✅ 正しい対応:
+Action: human_input
+Action Input: {"question": "読み取るファイルのパスを教えてください"}
+
+❌ 誤った対応（絶対禁止）:
+"まず、読み取るファイルのパスを教えていただけますか？"
+
+human_inputツールを使わずに質問を返すことは、このシステムでは機能しません。
+必ずツールを使用してください。"""
+
+# タスク本文の前に付与するプレフィックス
+AUTO_MODE_PREFIX: Final[str] = AUTO_MODE_INSTRUCTION + "\n\n【タスク】\n"
+INTERACTIVE_MODE_PREFIX: Final[str] = INTERACTIVE_MODE_INSTRUCTION + "\n\n【タスク】\n"
+
+
+def _message_to_dict(msg) -> Dict[str, Any]:
+    """メッセージを{"role", "content"}形式の辞書に変換"""
+    return {
+        "role": msg.type,
+        "content": msg.content
+    }
+
+
+def _messages_to_dicts(messages) -> List[Dict[str, Any]]:
+    """メッセージのリストを{"role", "content"}形式の辞書のリストに変換"""
+    return list(map(_message_to_dict, messages))
+
+
+def _build_llm(provider: str, config: Dict[str, Any]):
+    """
+    LLMインスタンスを作成
+    
+    Args:
+        provider: LLMプロバイダー名
+        config: LLM設定
+        
+    Returns:
+        LLMインスタンス
+    """
+    temperature = config.get("temperature", 0.7)
+    max_tokens = config.get("max_tokens", 2000)
+    model = config.get("model", "")
+    
+    if provider == "openai":
+        # base_urlが指定されている場合（GitHub Models等）
+        base_url = config.get("base_url")
+        kwargs = {
+            "model": model or "gpt-4",
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "api_key": config.get("api_key", "")
+        }
+        if base_url:
+            kwargs["base_url"] = base_url
+        return ChatOpenAI(**kwargs)
+    elif provider == "anthropic":
+        return ChatAnthropic(
+            model=model or "claude-3-5-sonnet-20241022",
+            temperature=temperature,
+            max_tokens=max_tokens,
+            api_key=config.get("api_key", "")
+        )
+    elif provider == "gemini":
+        return ChatGoogleGenerativeAI(
+            model=model or "gemini-2.0-flash-exp",
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            google_api_key=config.get("api_key", "")
+        )
+    elif provider == "ollama":
+        return ChatOllama(
+            model=model or "llama2",
+            temperature=temperature,
+            base_url=config.get("base_url", "http://localhost:11434")
+        )
+    elif provider == "watsonx":
+        # WatsonxLLMはFunction Calling（bind_tools）をサポートしていないため、
+        # create_react_agentでは使用できません
+        raise ValueError(
+            "watsonx.ai is not currently supported with LangGraph ReAct agent. "
+            "WatsonxLLM does not support Function Calling (bind_tools method). "
+            "Please use OpenAI, Anthropic, or Gemini providers instead."
+        )
+    else:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+
+
+@functools.lru_cache(maxsize=64)
+def _get_llm_cached(provider: str, frozen_config: tuple):
+    """(プロバイダー, 設定) ごとにLLMインスタンスをキャッシュして返す"""
+    return _build_llm(provider, dict(frozen_config))
+
 
 class LangGraphAgent:
     """
@@ -59,18 +180,10 @@ class LangGraphAgent:
         
         # メモリの設定（SqliteSaverで永続化）
         if enable_memory:
-            # データベースファイルのパスを設定
-            if db_path is None:
-                # デフォルト: backend/data/agent_memory.db
-                data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-                os.makedirs(data_dir, exist_ok=True)
-                db_path = os.path.join(data_dir, "agent_memory.db")
-            
-            # SqliteSaverを作成（会話履歴を永続化）
-            # SQLite接続文字列を使用してインスタンス化
-            import sqlite3
-            conn = sqlite3.connect(db_path, check_same_thread=False)
-            self.checkpointer = SqliteSaver(conn)
+            # SqliteSaverを取得（会話履歴を永続化、DBファイルごとにWAL調整済みの接続を共有）
+            # db_pathがNoneの場合はデフォルト（backend/app/data/agent_memory.db）を使用し、
+            # ディレクトリ作成は接続を初めて開く時だけ行われる
+            self.checkpointer = get_checkpointer(db_path or DEFAULT_CHECKPOINT_DB_PATH)
         else:
             self.checkpointer = None
         
@@ -83,7 +196,7 @@ class LangGraphAgent:
     
     def _create_llm(self, provider: str, config: Dict[str, Any]):
         """
-        LLMインスタンスを作成
+        LLMインスタンスを取得（同じ設定のインスタンスは共有）
         
         Args:
             provider: LLMプロバイダー名
@@ -92,52 +205,74 @@ class LangGraphAgent:
         Returns:
             LLMインスタンス
         """
-        temperature = config.get("temperature", 0.7)
-        max_tokens = config.get("max_tokens", 2000)
-        model = config.get("model", "")
+        frozen = freeze_config(config)
+        if frozen is None:
+            return _build_llm(provider, config)
+        return _get_llm_cached(provider, frozen)
+    
+    def _build_config(self, thread_id: str) -> Dict[str, Any]:
+        """実行設定を作成（メモリ有効時はthread_idを使用）"""
+        if self.enable_memory:
+            return {"configurable": {"thread_id": thread_id}}
+        return {}
+    
+    def _build_input(self, task: str, auto_mode: bool) -> Dict[str, Any]:
+        """モード指示を付与したエージェントへの入力を作成"""
+        # モードに応じた指示をタスクの前に付与
+        prefix = AUTO_MODE_PREFIX if auto_mode else INTERACTIVE_MODE_PREFIX
+        enhanced_task = prefix + task
+        return {"messages": [HumanMessage(content=enhanced_task)]}
+    
+    def _load_history(self, config: Dict[str, Any]) -> List[Any]:
+        """スレッドの既存の会話履歴を取得（メモリ無効時は空）"""
+        if not config:
+            return []
+        state = self.agent.get_state(config)
+        return list(state.values.get("messages", []))
+    
+    @staticmethod
+    def _raise_if_waiting(final_message) -> None:
+        """最終メッセージがユーザー入力待ちマーカーの場合は例外をスロー"""
+        if final_message and isinstance(final_message.content, str):
+            if final_message.content.startswith("__WAITING_FOR_USER_INPUT__:"):
+                # マーカーをパース: __WAITING_FOR_USER_INPUT__:interaction_id:question
+                parts = final_message.content.split(":", 2)
+                if len(parts) >= 3:
+                    interaction_id = int(parts[1])
+                    question = parts[2]
+                    from app.exceptions import HumanInputRequiredException
+                    raise HumanInputRequiredException(question=question, interaction_id=interaction_id)
+    
+    @staticmethod
+    def _build_result(final_message, messages: List[Dict[str, Any]], steps: int = None) -> Dict[str, Any]:
+        """
+        実行結果を整形
         
-        if provider == "openai":
-            # base_urlが指定されている場合（GitHub Models等）
-            base_url = config.get("base_url")
-            kwargs = {
-                "model": model or "gpt-4",
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "api_key": config.get("api_key", "")
-            }
-            if base_url:
-                kwargs["base_url"] = base_url
-            return ChatOpenAI(**kwargs)
-        elif provider == "anthropic":
-            return ChatAnthropic(
-                model=model or "claude-3-5-sonnet-20241022",
-                temperature=temperature,
-                max_tokens=max_tokens,
-                api_key=config.get("api_key", "")
-            )
-        elif provider == "gemini":
-            return ChatGoogleGenerativeAI(
-                model=model or "gemini-2.0-flash-exp",
-                temperature=temperature,
-                max_output_tokens=max_tokens,
-                google_api_key=config.get("api_key", "")
-            )
-        elif provider == "ollama":
-            return ChatOllama(
-                model=model or "llama2",
-                temperature=temperature,
-                base_url=config.get("base_url", "http://localhost:11434")
-            )
-        elif provider == "watsonx":
-            # WatsonxLLMはFunction Calling（bind_tools）をサポートしていないため、
-            # create_react_agentでは使用できません
-            raise ValueError(
-                "watsonx.ai is not currently supported with LangGraph ReAct agent. "
-                "WatsonxLLM does not support Function Calling (bind_tools method). "
-                "Please use OpenAI, Anthropic, or Gemini providers instead."
-            )
-        else:
-            raise ValueError(f"Unsupported LLM provider: {provider}")
+        Args:
+            final_message: 最終メッセージ
+            messages: {"role", "content"}形式のメッセージリスト
+            steps: ステップ数（Noneの場合はメッセージ数）
+        """
+        return {
+            "success": True,
+            "result": final_message.content if final_message else "タスクを完了しました",
+            "messages": messages,
+            "steps": len(messages) if steps is None else steps
+        }
+    
+    @staticmethod
+    def _build_error(e: Exception) -> Dict[str, Any]:
+        """エラー結果を整形（HumanInputRequiredExceptionは再スロー）"""
+        # HumanInputRequiredExceptionは再スロー（タスク一時停止のため）
+        from app.exceptions import HumanInputRequiredException
+        if isinstance(e, HumanInputRequiredException):
+            raise e
+        
+        return {
+            "success": False,
+            "error": f"タスクの実行に失敗しました: {str(e)}",
+            "result": None
+        }
     
     def execute(self, task: str, thread_id: str = "default", auto_mode: bool = False) -> Dict[str, Any]:
         """
@@ -152,93 +287,50 @@ class LangGraphAgent:
             Dict[str, Any]: 実行結果
         """
         try:
-            # 設定（メモリ有効時はthread_idを使用）
-            config = {}
-            if self.enable_memory:
-                config = {"configurable": {"thread_id": thread_id}}
-            
-            # モードに応じたシステムプロンプトを追加
-            if auto_mode:
-                mode_instruction = """[自動実行モード]
-あなたは自律的にタスクを完了する必要があります。
-不明な情報がある場合は、合理的な仮定を立てて進めてください。
-human_inputツールは使用しないでください。"""
-            else:
-                mode_instruction = """[対話実行モード - 最重要指示]
-
-あなたは対話型エージェントです。以下のルールに**絶対に**従ってください：
-
-【ルール1】不明な情報がある場合は、**必ず**human_inputツールを呼び出してください
-【ルール2】直接回答を返すことは**完全に禁止**されています
-【ルール3】質問が必要な場合は、human_inputツールを使用する以外の選択肢はありません
-
-必須のツール使用ケース：
-- ファイルパスが不明 → human_input("ファイルパスを教えてください")
-- 処理方法が不明 → human_input("どのように処理しますか？")
-- 確認が必要 → human_input("〜してもよろしいですか？")
-- 詳細が不明確 → human_input("詳細を教えてください")
-
-【重要な例】
-タスク: "ファイルを読み取り、要約し、出力する"
-
-✅ 正しい対応:
-Action: human_input
-Action Input: {"question": "読み取るファイルのパスを教えてください"}
-
-❌ 誤った対応（絶対禁止）:
-"まず、読み取るファイルのパスを教えていただけますか？"
-
-human_inputツールを使わずに質問を返すことは、このシステムでは機能しません。
-必ずツールを使用してください。"""
-            
-            # タスクにモード指示を追加
-            enhanced_task = f"{mode_instruction}\n\n【タスク】\n{task}"
-            
             # エージェントを実行
             result = self.agent.invoke(
-                {"messages": [HumanMessage(content=enhanced_task)]},
-                config=config
+                self._build_input(task, auto_mode),
+                config=self._build_config(thread_id)
             )
             
-            # 結果を整形
+            # ユーザー入力待ちマーカーをチェック
             messages = result.get("messages", [])
             final_message = messages[-1] if messages else None
+            self._raise_if_waiting(final_message)
+            
+            return self._build_result(final_message, _messages_to_dicts(messages))
+            
+        except Exception as e:
+            return self._build_error(e)
+    
+    async def aexecute(self, task: str, thread_id: str = "default", auto_mode: bool = False) -> Dict[str, Any]:
+        """
+        タスクを非同期で実行（executeの非同期版）
+        
+        Args:
+            task: 実行するタスクの説明
+            thread_id: スレッドID（会話履歴の識別子）
+            auto_mode: 自動実行モード
+            
+        Returns:
+            Dict[str, Any]: 実行結果
+        """
+        try:
+            # エージェントを実行
+            result = await self.agent.ainvoke(
+                self._build_input(task, auto_mode),
+                config=self._build_config(thread_id)
+            )
             
             # ユーザー入力待ちマーカーをチェック
-            if final_message and isinstance(final_message.content, str):
-                if final_message.content.startswith("__WAITING_FOR_USER_INPUT__:"):
-                    # マーカーをパース: __WAITING_FOR_USER_INPUT__:interaction_id:question
-                    parts = final_message.content.split(":", 2)
-                    if len(parts) >= 3:
-                        interaction_id = int(parts[1])
-                        question = parts[2]
-                        from app.exceptions import HumanInputRequiredException
-                        raise HumanInputRequiredException(question=question, interaction_id=interaction_id)
+            messages = result.get("messages", [])
+            final_message = messages[-1] if messages else None
+            self._raise_if_waiting(final_message)
             
-            return {
-                "success": True,
-                "result": final_message.content if final_message else "タスクを完了しました",
-                "messages": [
-                    {
-                        "role": msg.type,
-                        "content": msg.content
-                    }
-                    for msg in messages
-                ],
-                "steps": len(messages)
-            }
+            return self._build_result(final_message, _messages_to_dicts(messages))
             
         except Exception as e:
-            # HumanInputRequiredExceptionは再スロー（タスク一時停止のため）
-            from app.exceptions import HumanInputRequiredException
-            if isinstance(e, HumanInputRequiredException):
-                raise
-            
-            return {
-                "success": False,
-                "error": f"タスクの実行に失敗しました: {str(e)}",
-                "result": None
-            }
+            return self._build_error(e)
     
     def execute_with_streaming(
         self,
@@ -260,178 +352,101 @@ human_inputツールを使わずに質問を返すことは、このシステム
             Dict[str, Any]: 実行結果
         """
         try:
-            # 設定
-            config = {}
-            if self.enable_memory:
-                config = {"configurable": {"thread_id": thread_id}}
-            
-            # モードに応じた強力なシステムプロンプトを追加
-            if auto_mode:
-                mode_instruction = """[自動実行モード]
-あなたは自律的にタスクを完了する必要があります。
-不明な情報がある場合は、合理的な仮定を立てて進めてください。
-human_inputツールは使用しないでください。"""
-            else:
-                mode_instruction = """[対話実行モード - 最重要指示]
-
-あなたは対話型エージェントです。以下のルールに**絶対に**従ってください：
-
-【ルール1】不明な情報がある場合は、**必ず**human_inputツールを呼び出してください
-【ルール2】直接回答を返すことは**完全に禁止**されています
-【ルール3】質問が必要な場合は、human_inputツールを使用する以外の選択肢はありません
-
-必須のツール使用ケース：
-- ファイルパスが不明 → human_input("ファイルパスを教えてください")
-- 処理方法が不明 → human_input("どのように処理しますか？")
-- 確認が必要 → human_input("〜してもよろしいですか？")
-- 詳細が不明確 → human_input("詳細を教えてください")
-
-【重要な例】
-タスク: "ファイルを読み取り、要約し、出力する"
-
-✅ 正しい対応:
-Action: human_input
-Action Input: {"question": "読み取るファイルのパスを教えてください"}
-
-❌ 誤った対応（絶対禁止）:
-"まず、読み取るファイルのパスを教えていただけますか？"
-
-human_inputツールを使わずに質問を返すことは、このシステムでは機能しません。
-必ずツールを使用してください。"""
-            
-            # タスクにモード指示を追加
-            enhanced_task = f"{mode_instruction}\n\n【タスク】\n{task}"
-            
-            # ストリーミング実行
-            all_messages = []
-            print(f"[DEBUG] Starting agent.stream with enhanced_task length: {len(enhanced_task)}")
-            print(f"[DEBUG] Enhanced task preview: {enhanced_task[:200]}...")
-            print(f"[DEBUG] Config: {config}")
-            print(f"[DEBUG] Agent type: {type(self.agent)}")
-            print(f"[DEBUG] LLM type: {type(self.llm)}")
-            
-            event_count = 0
-            waiting_for_input = False
-            waiting_interaction_id = None
-            waiting_question = None
-            first_event = True
+            config = self._build_config(thread_id)
+            agent_input = self._build_input(task, auto_mode)
+            tracker = _StreamTracker(self._load_history(config))
+            for payload in tracker.process_messages(agent_input["messages"]):
+                if callback:
+                    callback(payload)
             
             for event in self.agent.stream(
-                {"messages": [HumanMessage(content=enhanced_task)]},
+                agent_input,
                 config=config,
-                stream_mode="values"
+                stream_mode="updates"
             ):
-                event_count += 1
-                print(f"[DEBUG] Event #{event_count} received")
-                messages = event.get("messages", [])
-                print(f"[DEBUG] Event has {len(messages)} total messages")
-                
-                if messages:
-                    # 初回イベントの場合、既存の会話履歴をall_messagesに設定
-                    if first_event and len(messages) > 1:
-                        # 最後のメッセージ以外は既存の履歴
-                        all_messages = messages[:-1]
-                        new_messages = messages[-1:]
-                        print(f"[DEBUG] First event: Loaded {len(all_messages)} existing messages, processing {len(new_messages)} new messages")
-                        first_event = False
-                    else:
-                        # 新しいメッセージのみを処理
-                        new_messages = messages[len(all_messages):]
-                        print(f"[DEBUG] Processing {len(new_messages)} new messages")
-                        first_event = False
-                    
-                    for msg in new_messages:
-                        msg_content = str(msg.content)
-                        print(f"[DEBUG] New message - Type: {msg.type}, Content length: {len(msg_content)}")
-                        
-                        # ユーザー入力待ちマーカーをチェック（ToolMessageの場合）
-                        if msg.type == 'tool' and isinstance(msg_content, str):
-                            if msg_content.startswith("__WAITING_FOR_USER_INPUT__:"):
-                                # マーカーをパース
-                                parts = msg_content.split(":", 2)
-                                if len(parts) >= 3:
-                                    waiting_for_input = True
-                                    waiting_interaction_id = int(parts[1])
-                                    waiting_question = parts[2]
-                                    print("[DEBUG] Detected waiting marker, breaking stream loop")
-                                    break
-                        
-                        # ツール呼び出しをチェック
-                        if hasattr(msg, 'tool_calls'):
-                            tool_calls = getattr(msg, 'tool_calls', [])
-                            if tool_calls:
-                                print(f"[DEBUG] Message has {len(tool_calls)} tool calls")
-                                for tc in tool_calls:
-                                    tool_name = tc.get('name') if isinstance(tc, dict) else getattr(tc, 'name', 'unknown')
-                                    print(f"[DEBUG] Tool call: {tool_name}")
-                        
-                        # 内容の一部を表示（デバッグ用）
-                        if len(msg_content) > 0:
-                            preview = msg_content[:100] + "..." if len(msg_content) > 100 else msg_content
-                            print(f"[DEBUG] Content preview: {preview}")
-                        
-                        # コールバックを呼び出し
-                        if callback:
-                            callback({
-                                "type": msg.type,
-                                "content": msg.content,
-                                "message": msg
-                            })
-                    all_messages = messages
+                for payload in tracker.process(event):
+                    if callback:
+                        callback(payload)
                 
-                # 内側のループでbreakした場合、外側のループも抜ける
-                if waiting_for_input:
+                # ユーザー入力待ちを検出した場合はストリームを抜ける
+                if tracker.waiting_for_input:
                     break
             
-            print(f"[DEBUG] Agent.stream completed. Total events: {event_count}, Total messages: {len(all_messages)}")
+            return self._finish_streaming(tracker)
             
-            # ユーザー入力待ちの場合、例外をスロー
-            if waiting_for_input and waiting_question and waiting_interaction_id is not None:
-                print("[DEBUG] Raising HumanInputRequiredException")
-                from app.exceptions import HumanInputRequiredException
-                raise HumanInputRequiredException(
-                    question=waiting_question,
-                    interaction_id=waiting_interaction_id
-                )
-            
-            # 最終結果
-            final_message = all_messages[-1] if all_messages else None
+        except Exception as e:
+            return self._build_error(e)
+    
+    async def aexecute_with_streaming(
+        self,
+        task: str,
+        thread_id: str = "default",
+        callback=None,
+        auto_mode: bool = False
+    ) -> Dict[str, Any]:
+        """
+        タスクを非同期でストリーミング実行（execute_with_streamingの非同期版）
+        
+        Args:
+            task: 実行するタスクの説明
+            thread_id: スレッドID
+            callback: イベントコールバック関数（コルーチン関数も可）
+            auto_mode: 自動実行モード（Trueの場合、ユーザー確認なしで実行）
             
-            # 念のため最終メッセージでもマーカーをチェック
-            if final_message and isinstance(final_message.content, str):
-                if final_message.content.startswith("__WAITING_FOR_USER_INPUT__:"):
-                    # マーカーをパース: __WAITING_FOR_USER_INPUT__:interaction_id:question
-                    parts = final_message.content.split(":", 2)
-                    if len(parts) >= 3:
-                        interaction_id = int(parts[1])
-                        question = parts[2]
-                        from app.exceptions import HumanInputRequiredException
-                        raise HumanInputRequiredException(question=question, interaction_id=interaction_id)
+        Returns:
+            Dict[str, Any]: 実行結果
+        """
+        try:
+            config = self._build_config(thread_id)
+            agent_input = self._build_input(task, auto_mode)
+            history = await asyncio.to_thread(self._load_history, config)
+            tracker = _StreamTracker(history)
+            is_coroutine = asyncio.iscoroutinefunction(callback)
+            
+            async def emit(payloads: List[Dict[str, Any]]) -> None:
+                for payload in payloads:
+                    if callback:
+                        if is_coroutine:
+                            await callback(payload)
+                        else:
+                            callback(payload)
+            
+            await emit(tracker.process_messages(agent_input["messages"]))
+            
+            async for event in self.agent.astream(
+                agent_input,
+                config=config,
+                stream_mode="updates"
+            ):
+                await emit(tracker.process(event))
+                
+                # ユーザー入力待ちを検出した場合はストリームを抜ける
+                if tracker.waiting_for_input:
+                    break
             
-            return {
-                "success": True,
-                "result": final_message.content if final_message else "タスクを完了しました",
-                "messages": [
-                    {
-                        "role": msg.type,
-                        "content": msg.content
-                    }
-                    for msg in all_messages
-                ],
-                "steps": len(all_messages)
-            }
+            return self._finish_streaming(tracker)
             
         except Exception as e:
-            # HumanInputRequiredExceptionは再スロー（タスク一時停止のため）
+            return self._build_error(e)
+    
+    def _finish_streaming(self, tracker: "_StreamTracker") -> Dict[str, Any]:
+        """ストリーミング実行の後処理"""
+        logger.debug("Agent.stream completed. Total events: %d, Total messages: %d",
+                     tracker.event_count, tracker.step_count)
+        
+        # ユーザー入力待ちの場合、例外をスロー
+        if tracker.waiting_for_input and tracker.waiting_question and tracker.waiting_interaction_id is not None:
+            logger.debug("Raising HumanInputRequiredException")
             from app.exceptions import HumanInputRequiredException
-            if isinstance(e, HumanInputRequiredException):
-                raise
-            
-            return {
-                "success": False,
-                "error": f"タスクの実行に失敗しました: {str(e)}",
-                "result": None
-            }
+            raise HumanInputRequiredException(
+                question=tracker.waiting_question,
+                interaction_id=tracker.waiting_interaction_id
+            )
+        
+        # 念のため最終メッセージでもマーカーをチェック
+        self._raise_if_waiting(tracker.final_message)
+        
+        return self._build_result(tracker.final_message, tracker.result_messages, tracker.step_count)
     
     def execute_with_history(
         self,
@@ -472,13 +487,7 @@ human_inputツールを使わずに質問を返すことは、このシステム
             state = self.checkpointer.get(config)
             
             if state and "messages" in state:
-                return [
-                    {
-                        "role": msg.type,
-                        "content": msg.content
-                    }
-                    for msg in state["messages"]
-                ]
+                return _messages_to_dicts(state["messages"])
             return []
         except Exception:
             return []
@@ -514,7 +523,7 @@ human_inputツールを使わずに質問を返すことは、このシステム
             response: ユーザーの応答
         """
         if not self.enable_memory or not self.checkpointer:
-            print("[WARNING] Memory is not enabled, cannot add user response to state")
+            logger.warning("Memory is not enabled, cannot add user response to state")
             return
         
         try:
@@ -523,7 +532,7 @@ human_inputツールを使わずに質問を返すことは、このシステム
             current_state = self.agent.get_state(config)
             
             if not current_state or not current_state.values:
-                print(f"[WARNING] No state found for thread_id: {thread_id}")
+                logger.warning("No state found for thread_id: %s", thread_id)
                 return
             
             # ToolMessageを作成してユーザーの応答を追加
@@ -538,12 +547,107 @@ human_inputツールを使わずに質問を返すことは、このシステム
                 {"messages": [tool_message]}
             )
             
-            print(f"[INFO] Added user response to state for thread_id: {thread_id}")
-            print(f"[INFO] Tool call ID: {tool_call_id}")
-            print(f"[INFO] Response: {response}")
+            logger.info("Added user response to state for thread_id: %s (tool call ID: %s)",
+                        thread_id, tool_call_id)
+            logger.debug("Response: %s", response)
             
         except Exception as e:
-            print(f"[ERROR] Failed to add user response to state: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Failed to add user response to state: %s", e)
+    
+
+
+class _StreamTracker:
+    """
+    stream_mode="updates"のイベントから新しいメッセージを取り出す
+    
+    同期版・非同期版のストリーミング実行で共通の処理です。
+    updatesモードでは各ノードが追加したメッセージだけが届くため、
+    既存の会話履歴は開始時に一度だけ受け取り、結果用の辞書はストリーム中に逐次作成します。
+    """
+    
+    def __init__(self, history: List[Any] = None):
+        """
+        Args:
+            history: スレッドの既存の会話履歴（コールバックは不要）
+        """
+        history = history or []
+        self.result_messages: List[Dict[str, Any]] = _messages_to_dicts(history)
+        self.final_message = history[-1] if history else None
+        # 処理済みメッセージ数（既存の会話履歴を含む）
+        self.step_count = len(history)
+        self.event_count = 0
+        self.waiting_for_input = False
+        self.waiting_interaction_id = None
+        self.waiting_question = None
+    
+    def process(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        イベント（{ノード名: 更新内容}）を処理し、コールバックに渡すペイロードのリストを返す
+        
+        Args:
+            event: ストリームイベント
+            
+        Returns:
+            List[Dict[str, Any]]: コールバック用ペイロードのリスト
+        """
+        self.event_count += 1
+        
+        payloads = []
+        for node, update in event.items():
+            # __interrupt__ などメッセージ更新以外のイベントは対象外
+            if not isinstance(update, dict):
+                continue
+            messages = update.get("messages", [])
+            logger.debug("Event #%d from %s", self.event_count, node)
+            payloads.extend(self.process_messages(messages))
+            if self.waiting_for_input:
+                break
+        
+        return payloads
     
+    def process_messages(self, new_messages: List[Any]) -> List[Dict[str, Any]]:
+        """
+        新しく追加されたメッセージを処理し、コールバックに渡すペイロードのリストを返す
+        
+        Args:
+            new_messages: 新しいメッセージのリスト
+            
+        Returns:
+            List[Dict[str, Any]]: コールバック用ペイロードのリスト
+        """
+        payloads = []
+        if not new_messages:
+            return payloads
+        self.final_message = new_messages[-1]
+        
+        for msg in new_messages:
+            # ユーザー入力待ちマーカーをチェック（ToolMessageの場合）
+            if msg.type == 'tool' and isinstance(msg.content, str):
+                if msg.content.startswith("__WAITING_FOR_USER_INPUT__:"):
+                    # マーカーをパース
+                    parts = msg.content.split(":", 2)
+                    if len(parts) >= 3:
+                        self.waiting_for_input = True
+                        self.waiting_interaction_id = int(parts[1])
+                        self.waiting_question = parts[2]
+                        logger.debug("Detected waiting marker, breaking stream loop")
+                        break
+            
+            # ツール呼び出しをログ出力（デバッグ時のみ）
+            if logger.isEnabledFor(logging.DEBUG):
+                tool_calls = getattr(msg, 'tool_calls', None)
+                if tool_calls:
+                    logger.debug("Message has tool calls: %s", [
+                        tc.get('name') if isinstance(tc, dict) else getattr(tc, 'name', 'unknown')
+                        for tc in tool_calls
+                    ])
+            
+            self.result_messages.append(_message_to_dict(msg))
+            self.step_count += 1
+            payloads.append({
+                "type": msg.type,
+                "content": msg.content,
+                "message": msg
+            })
+        
+        return payloads
@@ -0,0 +1,25 @@
+"""
+LLMクライアントのキャッシュ用ユーティリティ
+
+LangChainのチャットモデルは生成時にHTTPクライアントや接続プールを作るため、
+同じ設定のインスタンスを使い回してTCP/TLS接続を再利用します。
+"""
+from typing import Any, Dict, Optional, Tuple
+
+
+def freeze_config(config: Dict[str, Any]) -> Optional[Tuple[Tuple[str, Any], ...]]:
+    """
+    LLM設定をキャッシュキーに使えるタプルに変換
+
+    Args:
+        config: LLM設定
+
+    Returns:
+        Optional[Tuple]: ソート済みの (キー, 値) タプル。ハッシュ不可能な値を含む場合はNone
+    """
+    try:
+        frozen = tuple(sorted(config.items()))
+        hash(frozen)
+    except TypeError:
+        return None
+    return frozen
@@ -2,8 +2,10 @@
 Supervisor Pattern Implementation
 複数のワーカーエージェントを統括し、タスクを適切に分配・実行します。
 """
-from typing import List, Dict, Any, Annotated
+from typing import List, Dict, Any, Annotated, Union
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.sqlite import SqliteSaver
@@ -11,9 +13,17 @@ from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_community.chat_models import ChatOllama
+import asyncio
+import contextvars
+import functools
+import json
 import operator
+import re
+import threading
+from collections import OrderedDict
 from app.models import Agent
 from app.tools import ToolRegistry
+from app.agents.llm_cache import freeze_config
 
 # Watsonxは条件付きインポート
 try:
@@ -23,10 +33,96 @@ except ImportError:
     WATSONX_AVAILABLE = False
 
 
+def _build_llm(provider: str, model: str, config: Dict[str, Any]):
+    """
+    LLMインスタンスを作成
+    
+    Args:
+        provider: LLMプロバイダー名
+        model: モデル名
+        config: LLM設定
+        
+    Returns:
+        LLMインスタンス
+    """
+    temperature = config.get("temperature", 0.7)
+    max_tokens = config.get("max_tokens", 2000)
+    
+    if provider == "openai":
+        base_url = config.get("base_url")
+        api_key = config.get("api_key", "dummy")
+        return ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            api_key=api_key,
+            base_url=base_url
+        )
+    elif provider == "anthropic":
+        api_key = config.get("api_key", "dummy")
+        return ChatAnthropic(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            api_key=api_key
+        )
+    elif provider == "gemini":
+        api_key = config.get("api_key", "dummy")
+        return ChatGoogleGenerativeAI(
+            model=model,
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            google_api_key=api_key
+        )
+    elif provider == "ollama":
+        base_url = config.get("base_url", "http://localhost:11434")
+        return ChatOllama(
+            model=model,
+            temperature=temperature,
+            base_url=base_url
+        )
+    elif provider == "watsonx":
+        if not WATSONX_AVAILABLE:
+            raise ValueError("Watsonx is not available. Please install langchain-ibm.")
+        
+        url = config.get("url", "https://us-south.ml.cloud.ibm.com")
+        api_key = config.get("api_key", "dummy")
+        project_id = config.get("project_id", "")
+        
+        return WatsonxLLM(
+            model_id=model,
+            url=url,
+            apikey=api_key,
+            project_id=project_id,
+            params={
+                "temperature": temperature,
+                "max_new_tokens": max_tokens
+            }
+        )
+    else:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+
+
+@functools.lru_cache(maxsize=64)
+def _get_llm_cached(provider: str, model: str, frozen_config: tuple):
+    """(プロバイダー, モデル, 設定) ごとにLLMインスタンスをキャッシュして返す"""
+    return _build_llm(provider, model, dict(frozen_config))
+
+
+# コンパイル済みグラフのキャッシュ（チーム構成ごと、LRU）
+# コンパイル済みグラフはスレッド間で共有でき、状態はthread_idごとにチェックポインターに保存される
+GRAPH_CACHE_SIZE = 32
+_graph_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+_graph_cache_lock = threading.Lock()
+
+# 複数ワーカーを並列実行するノード名
+PARALLEL_NODE = "parallel_workers"
+
+
 class SupervisorState(Dict):
     """Supervisorの状態管理"""
     messages: Annotated[List, operator.add]
-    next: str
+    next: Union[str, List[str]]  # 複数のワーカー名の場合は並列実行
     task_description: str
     worker_results: Dict[str, Any]
 
@@ -48,14 +144,83 @@ class SupervisorAgent:
         """
         self.supervisor = supervisor
         self.workers = {w.name: w for w in workers}
+        # ワーカー名（グラフのノードからはORMオブジェクトではなくこちらを参照する）
+        self._worker_names = tuple(self.workers)
         self.tool_registry = tool_registry
         self.checkpointer = checkpointer
         
+        # ツール名 → 解決済みツール（見つからない場合はNone）
+        self._tool_cache: Dict[str, Any] = {}
+        
         # Supervisorの選択肢（ワーカー名 + FINISH）
         self.options = list(self.workers.keys()) + ["FINISH"]
         
-        # グラフの構築
-        self.graph = self._build_graph()
+        # 次のワーカー抽出用
+        # FINISHは応答のどこにあっても優先するため、ワーカー名とは別に検索する
+        self._finish_pattern = re.compile(r"\bFINISH\b", re.IGNORECASE)
+        # ワーカー名は1回の走査で検索（前方一致で短い名前が先にマッチしないよう長い名前から並べる）
+        alternatives = [re.escape(name) for name in sorted(self.workers, key=len, reverse=True)]
+        self._worker_pattern = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+        self._worker_lookup = {name.upper(): name for name in self.workers}
+        
+        # 並列実行用: 1行にカンマ区切りで列挙された複数のワーカー名（例: "researcher, analyst"）
+        # 理由の説明文（"researcher and writer have ..."）で並列実行しないよう、行全体が一覧の場合のみ対象にする
+        names = "|".join(alternatives)
+        self._worker_list_pattern = re.compile(
+            rf"^[ \t]*(?:[-*][ \t]+)?[\"'`]?((?:{names})(?:[ \t]*,[ \t]*(?:{names}))+)[\"'`]?[ \t]*\.?[ \t]*$",
+            re.IGNORECASE | re.MULTILINE
+        ) if len(self.workers) > 1 else None
+        
+        # ワーカー名 → ワーカーエージェント（並列実行ノードから呼び出す）
+        self._worker_agents: Dict[str, Any] = {}
+        
+        # Supervisorの決定 → 遷移先ノードのルーティングテーブル
+        self._route_table = {name: name for name in self.workers} | {"FINISH": END}
+        if self._worker_list_pattern is not None:
+            self._route_table[PARALLEL_NODE] = PARALLEL_NODE
+        
+        # Supervisorのシステムプロンプト（グラフ構築ごとに作り直さない）
+        self._supervisor_prompt = self._create_supervisor_prompt()
+        
+        # グラフの構築（同じチーム構成のコンパイル済みグラフは使い回す）
+        self.graph = self._get_or_build_graph()
+    
+    def _graph_cache_key(self) -> tuple:
+        """
+        コンパイル済みグラフのキャッシュキーを作成
+        
+        エージェントの設定変更（LLM設定・ツール等）で古いグラフを使わないよう、updated_atも含めます。
+        ToolRegistryの登録内容はクラスで共有されるため、インスタンスではなくバージョンをキーにします
+        （タスクごとに新しいインスタンスが渡されるため、idではキャッシュが当たらない）。
+        
+        キャッシュされたグラフのノードは構築時のSupervisorAgentを参照し続けるため、
+        ノードの実行時にはORMオブジェクト（supervisor, workers）の属性を読まないようにしています。
+        """
+        return (
+            self.supervisor.id,
+            self.supervisor.updated_at,
+            tuple(sorted((w.id, w.updated_at) for w in self.workers.values())),
+            ToolRegistry.version(),
+            id(self.checkpointer)
+        )
+    
+    def _get_or_build_graph(self):
+        """キャッシュ済みのコンパイル済みグラフを取得（無ければ構築してキャッシュ）"""
+        key = self._graph_cache_key()
+        with _graph_cache_lock:
+            graph = _graph_cache.get(key)
+            if graph is not None:
+                _graph_cache.move_to_end(key)
+                return graph
+        
+        # コンパイルはロックの外で行い、同時に構築された場合は先に登録された方を使う
+        graph = self._build_graph()
+        with _graph_cache_lock:
+            graph = _graph_cache.setdefault(key, graph)
+            _graph_cache.move_to_end(key)
+            while len(_graph_cache) > GRAPH_CACHE_SIZE:
+                _graph_cache.popitem(last=False)
+        return graph
     
     def _create_supervisor_prompt(self) -> str:
         """Supervisor用のシステムプロンプトを作成"""
@@ -79,23 +244,26 @@ Available workers: {', '.join(self.workers.keys())}
 
 When you're ready to assign work, respond with:
 - The name of the worker to assign the task to
+- OR a comma-separated list of worker names on its own line (e.g. "worker_a, worker_b") to run independent subtasks in parallel
 - OR "FINISH" if the task is complete
 
 Always explain your reasoning for each decision."""
     
-    def _create_supervisor_node(self):
+    def _create_supervisor_node(self, llm=None):
         """Supervisorノードを作成（次のワーカーを選択）"""
-        llm = self._create_llm(
-            self.supervisor.llm_provider,
-            self.supervisor.llm_model,
-            self.supervisor.llm_config or {}
-        )
+        if llm is None:
+            llm = self._create_llm(
+                self.supervisor.llm_provider,
+                self.supervisor.llm_model,
+                self.supervisor.llm_config or {}
+            )
         
-        system_prompt = self._create_supervisor_prompt()
+        # SystemMessageは一度だけ生成し、各ターンで使い回す
+        system_message = SystemMessage(content=self._supervisor_prompt)
         
         def supervisor_node(state: SupervisorState) -> Dict:
             """Supervisorが次のアクションを決定"""
-            messages = [SystemMessage(content=system_prompt)] + state["messages"]
+            messages = [system_message, *state["messages"]]
             
             # LLMに次のワーカーを選択させる
             response = llm.invoke(messages)
@@ -110,25 +278,36 @@ Always explain your reasoning for each decision."""
         
         return supervisor_node
     
-    def _extract_next_worker(self, content: str) -> str:
+    def _extract_next_worker(self, content: str) -> Union[str, List[str]]:
         """LLMの応答から次のワーカー名を抽出"""
-        content_upper = content.upper()
-        
-        # FINISHが含まれているかチェック
-        if "FINISH" in content_upper:
+        # FINISHが含まれていれば、理由の説明中のワーカー名より優先して終了
+        if self._finish_pattern.search(content):
             return "FINISH"
         
-        # ワーカー名が含まれているかチェック
-        for worker_name in self.workers.keys():
-            if worker_name.upper() in content_upper:
-                return worker_name
+        match = self._worker_pattern.search(content) if self._worker_pattern else None
         
         # デフォルトは最初のワーカー
-        return list(self.workers.keys())[0] if self.workers else "FINISH"
+        if not match:
+            return next(iter(self._worker_names), "FINISH")
+        
+        token = match.group(0).upper()
+        
+        # カンマ区切りのワーカー名だけの行があれば並列実行
+        if self._worker_list_pattern is not None:
+            list_match = self._worker_list_pattern.search(content)
+            if list_match:
+                names = list(dict.fromkeys(
+                    self._worker_lookup[m.group(0).upper()]
+                    for m in self._worker_pattern.finditer(list_match.group(1))
+                ))
+                if len(names) > 1:
+                    return names
+        
+        return self._worker_lookup.get(token, next(iter(self._worker_names), "FINISH"))
     
     def _create_llm(self, provider: str, model: str, config: Dict[str, Any]):
         """
-        LLMインスタンスを作成
+        LLMインスタンスを取得（同じ設定のインスタンスは共有）
         
         Args:
             provider: LLMプロバイダー名
@@ -138,92 +317,44 @@ Always explain your reasoning for each decision."""
         Returns:
             LLMインスタンス
         """
-        temperature = config.get("temperature", 0.7)
-        max_tokens = config.get("max_tokens", 2000)
-        
-        if provider == "openai":
-            base_url = config.get("base_url")
-            api_key = config.get("api_key", "dummy")
-            return ChatOpenAI(
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                api_key=api_key,
-                base_url=base_url
-            )
-        elif provider == "anthropic":
-            api_key = config.get("api_key", "dummy")
-            return ChatAnthropic(
-                model=model,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                api_key=api_key
-            )
-        elif provider == "gemini":
-            api_key = config.get("api_key", "dummy")
-            return ChatGoogleGenerativeAI(
-                model=model,
-                temperature=temperature,
-                max_output_tokens=max_tokens,
-                google_api_key=api_key
-            )
-        elif provider == "ollama":
-            base_url = config.get("base_url", "http://localhost:11434")
-            return ChatOllama(
-                model=model,
-                temperature=temperature,
-                base_url=base_url
-            )
-        elif provider == "watsonx":
-            if not WATSONX_AVAILABLE:
-                raise ValueError("Watsonx is not available. Please install langchain-ibm.")
-            
-            url = config.get("url", "https://us-south.ml.cloud.ibm.com")
-            api_key = config.get("api_key", "dummy")
-            project_id = config.get("project_id", "")
-            
-            return WatsonxLLM(
-                model_id=model,
-                url=url,
-                apikey=api_key,
-                project_id=project_id,
-                params={
-                    "temperature": temperature,
-                    "max_new_tokens": max_tokens
-                }
-            )
-        else:
-            raise ValueError(f"Unsupported LLM provider: {provider}")
+        frozen = freeze_config(config)
+        if frozen is None:
+            return _build_llm(provider, model, config)
+        return _get_llm_cached(provider, model, frozen)
     
-    def _create_worker_node(self, worker_name: str):
+    def _create_worker_node(self, worker_name: str, llm=None):
         """ワーカーノードを作成"""
         worker = self.workers[worker_name]
         
         # ワーカーのLLMを取得
-        llm = self._create_llm(
-            worker.llm_provider,
-            worker.llm_model,
-            worker.llm_config or {}
-        )
+        if llm is None:
+            llm = self._create_llm(
+                worker.llm_provider,
+                worker.llm_model,
+                worker.llm_config or {}
+            )
         
-        # ワーカーのツールを取得
+        # ワーカーのツールを取得（解決済みのツールはキャッシュから）
         tools = []
-        if worker.tool_names:
-            for tool_name in worker.tool_names:
-                tool = self.tool_registry.get_tool(tool_name)
-                if tool:
-                    tools.append(tool)
+        for tool_name in worker.tool_names_list:
+            tool = self._resolve_tool(tool_name)
+            if tool:
+                tools.append(tool)
+        
+        # ワーカーのシステムメッセージ（固定内容のため事前に生成）
+        system_message = SystemMessage(content=f"""You are {worker.name}.
+Role: {worker.role or 'Worker agent'}
+Description: {worker.description or 'Execute assigned tasks'}
+
+Execute the task assigned to you by the supervisor and report your results.""")
         
         # ワーカーエージェントを作成
         worker_agent = create_react_agent(
             llm,
             tools=tools,
-            state_modifier=f"""You are {worker.name}.
-Role: {worker.role or 'Worker agent'}
-Description: {worker.description or 'Execute assigned tasks'}
-
-Execute the task assigned to you by the supervisor and report your results."""
+            state_modifier=system_message
         )
+        self._worker_agents[worker_name] = worker_agent
         
         def worker_node(state: SupervisorState) -> Dict:
             """ワーカーがタスクを実行"""
@@ -241,16 +372,106 @@ Execute the task assigned to you by the supervisor and report your results."""
         
         return worker_node
     
+    def _create_parallel_node(self):
+        """
+        複数のワーカーを並列実行するノードを作成
+        
+        同期実行（invoke/stream）ではスレッドプール、非同期実行（ainvoke/astream）では
+        asyncio.gatherで各ワーカーを同時に呼び出し、追加されたメッセージをSupervisorの指定順にまとめます。
+        """
+        def merge_results(state: SupervisorState, names: List[str], results: List[Dict]) -> Dict:
+            history_length = len(state["messages"])
+            worker_results = dict(state.get("worker_results") or {})
+            messages = []
+            for name, result in zip(names, results):
+                worker_results[name] = result
+                # 各ワーカーの結果には入力の履歴も含まれるため、新しいメッセージだけを追加
+                messages.extend(result["messages"][history_length:])
+            return {
+                "messages": messages,
+                "worker_results": worker_results,
+                "next": "supervisor"
+            }
+        
+        def parallel_node(state: SupervisorState) -> Dict:
+            """複数のワーカーがタスクを並列実行"""
+            names = state["next"]
+            with ThreadPoolExecutor(max_workers=len(names)) as executor:
+                # LangGraphの実行設定（コールバック等）を各スレッドに引き継ぐ
+                futures = [
+                    executor.submit(
+                        contextvars.copy_context().run,
+                        self._worker_agents[name].invoke,
+                        state
+                    )
+                    for name in names
+                ]
+                results = [future.result() for future in futures]
+            return merge_results(state, names, results)
+        
+        async def aparallel_node(state: SupervisorState) -> Dict:
+            """複数のワーカーがタスクを並列実行（非同期）"""
+            names = state["next"]
+            results = await asyncio.gather(*(
+                self._worker_agents[name].ainvoke(state) for name in names
+            ))
+            return merge_results(state, names, list(results))
+        
+        return RunnableLambda(parallel_node, afunc=aparallel_node, name=PARALLEL_NODE)
+    
+    def _resolve_tool(self, tool_name: str):
+        """ツールレジストリからツールを取得（SupervisorAgentの生存期間中はキャッシュ）"""
+        if tool_name not in self._tool_cache:
+            self._tool_cache[tool_name] = self.tool_registry.get_tool(tool_name)
+        return self._tool_cache[tool_name]
+    
+    def _get_shared_llm(self, agent: Agent, llm_cache: Dict[tuple, Any]):
+        """
+        同じ (プロバイダー, モデル, 設定) のエージェント間でLLMインスタンスを共有
+        
+        Args:
+            agent: エージェント
+            llm_cache: グラフ構築中に共有するLLMのキャッシュ
+            
+        Returns:
+            LLMインスタンス
+        """
+        config = agent.llm_config or {}
+        key = (agent.llm_provider, agent.llm_model, json.dumps(config, sort_keys=True, default=str))
+        llm = llm_cache.get(key)
+        if llm is None:
+            llm = self._create_llm(agent.llm_provider, agent.llm_model, config)
+            llm_cache[key] = llm
+        return llm
+    
     def _build_graph(self) -> StateGraph:
         """LangGraphのグラフを構築"""
         workflow = StateGraph(SupervisorState)
         
+        # 同一設定のノード間でLLM（と接続プール）を共有
+        llm_cache: Dict[tuple, Any] = {}
+        
+        # 全ワーカーが使うツールを重複なく一度だけ解決
+        for tool_name in set().union(*(w.tool_names_list for w in self.workers.values())):
+            self._resolve_tool(tool_name)
+        
         # Supervisorノードを追加
-        workflow.add_node("supervisor", self._create_supervisor_node())
+        workflow.add_node(
+            "supervisor",
+            self._create_supervisor_node(self._get_shared_llm(self.supervisor, llm_cache))
+        )
         
         # 各ワーカーノードを追加
-        for worker_name in self.workers.keys():
-            workflow.add_node(worker_name, self._create_worker_node(worker_name))
+        for worker_name, worker in self.workers.items():
+            workflow.add_node(
+                worker_name,
+                self._create_worker_node(worker_name, self._get_shared_llm(worker, llm_cache))
+            )
+        
+        # 複数ワーカーの並列実行ノードを追加（ワーカーが2人以上の場合）
+        if PARALLEL_NODE in self._route_table:
+            workflow.add_node(PARALLEL_NODE, self._create_parallel_node())
+            workflow.add_edge(PARALLEL_NODE, "supervisor")
         
         # エッジを追加
         # 各ワーカーからSupervisorへ
@@ -258,17 +479,18 @@ Execute the task assigned to you by the supervisor and report your results."""
             workflow.add_edge(worker_name, "supervisor")
         
         # Supervisorから各ワーカーまたはFINISHへの条件付きエッジ
+        # 遷移先の解決はルーティングテーブルに任せる
         def route_supervisor(state: SupervisorState) -> str:
             """Supervisorの決定に基づいてルーティング"""
             next_node = state.get("next", "FINISH")
-            if next_node == "FINISH":
-                return END
+            if isinstance(next_node, list):
+                return PARALLEL_NODE
             return next_node
         
         workflow.add_conditional_edges(
             "supervisor",
             route_supervisor,
-            {worker: worker for worker in self.workers.keys()} | {"FINISH": END}
+            self._route_table
         )
         
         # 開始ノードを設定
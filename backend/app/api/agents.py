@@ -1,307 +1,369 @@
-from flask import Blueprint, request, jsonify
+import orjson
+from flask import Blueprint, request
+from werkzeug.exceptions import NotFound
+from sqlalchemy import func
 from app import db
-from app.models import Agent
+from app.api.responses import api_endpoint, error_response, ojsonify, stream_ojsonify_list
+from app.api.response_cache import invalidate_on_write
+from app.api.validation import compile_validator, json_equal
+from app.models import Agent, ExecutionLog, Task, Tool
+from app.models.agent import agent_tools
 from app.services.agent_service import AgentService
 
 agents_bp = Blueprint('agents', __name__)
+# チーム一覧・詳細にはメンバーのエージェント情報が含まれるため、エージェントの更新時にも無効化
+invalidate_on_write(agents_bp, 'teams')
 agent_service = AgentService()
 
+# update_agentで更新可能なフィールド
+_UPDATABLE_AGENT_FIELDS = frozenset({
+    'name', 'role', 'description', 'llm_provider',
+    'llm_model', 'llm_config', 'personality', 'status',
+    'tool_names', 'agent_type', 'supervisor_id'
+})
+# JSONカラム（キー順序の違いで変更扱いにしない）
+_AGENT_JSON_FIELDS = frozenset({'llm_config', 'personality'})
+
+
+# create_agentのリクエストボディ
+_AGENT_POST_VALIDATOR = compile_validator({
+    'type': 'object',
+    'required': ['name', 'llm_provider', 'llm_model'],
+    'properties': {
+        'name': {'type': 'string'},
+        'role': {'type': ['string', 'null']},
+        'description': {'type': ['string', 'null']},
+        'llm_provider': {'type': 'string'},
+        'llm_model': {'type': 'string'},
+        'llm_config': {'type': ['object', 'null']},
+        'personality': {'type': ['string', 'null']},
+        'tool_names': {'type': ['array', 'string', 'null'], 'items': {'type': 'string'}},
+        'agent_type': {'enum': ['supervisor', 'worker']},
+        'supervisor_id': {'type': ['integer', 'null']}
+    }
+})
+
+
+# 一覧取得用のカラム（Agent.to_dictが出力するカラムのみ）
+_AGENT_LIST_COLUMNS = (
+    Agent.id, Agent.name, Agent.role, Agent.description,
+    Agent.llm_provider, Agent.llm_model, Agent.llm_config, Agent.personality,
+    Agent.tool_names, Agent.agent_type, Agent.supervisor_id, Agent.status,
+    Agent.created_at, Agent.updated_at
+)
+_AGENT_LIST_KEYS = tuple(column.key for column in _AGENT_LIST_COLUMNS)
+
+
+def _agent_not_found(agent_id):
+    return error_response(f'Agent {agent_id} not found', 404)
+
+
+# ツール一覧取得用のカラム（Tool.to_dictが出力するカラムのみ）
+_TOOL_COLUMNS = (
+    Tool.id, Tool.name, Tool.category, Tool.description, Tool.type, Tool.config,
+    Tool.is_builtin, Tool.is_active, Tool.created_at, Tool.updated_at
+)
+_TOOL_KEYS = tuple(column.key for column in _TOOL_COLUMNS)
+
+
+def agent_tool_dicts(agent_id):
+    """
+    エージェントに紐づくツールをTool.to_dictと同じ形式の辞書で取得
+    
+    ツールと使用回数を関連テーブル・集計サブクエリとの結合で1回のクエリで取得します。
+    
+    Args:
+        agent_id: エージェントID
+        
+    Raises:
+        NotFound: エージェントが存在しない場合
+    """
+    usage_counts = (
+        db.session.query(ExecutionLog.tool_id, func.count(ExecutionLog.id).label('usage_count'))
+        .group_by(ExecutionLog.tool_id)
+        .subquery()
+    )
+    rows = (
+        db.session.query(*_TOOL_COLUMNS, func.coalesce(usage_counts.c.usage_count, 0))
+        .join(agent_tools, agent_tools.c.tool_id == Tool.id)
+        .outerjoin(usage_counts, usage_counts.c.tool_id == Tool.id)
+        .filter(agent_tools.c.agent_id == agent_id)
+        .all()
+    )
+    
+    # ツールが無い場合のみエージェントの存在を確認
+    if not rows and not db.session.query(db.exists().where(Agent.id == agent_id)).scalar():
+        raise NotFound(f'Agent {agent_id} not found')
+    
+    tools = []
+    for row in rows:
+        data = dict(zip(_TOOL_KEYS, row))
+        data['created_at'] = data['created_at'].isoformat() if data['created_at'] else None
+        data['updated_at'] = data['updated_at'].isoformat() if data['updated_at'] else None
+        data['usage_count'] = row[-1]
+        tools.append(data)
+    return tools
+
+
+def iter_agent_dicts(agent_type=None, supervisor_id=None, batch_size=500):
+    """
+    エージェント一覧をAgent.to_dictと同じ形式の辞書で1件ずつ返すイテレータを取得
+    
+    ORMインスタンスを生成せずにカラムの値から直接辞書を作成し、
+    タスク数・ワーカー数・Supervisor名はそれぞれ1回の集計クエリで取得します。
+    エージェント本体はyield_perでbatch_size件ずつ読み込みます。
+    
+    Args:
+        agent_type: エージェントタイプで絞り込む場合に指定（supervisor, worker）
+        supervisor_id: 指定したSupervisorのワーカーに絞り込む場合に指定
+        batch_size: 1回に読み込む行数
+    """
+    tasks_query = db.session.query(Task.assigned_to, func.count(Task.id))
+    if supervisor_id is not None:
+        tasks_query = tasks_query.filter(
+            Task.assigned_to.in_(db.session.query(Agent.id).filter(Agent.supervisor_id == supervisor_id))
+        )
+    tasks_counts = dict(tasks_query.group_by(Task.assigned_to).all())
+    workers_counts = dict(
+        db.session.query(Agent.supervisor_id, func.count(Agent.id))
+        .filter(Agent.supervisor_id.isnot(None))
+        .group_by(Agent.supervisor_id)
+        .all()
+    )
+    # 参照されているSupervisorの名前（ワーカー数の集計キーがそのままSupervisor IDの集合）
+    supervisor_names = dict(
+        db.session.query(Agent.id, Agent.name).filter(Agent.id.in_(workers_counts.keys())).all()
+    ) if workers_counts else {}
+    
+    query = db.session.query(*_AGENT_LIST_COLUMNS)
+    if agent_type:
+        query = query.filter(Agent.agent_type == agent_type)
+    if supervisor_id is not None:
+        query = query.filter(Agent.supervisor_id == supervisor_id)
+    # ここでクエリを実行し、DBエラーは呼び出し元で捕捉できるようにする
+    rows = iter(query.yield_per(batch_size))
+    
+    def generate():
+        for row in rows:
+            data = dict(zip(_AGENT_LIST_KEYS, row))
+            tool_names = Agent.parse_tool_names(row.tool_names)
+            data['tool_names'] = tool_names
+            data['created_at'] = row.created_at.isoformat() if row.created_at else None
+            data['updated_at'] = row.updated_at.isoformat() if row.updated_at else None
+            data['tasks_count'] = tasks_counts.get(row.id, 0)
+            data['tools_count'] = len(tool_names)
+            
+            # Supervisorの場合、ワーカー数を追加
+            if row.agent_type == 'supervisor':
+                data['workers_count'] = workers_counts.get(row.id, 0)
+            
+            # Workerの場合、Supervisor情報を追加
+            if row.supervisor_id in supervisor_names:
+                data['supervisor'] = {
+                    'id': row.supervisor_id,
+                    'name': supervisor_names[row.supervisor_id]
+                }
+            
+            yield data
+    
+    return generate()
+
+
+def list_agent_dicts(agent_type=None):
+    """
+    エージェント一覧をAgent.to_dictと同じ形式の辞書のリストで取得
+    
+    Args:
+        agent_type: エージェントタイプで絞り込む場合に指定（supervisor, worker）
+    """
+    return list(iter_agent_dicts(agent_type))
+
 
 @agents_bp.route('', methods=['GET'])
+@api_endpoint
 def get_agents():
     """エージェント一覧を取得"""
-    try:
-        agents = Agent.query.all()
-        return jsonify({
-            'success': True,
-            'data': [agent.to_dict() for agent in agents]
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return stream_ojsonify_list(iter_agent_dicts())
 
 
 @agents_bp.route('/<int:agent_id>', methods=['GET'])
+@api_endpoint
 def get_agent(agent_id):
     """特定のエージェントを取得"""
-    try:
-        agent = Agent.query.get_or_404(agent_id)
-        return jsonify({
-            'success': True,
-            'data': agent.to_dict()
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 404
+    agent = db.session.get(Agent, agent_id)
+    if agent is None:
+        return _agent_not_found(agent_id)
+    return agent.to_dict()
 
 
 @agents_bp.route('', methods=['POST'])
+@api_endpoint
 def create_agent():
     """新しいエージェントを作成"""
-    try:
-        data = request.get_json()
-        
-        # 必須フィールドのチェック
-        required_fields = ['name', 'llm_provider', 'llm_model']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Missing required field: {field}'
-                }), 400
-        
-        # エージェントの作成
-        agent = agent_service.create_agent(
-            name=data['name'],
-            role=data.get('role'),
-            description=data.get('description'),
-            llm_provider=data['llm_provider'],
-            llm_model=data['llm_model'],
-            llm_config=data.get('llm_config', {}),
-            personality=data.get('personality'),
-            tool_names=data.get('tool_names'),
-            agent_type=data.get('agent_type', 'worker'),
-            supervisor_id=data.get('supervisor_id')
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': agent.to_dict(),
-            'message': 'Agent created successfully'
-        }), 201
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    data = request.get_json()
+    
+    # 必須フィールド・型のチェック（DBへアクセスする前に不正なリクエストを返す）
+    error = _AGENT_POST_VALIDATOR(data)
+    if error:
+        return error
+    
+    # エージェントの作成
+    agent = agent_service.create_agent(
+        name=data['name'],
+        role=data.get('role'),
+        description=data.get('description'),
+        llm_provider=data['llm_provider'],
+        llm_model=data['llm_model'],
+        llm_config=data.get('llm_config', {}),
+        personality=data.get('personality'),
+        tool_names=data.get('tool_names'),
+        agent_type=data.get('agent_type', 'worker'),
+        supervisor_id=data.get('supervisor_id')
+    )
+    
+    return ojsonify({
+        'success': True,
+        'data': agent.to_dict(),
+        'message': 'Agent created successfully'
+    }, 201)
 
 
 @agents_bp.route('/<int:agent_id>', methods=['PUT'])
+@api_endpoint
 def update_agent(agent_id):
     """エージェントを更新"""
-    try:
-        import json
-        agent = Agent.query.get_or_404(agent_id)
-        data = request.get_json()
-        
-        # tool_namesを配列からJSON文字列に変換
-        if 'tool_names' in data:
-            tool_names = data['tool_names']
-            if tool_names is None:
-                data['tool_names'] = json.dumps([])
-            elif isinstance(tool_names, list):
-                data['tool_names'] = json.dumps(tool_names)
-            # 既にJSON文字列の場合はそのまま
-        
-        # 更新可能なフィールド
-        updatable_fields = ['name', 'role', 'description', 'llm_provider',
-                            'llm_model', 'llm_config', 'personality', 'status',
-                            'tool_names', 'agent_type', 'supervisor_id']
-        
-        for field in updatable_fields:
-            if field in data:
-                setattr(agent, field, data[field])
-        
+    agent = db.session.get(Agent, agent_id)
+    if agent is None:
+        return _agent_not_found(agent_id)
+    data = request.get_json()
+    
+    # tool_namesを配列からJSON文字列に変換
+    if 'tool_names' in data:
+        tool_names = data['tool_names']
+        if tool_names is None:
+            tool_names = []
+        if isinstance(tool_names, list):
+            if tool_names == agent.tool_names_list:
+                # 内容が同じ場合は更新しない（JSON文字列の表記差で変更扱いにしない）
+                del data['tool_names']
+            else:
+                data['tool_names'] = orjson.dumps(tool_names).decode()
+        # 既にJSON文字列の場合はそのまま
+    
+    # 値が変わるフィールドだけを更新（変更が無ければDBへ書き込まない）
+    changes = {}
+    for field in _UPDATABLE_AGENT_FIELDS & data.keys():
+        current, value = getattr(agent, field), data[field]
+        if field in _AGENT_JSON_FIELDS:
+            unchanged = json_equal(current, value)
+        else:
+            unchanged = current == value
+        if not unchanged:
+            changes[field] = value
+    
+    if changes:
+        for field, value in changes.items():
+            setattr(agent, field, value)
         db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'data': agent.to_dict(),
-            'message': 'Agent updated successfully'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    
+    return ojsonify({
+        'success': True,
+        'data': agent.to_dict(),
+        'message': 'Agent updated successfully'
+    }, 200)
 
 
 @agents_bp.route('/<int:agent_id>', methods=['DELETE'])
+@api_endpoint
 def delete_agent(agent_id):
     """エージェントを削除"""
-    try:
-        agent = Agent.query.get_or_404(agent_id)
-        
-        # 実行中のタスクがある場合は削除できない
-        running_tasks = agent.tasks.filter_by(status='running').count()
-        if running_tasks > 0:
-            return jsonify({
-                'success': False,
-                'error': 'Cannot delete agent with running tasks'
-            }), 400
-        
-        db.session.delete(agent)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': 'Agent deleted successfully'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    agent = db.session.get(Agent, agent_id)
+    if agent is None:
+        return _agent_not_found(agent_id)
+    
+    # 実行中のタスクがある場合は削除できない（EXISTSで最初の1件が見つかれば打ち切る）
+    has_running_tasks = db.session.query(
+        db.exists().where(Task.assigned_to == agent_id, Task.status == 'running')
+    ).scalar()
+    if has_running_tasks:
+        return error_response('Cannot delete agent with running tasks', 400)
+    
+    db.session.delete(agent)
+    db.session.commit()
+    
+    return ojsonify({
+        'success': True,
+        'message': 'Agent deleted successfully'
+    }, 200)
 
 
 @agents_bp.route('/<int:agent_id>/statistics', methods=['GET'])
+@api_endpoint
 def get_agent_statistics(agent_id):
     """エージェントの統計情報を取得"""
-    try:
-        agent = Agent.query.get_or_404(agent_id)
-        statistics = agent.get_statistics()
-        
-        return jsonify({
-            'success': True,
-            'data': statistics
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    agent = db.session.get(Agent, agent_id)
+    if agent is None:
+        return _agent_not_found(agent_id)
+    return agent.get_statistics()
 
 
 @agents_bp.route('/<int:agent_id>/tools', methods=['GET'])
+@api_endpoint
 def get_agent_tools(agent_id):
     """エージェントが使用できるツール一覧を取得"""
-    try:
-        agent = Agent.query.get_or_404(agent_id)
-        tools = [tool.to_dict() for tool in agent.tools]
-        
-        return jsonify({
-            'success': True,
-            'data': tools
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return agent_tool_dicts(agent_id)
 
 
 @agents_bp.route('/<int:supervisor_id>/workers', methods=['GET'])
+@api_endpoint
 def get_supervisor_workers(supervisor_id):
     """Supervisorのワーカーエージェント一覧を取得"""
-    try:
-        workers = agent_service.get_workers(supervisor_id)
-        
-        return jsonify({
-            'success': True,
-            'data': [worker.to_dict() for worker in workers]
-        }), 200
-        
-    except ValueError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    # Supervisorの存在・タイプを確認（不正な場合はValueError）
+    agent_service.check_supervisor(supervisor_id)
+    return stream_ojsonify_list(iter_agent_dicts(supervisor_id=supervisor_id))
 
 
 @agents_bp.route('/<int:worker_id>/assign-supervisor', methods=['POST'])
+@api_endpoint
 def assign_supervisor(worker_id):
     """ワーカーエージェントにSupervisorを割り当て"""
-    try:
-        data = request.get_json()
-        supervisor_id = data.get('supervisor_id')
-        
-        if not supervisor_id:
-            return jsonify({
-                'success': False,
-                'error': 'supervisor_id is required'
-            }), 400
-        
-        worker = agent_service.assign_supervisor(worker_id, supervisor_id)
-        
-        return jsonify({
-            'success': True,
-            'data': worker.to_dict(),
-            'message': 'Supervisor assigned successfully'
-        }), 200
-        
-    except ValueError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    data = request.get_json()
+    supervisor_id = data.get('supervisor_id')
+    
+    if not supervisor_id:
+        return error_response('supervisor_id is required', 400)
+    
+    worker = agent_service.assign_supervisor(worker_id, supervisor_id)
+    
+    return ojsonify({
+        'success': True,
+        'data': worker.to_dict(),
+        'message': 'Supervisor assigned successfully'
+    }, 200)
 
 
 @agents_bp.route('/<int:worker_id>/remove-supervisor', methods=['POST'])
+@api_endpoint
 def remove_supervisor(worker_id):
     """ワーカーエージェントからSupervisorを解除"""
-    try:
-        worker = agent_service.remove_supervisor(worker_id)
-        
-        return jsonify({
-            'success': True,
-            'data': worker.to_dict(),
-            'message': 'Supervisor removed successfully'
-        }), 200
-        
-    except ValueError as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 400
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    worker = agent_service.remove_supervisor(worker_id)
+    
+    return ojsonify({
+        'success': True,
+        'data': worker.to_dict(),
+        'message': 'Supervisor removed successfully'
+    }, 200)
 
 
 @agents_bp.route('/supervisors', methods=['GET'])
+@api_endpoint
 def get_supervisors():
     """Supervisorエージェント一覧を取得"""
-    try:
-        supervisors = agent_service.list_agents(agent_type='supervisor')
-        
-        return jsonify({
-            'success': True,
-            'data': [supervisor.to_dict() for supervisor in supervisors]
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return stream_ojsonify_list(iter_agent_dicts(agent_type='supervisor'))
 
 
 @agents_bp.route('/workers', methods=['GET'])
+@api_endpoint
 def get_workers():
     """Workerエージェント一覧を取得"""
-    try:
-        workers = agent_service.list_agents(agent_type='worker')
-        
-        return jsonify({
-            'success': True,
-            'data': [worker.to_dict() for worker in workers]
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return stream_ojsonify_list(iter_agent_dicts(agent_type='worker'))
@@ -0,0 +1,91 @@
+"""
+エージェントAPIの非同期版
+
+イベントループ上で動くクライアント（ASGIブリッジ経由の配信やLangGraphの非同期ツールなど）向けに、
+同期のSQLAlchemy処理を asyncio.to_thread でワーカースレッドに逃がして実行します。
+レスポンス形式は app.api.agents と同じです。
+
+Flaskで非同期ビューを使うには asgiref が必要です。
+ツールからこれらのエンドポイントを呼ぶ場合は、requests ではなく aiohttp などの非同期HTTPクライアントを使用してください。
+"""
+import asyncio
+
+from flask import Blueprint, current_app
+from werkzeug.exceptions import NotFound
+
+from app.api.agents import agent_tool_dicts, list_agent_dicts
+from app import db
+from app.api.responses import api_endpoint, error_response
+from app.models import Agent
+
+agents_async_bp = Blueprint('agents_async', __name__)
+
+
+def _run_in_app_context(app, func, *args):
+    """ワーカースレッドでアプリケーションコンテキストを作成して実行（終了時にセッションを破棄）"""
+    with app.app_context():
+        return func(*args)
+
+
+async def _to_thread(func, *args):
+    """同期のDB処理をワーカースレッドで実行"""
+    app = current_app._get_current_object()
+    return await asyncio.to_thread(_run_in_app_context, app, func, *args)
+
+
+def _get_agent_dict(agent_id):
+    agent = db.session.get(Agent, agent_id)
+    return agent.to_dict() if agent else None
+
+
+def _get_agent_statistics(agent_id):
+    agent = db.session.get(Agent, agent_id)
+    return agent.get_statistics() if agent else None
+
+
+def _get_agent_tools(agent_id):
+    try:
+        return agent_tool_dicts(agent_id)
+    except NotFound:
+        return None
+
+
+def _not_found(agent_id):
+    return error_response(f'Agent {agent_id} not found', 404)
+
+
+@agents_async_bp.route('', methods=['GET'])
+@api_endpoint
+async def aget_agents():
+    """エージェント一覧を取得"""
+    return await _to_thread(list_agent_dicts)
+
+
+@agents_async_bp.route('/<int:agent_id>', methods=['GET'])
+@api_endpoint
+async def aget_agent(agent_id):
+    """特定のエージェントを取得"""
+    data = await _to_thread(_get_agent_dict, agent_id)
+    if data is None:
+        return _not_found(agent_id)
+    return data
+
+
+@agents_async_bp.route('/<int:agent_id>/statistics', methods=['GET'])
+@api_endpoint
+async def aget_agent_statistics(agent_id):
+    """エージェントの統計情報を取得"""
+    statistics = await _to_thread(_get_agent_statistics, agent_id)
+    if statistics is None:
+        return _not_found(agent_id)
+    return statistics
+
+
+@agents_async_bp.route('/<int:agent_id>/tools', methods=['GET'])
+@api_endpoint
+async def aget_agent_tools(agent_id):
+    """エージェントが使用できるツール一覧を取得"""
+    tools = await _to_thread(_get_agent_tools, agent_id)
+    if tools is None:
+        return _not_found(agent_id)
+    return tools
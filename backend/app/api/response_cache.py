@@ -0,0 +1,138 @@
+"""
+GETレスポンスのキャッシュ
+
+ポーリングされる読み取り系APIのレスポンスボディ（orjsonのバイト列）をFlask-Cachingに保存し、
+新鮮な間はDBアクセス・シリアライズを行わずにそのまま返します。
+
+- キーは名前空間・世代番号・パスとクエリ文字列から作成します。
+  invalidate_responses で世代番号を進めると、その名前空間のキャッシュはまとめて無効になります。
+- 新鮮な期間（RESPONSE_CACHE_FRESH_SECONDS）を過ぎたエントリも保持期間
+  （RESPONSE_CACHE_STALE_SECONDS）の間は残し、ハンドラーが500を返した場合はそれを返します。
+
+etag_validated は変更が無いポーリングに304を返し、クエリ・シリアライズ・転送を省略します。
+"""
+import functools
+import hashlib
+import time
+
+import orjson
+from flask import Response, current_app, g, request
+
+from app import cache
+
+
+def _generation_key(namespace):
+    return f'response-generation:{namespace}'
+
+
+def _entry_key(namespace):
+    generation = cache.get(_generation_key(namespace)) or 0
+    # etag_validatedの内側で使う場合はETagもキーに含め、キャッシュの内容とETagを一致させる
+    etag = g.get('response_etag', '')
+    return f'response:{namespace}:{generation}:{etag}:{request.full_path}'
+
+
+def invalidate_responses(*namespaces):
+    """
+    名前空間のキャッシュ済みレスポンスを無効化（データを変更するAPIから呼び出す）
+
+    Args:
+        namespaces: 無効化する名前空間
+    """
+    # 世代番号は期限切れで0に戻ると無効化前のエントリが再び使われるため、期限なしで保存する
+    # （値は増分ではなく現在時刻とし、同時の無効化でも前の世代番号に戻らないようにする）
+    generation = time.time_ns()
+    for namespace in namespaces:
+        cache.set(_generation_key(namespace), generation, timeout=0)
+
+
+def cached_response(namespace):
+    """
+    GETレスポンスをキャッシュするデコレーター
+
+    ステータス200のレスポンスのみキャッシュします。
+
+    Args:
+        namespace: キャッシュの名前空間（invalidate_responsesで指定する名前）
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = _entry_key(namespace)
+            entry = cache.get(key)  # (ボディ, 新鮮な期限)
+            now = time.time()
+            if entry is not None and entry[1] > now:
+                return Response(entry[0], status=200, mimetype='application/json')
+
+            response = func(*args, **kwargs)
+            if not isinstance(response, Response):
+                response = current_app.make_response(response)
+
+            if response.status_code == 200 and not response.is_streamed:
+                config = current_app.config
+                cache.set(
+                    key,
+                    (response.get_data(), now + config['RESPONSE_CACHE_FRESH_SECONDS']),
+                    timeout=config['RESPONSE_CACHE_STALE_SECONDS']
+                )
+            elif response.status_code >= 500 and entry is not None:
+                # DBエラーなどで取得できない場合は古いレスポンスを返す
+                current_app.logger.warning("Serving stale response for %s", request.full_path)
+                return Response(entry[0], status=200, mimetype='application/json')
+            return response
+
+        return wrapper
+    return decorator
+
+
+def invalidate_on_write(blueprint, *namespaces):
+    """
+    Blueprintの更新系リクエスト（GET以外）が成功した後に名前空間のキャッシュを無効化
+
+    Args:
+        blueprint: 対象のBlueprint
+        namespaces: 無効化する名前空間
+    """
+    @blueprint.after_request
+    def _invalidate_cached_responses(response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            invalidate_responses(*namespaces)
+        return response
+
+
+def etag_validated(validator):
+    """
+    ETag / If-None-Match による条件付きGETのデコレーター
+
+    validatorでデータの変更を検出する安価な値（件数・最大ID・最終更新日時など）を取得し、
+    パス・クエリ文字列と合わせたハッシュをETagにします。
+    クライアントのETagと一致する場合はハンドラーを呼ばずに304を返します。
+    cached_responseと併用する場合はこのデコレーターを外側に指定します。
+
+    Args:
+        validator: ビューと同じ引数を受け取り、変更検出用の値を返す関数
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            state = validator(*args, **kwargs)
+            etag = hashlib.blake2b(
+                orjson.dumps([request.full_path, state]), digest_size=8
+            ).hexdigest()
+
+            g.response_etag = etag
+
+            if etag in request.if_none_match:
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            response = func(*args, **kwargs)
+            if not isinstance(response, Response):
+                response = current_app.make_response(response)
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+
+        return wrapper
+    return decorator
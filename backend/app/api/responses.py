@@ -0,0 +1,190 @@
+"""
+APIレスポンスのユーティリティ
+"""
+import functools
+import inspect
+import logging
+
+import orjson
+from flask import Response, stream_with_context
+from werkzeug.exceptions import HTTPException
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# ストリーミング一覧レスポンスの前後の固定部分
+_LIST_PREFIX = b'{"success":true,"data":['
+_LIST_SUFFIX = b']}'
+
+
+def ojsonify(payload, status=200):
+    """
+    orjsonでシリアライズしたJSONレスポンスを作成（flask.jsonifyの高速版）
+
+    Args:
+        payload: レスポンスボディ
+        status: HTTPステータスコード
+
+    Returns:
+        Response: JSONレスポンス
+    """
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
+
+def stream_ojsonify_list(items, status=200):
+    """
+    一覧を1件ずつorjsonでシリアライズしてストリーミングするJSONレスポンスを作成
+
+    レスポンス全体をメモリ上に組み立てずに {"success": true, "data": [...]} を返します。
+    クエリはレスポンス送信中に実行されるため、itemsには実行済みのイテレータ
+    （iter(query.yield_per(...)) など）を渡し、接続エラーなどを呼び出し元で捕捉できるようにします。
+
+    Args:
+        items: 辞書を返すイテラブル
+        status: HTTPステータスコード
+
+    Returns:
+        Response: ストリーミングJSONレスポンス
+    """
+    def generate():
+        yield _LIST_PREFIX
+        separator = b''
+        for item in items:
+            yield separator + orjson.dumps(item)
+            separator = b','
+        yield _LIST_SUFFIX
+
+    return Response(stream_with_context(generate()), status=status, mimetype='application/json')
+
+
+def stream_ndjson(items, status=200):
+    """
+    1件ずつorjsonでシリアライズし、改行区切りのJSON（NDJSON）としてストリーミングするレスポンスを作成
+
+    stream_ojsonify_listと同様に、itemsには実行済みのイテレータを渡します。
+
+    Args:
+        items: 辞書を返すイテラブル
+        status: HTTPステータスコード
+
+    Returns:
+        Response: application/x-ndjson のストリーミングレスポンス
+    """
+    def generate():
+        for item in items:
+            yield orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE)
+
+    return Response(stream_with_context(generate()), status=status, mimetype='application/x-ndjson')
+
+
+def stream_sse(events, status=200):
+    """
+    1件ずつorjsonでシリアライズし、Server-Sent Events（data: ...）としてストリーミングするレスポンスを作成
+
+    プロキシ（nginx等）にバッファリングされず、イベントがすぐにクライアントへ届くようにヘッダーを設定します。
+
+    Args:
+        events: 辞書を返すイテラブル
+        status: HTTPステータスコード
+
+    Returns:
+        Response: text/event-stream のストリーミングレスポンス
+    """
+    def generate():
+        for event in events:
+            yield b'data: ' + orjson.dumps(event) + b'\n\n'
+
+    return Response(
+        stream_with_context(generate()),
+        status=status,
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def error_response(message, status):
+    """
+    エラーレスポンスを作成
+
+    Args:
+        message: エラーメッセージ
+        status: HTTPステータスコード
+
+    Returns:
+        Response: {"success": false, "error": message} のJSONレスポンス
+    """
+    return ojsonify({'success': False, 'error': message}, status)
+
+
+@functools.lru_cache(maxsize=None)
+def _missing_field_body(field):
+    return orjson.dumps({'success': False, 'error': f'Missing required field: {field}'})
+
+
+def missing_field_response(field):
+    """
+    必須フィールド不足のエラーレスポンスを作成（ボディはフィールドごとに一度だけ生成して再利用）
+
+    Args:
+        field: 不足しているフィールド名
+
+    Returns:
+        Response: ステータス400のJSONレスポンス
+    """
+    return Response(_missing_field_body(field), status=400, mimetype='application/json')
+
+
+def _exception_response(func_name, e):
+    """api_endpointで捕捉した例外をJSONのエラーレスポンスに変換"""
+    if isinstance(e, ValueError):
+        db.session.rollback()
+        return error_response(str(e), 400)
+    if isinstance(e, HTTPException):
+        return error_response(str(e), e.code)
+    db.session.rollback()
+    logger.exception("Unhandled error in %s", func_name)
+    return error_response(str(e), 500)
+
+
+def _result_response(result):
+    """ハンドラーの戻り値をレスポンスに変換（Response以外は成功のJSONで包む）"""
+    if isinstance(result, Response):
+        return result
+    return ojsonify({'success': True, 'data': result})
+
+
+def api_endpoint(func):
+    """
+    APIエンドポイント用デコレーター
+
+    ハンドラーの例外をJSONのエラーレスポンスに変換します。
+    - ValueError: 400
+    - NotFound（get_or_404など）: 404、不正なJSONボディ（BadRequest）: 400
+    - その他の例外: 500
+
+    ValueErrorとその他の例外ではセッションをロールバックします。
+    ハンドラーがResponseを返した場合はそのまま返し、それ以外の値は
+    {"success": true, "data": 値} としてステータス200で返します。
+    非同期ビュー（async def）にも使用できます。
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                return _exception_response(func.__name__, e)
+            return _result_response(result)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            return _exception_response(func.__name__, e)
+        return _result_response(result)
+
+    return wrapper
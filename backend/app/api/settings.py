@@ -1,191 +1,231 @@
-from flask import Blueprint, request, jsonify, current_app
-from app import db
+import operator
+import orjson
+from flask import Blueprint, Response, request, current_app
+from sqlalchemy import select
+from app.api.responses import api_endpoint, error_response, ojsonify
+from app.api.validation import compile_validator, json_equal
+from app.api.task_analysis import clear_active_setting_cache, clear_llm_cache
+from app import cache, db
 from app.models import LLMSetting
 import os
 
 settings_bp = Blueprint('settings', __name__)
 
+# LLM設定一覧のキャッシュキー（作成・更新・削除時に破棄）
+LLM_SETTINGS_CACHE_KEY = 'llm_settings'
+
+
+# create_llm_settingのリクエストボディ
+_LLM_SETTING_POST_VALIDATOR = compile_validator({
+    'type': 'object',
+    'required': ['provider'],
+    'properties': {
+        'provider': {'type': 'string'},
+        'api_key': {'type': ['string', 'null']},
+        'base_url': {'type': ['string', 'null']},
+        'default_model': {'type': ['string', 'null']},
+        'config': {'type': ['object', 'null']},
+        'is_active': {'type': 'boolean'}
+    }
+})
+
+
+def _is_success_response(response):
+    """正常なレスポンスのみキャッシュする"""
+    return response.status_code == 200
+
+
+def _find_setting(provider):
+    """プロバイダー名でLLM設定を取得（存在しない場合はNone）"""
+    return db.session.scalars(
+        select(LLMSetting).where(LLMSetting.provider == provider)
+    ).first()
+
+
+def _setting_not_found(provider):
+    return error_response(f'LLM setting not found: {provider}', 404)
+
+
+def _set_column(field, is_equal=operator.eq):
+    """カラムを更新する処理を作成（値が同じ場合は更新せずFalseを返す）"""
+    def update(setting, value):
+        if is_equal(getattr(setting, field), value):
+            return False
+        setattr(setting, field, value)
+        return True
+    return update
+
+
+def _set_api_key(setting, api_key):
+    # 空のAPIキー・同じAPIキーでは既存のキーを上書きしない（暗号文は毎回変わるため復号して比較）
+    if not api_key or api_key == setting.get_api_key():
+        return False
+    setting.set_api_key(api_key)
+    return True
+
+
+# update_llm_settingで更新可能なフィールドと更新処理（値が変わった場合はTrueを返す）
+_LLM_SETTING_UPDATERS = {
+    'base_url': _set_column('base_url'),
+    'default_model': _set_column('default_model'),
+    'config': _set_column('config', json_equal),
+    'is_active': _set_column('is_active'),
+    'api_key': _set_api_key,
+}
+
 
 @settings_bp.route('/debug', methods=['GET'])
+@api_endpoint
 def debug_config():
     """デバッグ用：現在の設定を確認"""
-    try:
-        return jsonify({
-            'success': True,
-            'data': {
-                'database_uri': current_app.config.get('SQLALCHEMY_DATABASE_URI'),
-                'database_exists': os.path.exists(current_app.config.get('SQLALCHEMY_DATABASE_URI', '').replace('sqlite:///', '')),
-                'cwd': os.getcwd(),
-                'app_root': current_app.root_path
-            }
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return {
+        'database_uri': current_app.config.get('SQLALCHEMY_DATABASE_URI'),
+        'database_exists': os.path.exists(current_app.config.get('SQLALCHEMY_DATABASE_URI', '').replace('sqlite:///', '')),
+        'cwd': os.getcwd(),
+        'app_root': current_app.root_path
+    }
 
 
 @settings_bp.route('/llm', methods=['GET'])
+@cache.cached(key_prefix=LLM_SETTINGS_CACHE_KEY, response_filter=_is_success_response)
+@api_endpoint
 def get_llm_settings():
     """LLM設定一覧を取得"""
-    try:
-        settings = LLMSetting.query.all()
-        return jsonify({
-            'success': True,
-            'data': [setting.to_dict() for setting in settings]
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    # LLMSetting.to_dictと同じ項目をカラム単位で取得（APIキーは有無のみ）
+    rows = db.session.query(
+        LLMSetting.id,
+        LLMSetting.provider,
+        LLMSetting.base_url,
+        LLMSetting.default_model,
+        LLMSetting.config,
+        LLMSetting.is_active,
+        LLMSetting.created_at,
+        LLMSetting.updated_at,
+        LLMSetting.api_key_encrypted
+    ).all()
+    
+    settings = []
+    for row in rows:
+        data = row._asdict()
+        data['created_at'] = row.created_at.isoformat() if row.created_at else None
+        data['updated_at'] = row.updated_at.isoformat() if row.updated_at else None
+        data['has_api_key'] = bool(data.pop('api_key_encrypted'))
+        settings.append(data)
+    
+    return settings
 
 
 @settings_bp.route('/llm/<string:provider>', methods=['GET'])
+@api_endpoint
 def get_llm_setting(provider):
     """特定のLLM設定を取得"""
-    try:
-        setting = LLMSetting.query.filter_by(provider=provider).first_or_404()
-        return jsonify({
-            'success': True,
-            'data': setting.to_dict()
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 404
+    setting = _find_setting(provider)
+    if setting is None:
+        return _setting_not_found(provider)
+    return setting.to_dict()
 
 
 @settings_bp.route('/llm', methods=['POST'])
+@api_endpoint
 def create_llm_setting():
     """新しいLLM設定を作成"""
-    try:
-        data = request.get_json()
-        
-        # 必須フィールドのチェック
-        if 'provider' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required field: provider'
-            }), 400
-        
-        # 既存の設定をチェック
-        existing = LLMSetting.query.filter_by(provider=data['provider']).first()
-        if existing:
-            return jsonify({
-                'success': False,
-                'error': 'Provider already exists'
-            }), 400
-        
-        # 設定の作成
-        setting = LLMSetting(
-            provider=data['provider'],
-            base_url=data.get('base_url'),
-            default_model=data.get('default_model'),
-            config=data.get('config', {}),
-            is_active=data.get('is_active', True)
-        )
-        
-        # APIキーの設定
-        if 'api_key' in data and data['api_key']:
-            setting.set_api_key(data['api_key'])
-        
-        db.session.add(setting)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'data': setting.to_dict(),
-            'message': 'LLM setting created successfully'
-        }), 201
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    data = request.get_json()
+    
+    # 必須フィールド・型のチェック（DBへアクセスする前に不正なリクエストを返す）
+    error = _LLM_SETTING_POST_VALIDATOR(data)
+    if error:
+        return error
+    
+    # 既存の設定をチェック
+    existing = _find_setting(data['provider'])
+    if existing:
+        return error_response('Provider already exists', 400)
+    
+    # 設定の作成
+    setting = LLMSetting(
+        provider=data['provider'],
+        base_url=data.get('base_url'),
+        default_model=data.get('default_model'),
+        config=data.get('config', {}),
+        is_active=data.get('is_active', True)
+    )
+    
+    # APIキーの設定
+    if 'api_key' in data and data['api_key']:
+        setting.set_api_key(data['api_key'])
+    
+    db.session.add(setting)
+    db.session.commit()
+    cache.delete(LLM_SETTINGS_CACHE_KEY)
+    clear_active_setting_cache()
+    
+    return ojsonify({
+        'success': True,
+        'data': setting.to_dict(),
+        'message': 'LLM setting created successfully'
+    }, 201)
 
 
 @settings_bp.route('/llm/<string:provider>', methods=['PUT'])
+@api_endpoint
 def update_llm_setting(provider):
     """LLM設定を更新"""
-    try:
-        setting = LLMSetting.query.filter_by(provider=provider).first_or_404()
-        data = request.get_json()
-        
-        # 更新可能なフィールド
-        if 'base_url' in data:
-            setting.base_url = data['base_url']
-        if 'default_model' in data:
-            setting.default_model = data['default_model']
-        if 'config' in data:
-            setting.config = data['config']
-        if 'is_active' in data:
-            setting.is_active = data['is_active']
-        if 'api_key' in data and data['api_key']:
-            setting.set_api_key(data['api_key'])
-        
+    setting = _find_setting(provider)
+    if setting is None:
+        return _setting_not_found(provider)
+    data = request.get_json()
+    
+    # 更新可能なフィールド（値が変わるフィールドだけを更新）
+    changed = False
+    for field in _LLM_SETTING_UPDATERS.keys() & data.keys():
+        changed |= _LLM_SETTING_UPDATERS[field](setting, data[field])
+    
+    # 変更が無ければDBへの書き込み・キャッシュの破棄を行わない
+    if changed:
         db.session.commit()
+        cache.delete(LLM_SETTINGS_CACHE_KEY)
         
-        return jsonify({
-            'success': True,
-            'data': setting.to_dict(),
-            'message': 'LLM setting updated successfully'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        # 古い設定で作成したLLMインスタンスを破棄
+        clear_llm_cache()
+    
+    return ojsonify({
+        'success': True,
+        'data': setting.to_dict(),
+        'message': 'LLM setting updated successfully'
+    }, 200)
 
 
 @settings_bp.route('/llm/<string:provider>', methods=['DELETE'])
+@api_endpoint
 def delete_llm_setting(provider):
     """LLM設定を削除"""
-    try:
-        setting = LLMSetting.query.filter_by(provider=provider).first_or_404()
-        
-        db.session.delete(setting)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': 'LLM setting deleted successfully'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    setting = _find_setting(provider)
+    if setting is None:
+        return _setting_not_found(provider)
+    
+    db.session.delete(setting)
+    db.session.commit()
+    cache.delete(LLM_SETTINGS_CACHE_KEY)
+    clear_llm_cache()
+    
+    return ojsonify({
+        'success': True,
+        'message': 'LLM setting deleted successfully'
+    }, 200)
 
 
 @settings_bp.route('/llm/<string:provider>/models', methods=['GET'])
+@api_endpoint
 def get_available_models(provider):
     """利用可能なモデル一覧を取得"""
-    try:
-        setting = LLMSetting.query.filter_by(provider=provider).first_or_404()
-        models = setting.get_available_models()
-        
-        return jsonify({
-            'success': True,
-            'data': models
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    setting = _find_setting(provider)
+    if setting is None:
+        return _setting_not_found(provider)
+    return setting.get_available_models()
 
 
 @settings_bp.route('/llm/<string:provider>/test', methods=['POST'])
+@api_endpoint
 def test_llm_connection(provider):
     """
     LLM接続をテスト
@@ -193,99 +233,88 @@ def test_llm_connection(provider):
     リクエストボディから設定を受け取るか、DBから取得してテストします。
     これにより、保存前にテストが可能になります。
     """
-    try:
-        data = request.get_json() or {}
-        
-        # リクエストボディに設定がある場合はそれを使用
-        if data.get('api_key') or data.get('base_url'):
-            # 一時的な設定でテスト
-            test_config = {
-                'provider': provider,
-                'api_key': data.get('api_key'),
-                'base_url': data.get('base_url'),
-                'default_model': data.get('default_model'),
-                'config': data.get('config', {})
-            }
-        else:
-            # DBから設定を取得
-            setting = LLMSetting.query.filter_by(provider=provider).first()
-            if not setting:
-                return jsonify({
-                    'success': False,
-                    'error': f'No configuration found for provider: {provider}. Please provide api_key in request body.'
-                }), 404
-            
-            test_config = {
-                'provider': provider,
-                'api_key': setting.get_api_key(),
-                'base_url': setting.base_url,
-                'default_model': setting.default_model,
-                'config': setting.config or {}
-            }
-        
-        # 接続テスト
-        from app.services.llm_service import LLMService
-        llm_service = LLMService()
-        
-        result = llm_service.test_connection_with_config(test_config)
-        
-        return jsonify({
-            'success': True,
-            'data': result,
-            'message': 'Connection test completed successfully'
-        }), 200
+    data = request.get_json() or {}
+    
+    # リクエストボディに設定がある場合はそれを使用
+    if data.get('api_key') or data.get('base_url'):
+        # 一時的な設定でテスト
+        test_config = {
+            'provider': provider,
+            'api_key': data.get('api_key'),
+            'base_url': data.get('base_url'),
+            'default_model': data.get('default_model'),
+            'config': data.get('config', {})
+        }
+    else:
+        # DBから設定を取得
+        setting = _find_setting(provider)
+        if not setting:
+            return error_response(
+                f'No configuration found for provider: {provider}. Please provide api_key in request body.',
+                404
+            )
         
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        test_config = {
+            'provider': provider,
+            'api_key': setting.get_api_key(),
+            'base_url': setting.base_url,
+            'default_model': setting.default_model,
+            'config': setting.config or {}
+        }
+    
+    # 接続テスト
+    from app.services.llm_service import LLMService
+    llm_service = LLMService()
+    
+    result = llm_service.test_connection_with_config(test_config)
+    
+    return ojsonify({
+        'success': True,
+        'data': result,
+        'message': 'Connection test completed successfully'
+    }, 200)
+
+
+# 利用可能なLLMプロバイダー一覧（固定内容のためレスポンスボディを起動時に一度だけ生成）
+_PROVIDERS = [
+    {
+        'value': 'openai',
+        'label': 'OpenAI',
+        'description': 'GPT-4o, GPT-4, GPT-3.5 Turbo',
+        'requires_api_key': True
+    },
+    {
+        'value': 'anthropic',
+        'label': 'Anthropic',
+        'description': 'Claude 3.5 Sonnet, Claude 3 Opus',
+        'requires_api_key': True
+    },
+    {
+        'value': 'gemini',
+        'label': 'Google Gemini',
+        'description': 'Gemini 2.0, Gemini 1.5 Pro',
+        'requires_api_key': True
+    },
+    {
+        'value': 'watsonx',
+        'label': 'IBM watsonx.ai',
+        'description': 'Granite, Llama 2',
+        'requires_api_key': True
+    },
+    {
+        'value': 'ollama',
+        'label': 'Ollama (Local)',
+        'description': 'Llama 3, Mistral, Mixtral',
+        'requires_api_key': False
+    }
+]
+_PROVIDERS_RESPONSE_BODY = orjson.dumps({
+    'success': True,
+    'data': _PROVIDERS
+})
 
 
 @settings_bp.route('/providers', methods=['GET'])
 def get_providers():
     """利用可能なLLMプロバイダー一覧を取得"""
-    try:
-        providers = [
-            {
-                'value': 'openai',
-                'label': 'OpenAI',
-                'description': 'GPT-4o, GPT-4, GPT-3.5 Turbo',
-                'requires_api_key': True
-            },
-            {
-                'value': 'anthropic',
-                'label': 'Anthropic',
-                'description': 'Claude 3.5 Sonnet, Claude 3 Opus',
-                'requires_api_key': True
-            },
-            {
-                'value': 'gemini',
-                'label': 'Google Gemini',
-                'description': 'Gemini 2.0, Gemini 1.5 Pro',
-                'requires_api_key': True
-            },
-            {
-                'value': 'watsonx',
-                'label': 'IBM watsonx.ai',
-                'description': 'Granite, Llama 2',
-                'requires_api_key': True
-            },
-            {
-                'value': 'ollama',
-                'label': 'Ollama (Local)',
-                'description': 'Llama 3, Mistral, Mixtral',
-                'requires_api_key': False
-            }
-        ]
-        
-        return jsonify({
-            'success': True,
-            'data': providers
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    return Response(_PROVIDERS_RESPONSE_BODY, status=200, mimetype='application/json')
@@ -2,95 +2,264 @@
 タスク分析API
 タスクから必要なツールを自動推奨
 """
-import asyncio
-from flask import Blueprint, request, jsonify
+import functools
+import hashlib
+import threading
+from collections import namedtuple
+import orjson
+from cachetools import TTLCache
+from flask import Blueprint, request
+from app.api.responses import api_endpoint, error_response, missing_field_response
+from app.event_loop import run_async
 from app.services.task_analyzer import TaskAnalyzer
+from app.tools import ToolRegistry
+from app import db
 from app.models import LLMSetting
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.chat_models import ChatOllama
 
 task_analysis_bp = Blueprint('task_analysis', __name__)
 
-# Watsonxは条件付きインポート
-try:
-    from langchain_ibm import WatsonxLLM
-    WATSONX_AVAILABLE = True
-except ImportError:
-    WATSONX_AVAILABLE = False
+# タスク分析結果のキャッシュ（キー: LLM設定ID・更新日時・ツール登録のバージョン・タスク説明のハッシュ）
+_analysis_cache = TTLCache(maxsize=512, ttl=600)
+_analysis_cache_lock = threading.Lock()
 
+# LangChainのプロバイダー別パッケージは読み込みが重いため、各_build_*関数の初回呼び出し時にインポートする
+# （分析APIを使わないワーカーは読み込まない）
 
-def _create_llm(llm_setting: LLMSetting):
-    """
-    LLM設定からLangChain LLMインスタンスを作成
-    """
-    provider = llm_setting.provider
-    api_key = llm_setting.get_api_key()
-    model = llm_setting.default_model
-    config = llm_setting.config or {}
-    temperature = config.get("temperature", 0.7)
-    max_tokens = config.get("max_tokens", 2000)
-    
-    if provider == "openai" or provider == "github":
-        # OpenAI または GitHub Models (OpenAI互換)
-        kwargs = {
-            "model": model or "gpt-4",
+
+def _build_openai(model, base_url, api_key, config, temperature, max_tokens):
+    """OpenAI または GitHub Models (OpenAI互換)"""
+    from langchain_openai import ChatOpenAI
+    
+    kwargs = {
+        "model": model or "gpt-4",
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "api_key": api_key
+    }
+    # base_urlが設定されている場合は追加（GitHub Models用）
+    if base_url:
+        kwargs["base_url"] = base_url
+    return ChatOpenAI(**kwargs)
+
+
+def _build_anthropic(model, base_url, api_key, config, temperature, max_tokens):
+    from langchain_anthropic import ChatAnthropic
+    
+    return ChatAnthropic(
+        model=model or "claude-3-5-sonnet-20241022",
+        temperature=temperature,
+        max_tokens=max_tokens,
+        api_key=api_key
+    )
+
+
+def _build_gemini(model, base_url, api_key, config, temperature, max_tokens):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    
+    return ChatGoogleGenerativeAI(
+        model=model or "gemini-2.0-flash-exp",
+        temperature=temperature,
+        max_output_tokens=max_tokens,
+        google_api_key=api_key
+    )
+
+
+def _build_ollama(model, base_url, api_key, config, temperature, max_tokens):
+    from langchain_community.chat_models import ChatOllama
+    
+    return ChatOllama(
+        model=model or "llama2",
+        temperature=temperature,
+        base_url=base_url or "http://localhost:11434"
+    )
+
+
+def _build_watsonx(model, base_url, api_key, config, temperature, max_tokens):
+    # Watsonxは条件付きインポート
+    try:
+        from langchain_ibm import WatsonxLLM
+    except ImportError:
+        raise ValueError("langchain_ibm is not installed")
+    
+    # URLの設定（優先順位: base_url > config['url'] > デフォルト値）
+    url = base_url or config.get("url") or "https://us-south.ml.cloud.ibm.com"
+    
+    # project_idの必須チェック
+    project_id = config.get("project_id")
+    if not project_id:
+        raise ValueError("watsonx.ai requires 'project_id' in config")
+    
+    return WatsonxLLM(
+        model_id=model or "ibm/granite-13b-chat-v2",
+        url=url,
+        apikey=api_key,
+        project_id=project_id,
+        params={
             "temperature": temperature,
-            "max_tokens": max_tokens,
-            "api_key": api_key
+            "max_new_tokens": max_tokens
         }
-        # base_urlが設定されている場合は追加（GitHub Models用）
-        if llm_setting.base_url:
-            kwargs["base_url"] = llm_setting.base_url
-        return ChatOpenAI(**kwargs)
-    elif provider == "anthropic":
-        return ChatAnthropic(
-            model=model or "claude-3-5-sonnet-20241022",
-            temperature=temperature,
-            max_tokens=max_tokens,
-            api_key=api_key
-        )
-    elif provider == "gemini":
-        return ChatGoogleGenerativeAI(
-            model=model or "gemini-2.0-flash-exp",
-            temperature=temperature,
-            max_output_tokens=max_tokens,
-            google_api_key=api_key
-        )
-    elif provider == "ollama":
-        return ChatOllama(
-            model=model or "llama2",
-            temperature=temperature,
-            base_url=llm_setting.base_url or "http://localhost:11434"
-        )
-    elif provider == "watsonx":
-        if not WATSONX_AVAILABLE:
-            raise ValueError("langchain_ibm is not installed")
-        
-        # URLの設定（優先順位: base_url > config['url'] > デフォルト値）
-        url = llm_setting.base_url or config.get("url") or "https://us-south.ml.cloud.ibm.com"
-        
-        # project_idの必須チェック
-        project_id = config.get("project_id")
-        if not project_id:
-            raise ValueError("watsonx.ai requires 'project_id' in config")
+    )
+
+
+# プロバイダーごとのLLM作成関数
+_BUILDERS = {
+    "openai": _build_openai,
+    "github": _build_openai,
+    "anthropic": _build_anthropic,
+    "gemini": _build_gemini,
+    "ollama": _build_ollama,
+    "watsonx": _build_watsonx,
+}
+
+
+@functools.lru_cache(maxsize=32)
+def build_llm(provider: str, model: str, base_url: str, api_key: str, config_json: bytes):
+    """
+    LangChain LLMインスタンスを作成（設定値ごとにキャッシュ）
+    
+    ORMオブジェクトではなくハッシュ可能な設定値をキーにします。
+    """
+    builder = _BUILDERS.get(provider)
+    if builder is None:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+    
+    config = orjson.loads(config_json)
+    return builder(
+        model,
+        base_url,
+        api_key,
+        config,
+        config.get("temperature", 0.7),
+        config.get("max_tokens", 2000)
+    )
+
+
+# 分析に使用するLLM設定（setting_keyは_build_llmの引数となるハッシュ可能な設定値のタプル）
+ActiveLLMSetting = namedtuple('ActiveLLMSetting', ['id', 'updated_at', 'setting_key'])
+
+# 有効なLLM設定のキャッシュ（キー: プロバイダー、Noneはプロバイダー指定なし）
+_active_setting_cache = TTLCache(maxsize=32, ttl=10)
+_active_setting_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=32)
+def _build_analyzer(*setting_key) -> TaskAnalyzer:
+    """LLM設定ごとのTaskAnalyzerを作成（キャッシュ）"""
+    return TaskAnalyzer(build_llm(*setting_key))
+
+
+def clear_active_setting_cache():
+    """キャッシュ済みの有効なLLM設定を破棄（LLM設定の作成時に呼び出す）"""
+    with _active_setting_cache_lock:
+        _active_setting_cache.clear()
+
+
+def clear_llm_cache():
+    """キャッシュ済みのLLM設定・LLM・TaskAnalyzer・分析結果を破棄（LLM設定の更新・削除時に呼び出す）"""
+    clear_active_setting_cache()
+    _build_analyzer.cache_clear()
+    build_llm.cache_clear()
+    with _analysis_cache_lock:
+        _analysis_cache.clear()
+
+
+def get_active_setting(provider=None):
+    """
+    有効なLLM設定を取得（プロバイダー指定時はそのプロバイダーの設定）
+    
+    必要なカラムだけを取得し、APIキーの復号化を含めて短時間キャッシュします。
+    
+    Args:
+        provider: プロバイダー名（Noneの場合は最初に見つかった有効な設定）
         
-        return WatsonxLLM(
-            model_id=model or "ibm/granite-13b-chat-v2",
-            url=url,
-            apikey=api_key,
-            project_id=project_id,
-            params={
-                "temperature": temperature,
-                "max_new_tokens": max_tokens
-            }
+    Returns:
+        Optional[ActiveLLMSetting]: 有効な設定が無い場合はNone
+    """
+    with _active_setting_cache_lock:
+        if provider in _active_setting_cache:
+            return _active_setting_cache[provider]
+    
+    query = db.session.query(
+        LLMSetting.id,
+        LLMSetting.updated_at,
+        LLMSetting.provider,
+        LLMSetting.default_model,
+        LLMSetting.base_url,
+        LLMSetting.api_key_encrypted,
+        LLMSetting.config
+    ).filter(LLMSetting.is_active.is_(True))
+    if provider:
+        query = query.filter(LLMSetting.provider == provider)
+    row = query.first()
+    
+    setting = ActiveLLMSetting(
+        row.id,
+        row.updated_at,
+        (
+            row.provider,
+            row.default_model,
+            row.base_url,
+            LLMSetting.decrypt_api_key(row.api_key_encrypted),
+            orjson.dumps(row.config or {}, option=orjson.OPT_SORT_KEYS)
         )
-    else:
-        raise ValueError(f"Unsupported LLM provider: {provider}")
+    ) if row else None
+    
+    with _active_setting_cache_lock:
+        _active_setting_cache[provider] = setting
+    return setting
+
+
+def _analyze(llm_setting: ActiveLLMSetting, task_description: str):
+    """
+    タスクを分析し、分析結果と推奨ツールの情報を返す
+    
+    同じLLM設定・同じタスク説明の結果は一定時間キャッシュし、LLMを呼び出さずに返します。
+    推奨ツールは登録済みのツールから選ばれるため、ツールの登録内容が変わった場合は再分析します。
+    
+    Args:
+        llm_setting: 使用するLLM設定
+        task_description: タスクの説明
+        
+    Returns:
+        Tuple[Dict, List[Dict]]: (分析結果, 推奨ツールの情報のリスト)
+    """
+    # バージョンは分析前に取得し、分析中に登録内容が変わった場合は古いバージョンのキーで保存する
+    key = (
+        llm_setting.id,
+        llm_setting.updated_at,
+        ToolRegistry.version(),
+        hashlib.blake2b(task_description.encode(), digest_size=16).hexdigest()
+    )
+    with _analysis_cache_lock:
+        cached = _analysis_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    # LLM設定ごとにキャッシュされたインスタンスを使用
+    analyzer = _build_analyzer(*llm_setting.setting_key)
+    analysis = run_async(analyzer.analyze_task(task_description))
+    
+    # 推奨ツールの詳細情報を取得
+    tools = analyzer.get_tools_by_names(analysis.get('recommended_tools', []))
+    tools_data = [
+        {
+            'name': tool.name,
+            'description': tool.description,
+            'category': getattr(tool, 'category', 'custom')
+        }
+        for tool in tools
+    ]
+    
+    result = (analysis, tools_data)
+    # 応答のパースに失敗した結果はキャッシュしない
+    if analysis.get('task_type') != 'unknown':
+        with _analysis_cache_lock:
+            _analysis_cache[key] = result
+    return result
 
 
 @task_analysis_bp.route('/analyze', methods=['POST'])
+@api_endpoint
 def analyze_task():
     """
     タスクを分析して必要なツールを推奨
@@ -112,54 +281,24 @@ def analyze_task():
             }
         }
     """
-    try:
-        data = request.get_json()
-        
-        # 必須フィールドのチェック
-        if 'task_description' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required field: task_description'
-            }), 400
-        
-        task_description = data['task_description']
-        provider = data.get('provider')
-        
-        # LLM設定を取得
-        if provider:
-            llm_setting = LLMSetting.query.filter_by(
-                provider=provider,
-                is_active=True
-            ).first()
-        else:
-            llm_setting = LLMSetting.query.filter_by(is_active=True).first()
-        
-        if not llm_setting:
-            return jsonify({
-                'success': False,
-                'error': 'No active LLM configuration found'
-            }), 404
-        
-        # LLMインスタンスを作成
-        llm = _create_llm(llm_setting)
-        
-        # タスク分析
-        analyzer = TaskAnalyzer(llm)
-        analysis = asyncio.run(analyzer.analyze_task(task_description))
-        
-        return jsonify({
-            'success': True,
-            'data': analysis
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    data = request.get_json()
+    
+    # 必須フィールドのチェック
+    if 'task_description' not in data:
+        return missing_field_response('task_description')
+    
+    # LLM設定を取得
+    llm_setting = get_active_setting(data.get('provider'))
+    if not llm_setting:
+        return error_response('No active LLM configuration found', 404)
+    
+    # タスク分析
+    analysis, _ = _analyze(llm_setting, data['task_description'])
+    return analysis
 
 
 @task_analysis_bp.route('/recommend-tools', methods=['POST'])
+@api_endpoint
 def recommend_tools():
     """
     タスクに基づいてツールを推奨し、ツールオブジェクトも返す
@@ -185,67 +324,19 @@ def recommend_tools():
             }
         }
     """
-    try:
-        data = request.get_json()
-        
-        if 'task_description' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required field: task_description'
-            }), 400
-        
-        task_description = data['task_description']
-        provider = data.get('provider')
-        
-        # LLM設定を取得
-        if provider:
-            llm_setting = LLMSetting.query.filter_by(
-                provider=provider,
-                is_active=True
-            ).first()
-        else:
-            llm_setting = LLMSetting.query.filter_by(is_active=True).first()
-        
-        if not llm_setting:
-            return jsonify({
-                'success': False,
-                'error': 'No active LLM configuration found'
-            }), 404
-        
-        # LLMインスタンスを作成
-        llm = _create_llm(llm_setting)
-        
-        # タスク分析
-        analyzer = TaskAnalyzer(llm)
-        analysis = asyncio.run(analyzer.analyze_task(task_description))
-        
-        # 推奨ツールの詳細情報を取得
-        recommended_tool_names = analysis.get('recommended_tools', [])
-        tools = analyzer.get_tools_by_names(recommended_tool_names)
-        
-        # ツール情報を辞書形式に変換
-        tools_data = []
-        for tool in tools:
-            tools_data.append({
-                'name': tool.name,
-                'description': tool.description,
-                'category': getattr(tool, 'category', 'custom')
-            })
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'analysis': analysis,
-                'tools': tools_data
-            }
-        }), 200
-        
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"Error in recommend_tools: {error_details}")
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'details': error_details
-        }), 500
+    data = request.get_json()
+    
+    if 'task_description' not in data:
+        return missing_field_response('task_description')
+    
+    # LLM設定を取得
+    llm_setting = get_active_setting(data.get('provider'))
+    if not llm_setting:
+        return error_response('No active LLM configuration found', 404)
+    
+    # タスク分析（推奨ツールの詳細情報も取得）
+    analysis, tools_data = _analyze(llm_setting, data['task_description'])
+    return {
+        'analysis': analysis,
+        'tools': tools_data
+    }
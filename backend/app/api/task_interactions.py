@@ -2,15 +2,60 @@
 タスクインタラクションAPI
 タスク実行中のインタラクション（対話）を管理
 """
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, abort, request
+from app.api.responses import ojsonify, stream_ndjson
+from app.api.response_cache import etag_validated, invalidate_on_write
+from sqlalchemy import func, insert, true
 from app import db
 from app.models import Task, TaskInteraction
+from app.services.execution_service import ExecutionService
 from datetime import datetime
 
 bp = Blueprint('task_interactions', __name__, url_prefix='/api/tasks')
+invalidate_on_write(bp, 'tasks')
+execution_service = ExecutionService()
+
+
+def _interactions_state(task_id):
+    """タスクのインタラクションの変更検出用の値（件数・最大ID・最終回答日時）を取得"""
+    return tuple(
+        db.session.query(
+            func.count(TaskInteraction.id),
+            func.max(TaskInteraction.id),
+            func.max(TaskInteraction.responded_at)
+        ).filter(TaskInteraction.task_id == task_id).one()
+    )
+
+
+def _task_exists(task_id):
+    """タスクが存在するかをEXISTSで確認（行の読み込みは行わない）"""
+    return db.session.query(Task.query.filter_by(id=task_id).exists()).scalar()
+
+
+def _interactions_query(task_id):
+    """
+    クエリパラメータ（type, since）で絞り込んだインタラクションのクエリを作成（作成日時の昇順）
+    
+    Args:
+        task_id: タスクID
+    """
+    interaction_type = request.args.get('type')
+    since_id = request.args.get('since', type=int)
+    
+    query = TaskInteraction.query.filter_by(task_id=task_id)
+    
+    # 差分取得: 指定したID以降のみ
+    if since_id:
+        query = query.filter(TaskInteraction.id > since_id)
+    
+    if interaction_type:
+        query = query.filter_by(interaction_type=interaction_type)
+    
+    return query.order_by(TaskInteraction.created_at.asc())
 
 
 @bp.route('/<int:task_id>/interactions', methods=['GET'])
+@etag_validated(_interactions_state)
 def get_task_interactions(task_id):
     """
     タスクのインタラクション履歴を取得
@@ -28,46 +73,45 @@ def get_task_interactions(task_id):
     """
     task = Task.query.get_or_404(task_id)
     
-    # クエリパラメータ
-    interaction_type = request.args.get('type')
-    limit = request.args.get('limit', type=int)
-    since_id = request.args.get('since', type=int)
-    
-    # インタラクションを取得
-    query = TaskInteraction.query.filter_by(task_id=task_id)
-    
-    # 差分取得: 指定したID以降のみ
-    if since_id:
-        query = query.filter(TaskInteraction.id > since_id)
-    
-    if interaction_type:
-        query = query.filter_by(interaction_type=interaction_type)
-    
-    query = query.order_by(TaskInteraction.created_at.asc())
+    query = _interactions_query(task_id)
     
+    limit = request.args.get('limit', type=int)
     if limit:
         query = query.limit(limit)
     
     interactions = query.all()
     
-    return jsonify({
+    return ojsonify({
         'task_id': task_id,
-        'interactions': [
-            {
-                'id': interaction.id,
-                'interaction_type': interaction.interaction_type,
-                'content': interaction.content,
-                'metadata': interaction.metadata if isinstance(interaction.metadata, dict) else {},
-                'requires_response': interaction.requires_response,
-                'response': interaction.response,
-                'created_at': interaction.created_at.isoformat() if interaction.created_at else None,
-                'responded_at': interaction.responded_at.isoformat() if interaction.responded_at else None
-            }
-            for interaction in interactions
-        ]
+        'interactions': [interaction.to_list_item() for interaction in interactions]
     })
 
 
+@bp.route('/<int:task_id>/interactions/stream', methods=['GET'])
+def stream_task_interactions(task_id):
+    """
+    タスクのインタラクション履歴をNDJSON（1行に1件）でストリーミング
+    
+    件数の多い履歴を一括で取得する場合に使用します。
+    500件ずつ読み込むため、件数に関わらずメモリ使用量は一定です。
+    
+    Args:
+        task_id: タスクID
+        
+    Query Parameters:
+        type: インタラクションタイプでフィルタ
+        since: 指定したID以降のインタラクションのみ取得（差分取得用）
+        
+    Returns:
+        NDJSON: インタラクション（get_task_interactionsのinteractionsの各要素と同じ形式）
+    """
+    Task.query.get_or_404(task_id)
+    
+    # ここでクエリを実行し、DBエラーはレスポンス送信前に発生させる
+    interactions = iter(_interactions_query(task_id).yield_per(500))
+    return stream_ndjson(interaction.to_list_item() for interaction in interactions)
+
+
 @bp.route('/<int:task_id>/interactions/<int:interaction_id>/respond', methods=['POST'])
 def respond_to_interaction(task_id, interaction_id):
     """
@@ -80,42 +124,44 @@ def respond_to_interaction(task_id, interaction_id):
     Returns:
         JSON: 更新されたインタラクション
     """
-    task = Task.query.get_or_404(task_id)
-    interaction = TaskInteraction.query.filter_by(
-        id=interaction_id,
-        task_id=task_id
-    ).first_or_404()
-    
-    if not interaction.requires_response:
-        return jsonify({'error': 'This interaction does not require a response'}), 400
-    
-    if interaction.response:
-        return jsonify({'error': 'This interaction has already been responded to'}), 400
-    
     data = request.get_json()
     response_text = data.get('response')
     
     if not response_text:
-        return jsonify({'error': 'Response text is required'}), 400
+        return ojsonify({'error': 'Response text is required'}, 400)
+    
+    # 応答待ちの場合のみ記録（条件付きUPDATE 1文で確認と更新を行い、同時応答による上書きも防ぐ）
+    responded_at = datetime.utcnow()
+    updated = TaskInteraction.query.filter(
+        TaskInteraction.id == interaction_id,
+        TaskInteraction.task_id == task_id,
+        TaskInteraction.requires_response.is_(True),
+        TaskInteraction.response.is_(None)
+    ).update(
+        {'response': response_text, 'responded_at': responded_at},
+        synchronize_session=False
+    )
+    
+    if not updated:
+        db.session.rollback()
+        # 更新されなかった理由を判別（存在しない場合は404）
+        interaction = TaskInteraction.query.filter_by(
+            id=interaction_id,
+            task_id=task_id
+        ).first_or_404()
+        if not interaction.requires_response:
+            return ojsonify({'error': 'This interaction does not require a response'}, 400)
+        return ojsonify({'error': 'This interaction has already been responded to'}, 400)
     
-    # 応答を記録
-    interaction.response = response_text
-    interaction.responded_at = datetime.utcnow()
     db.session.commit()
     
-    return jsonify({
-        'id': interaction.id,
-        'interaction_type': interaction.interaction_type,
-        'content': interaction.content,
-        'metadata': interaction.metadata if isinstance(interaction.metadata, dict) else {},
-        'requires_response': interaction.requires_response,
-        'response': interaction.response,
-        'created_at': interaction.created_at.isoformat() if interaction.created_at else None,
-        'responded_at': interaction.responded_at.isoformat() if interaction.responded_at else None
-    })
+    # SQLiteではUPDATE ... RETURNINGが使えないため、更新後の値を取得して返す
+    interaction = TaskInteraction.query.filter_by(id=interaction_id).one()
+    return ojsonify(interaction.to_list_item())
 
 
 @bp.route('/<int:task_id>/interactions/pending', methods=['GET'])
+@etag_validated(_interactions_state)
 def get_pending_interactions(task_id):
     """
     応答待ちのインタラクションを取得
@@ -126,26 +172,20 @@ def get_pending_interactions(task_id):
     Returns:
         JSON: 応答待ちインタラクション
     """
-    task = Task.query.get_or_404(task_id)
-    
-    interactions = TaskInteraction.query.filter_by(
-        task_id=task_id,
-        requires_response=True,
-        response=None
+    # 部分インデックス idx_task_interactions_pending を使用できるよう、条件はリテラルで指定する
+    interactions = TaskInteraction.query.filter(
+        TaskInteraction.task_id == task_id,
+        TaskInteraction.requires_response == true(),
+        TaskInteraction.response.is_(None)
     ).order_by(TaskInteraction.created_at.asc()).all()
     
-    return jsonify({
+    # 結果が空の場合のみタスクの存在を確認（存在しなければ404）
+    if not interactions and not _task_exists(task_id):
+        abort(404)
+    
+    return ojsonify({
         'task_id': task_id,
-        'pending_interactions': [
-            {
-                'id': interaction.id,
-                'interaction_type': interaction.interaction_type,
-                'content': interaction.content,
-                'metadata': interaction.metadata if isinstance(interaction.metadata, dict) else {},
-                'created_at': interaction.created_at.isoformat() if interaction.created_at else None
-            }
-            for interaction in interactions
-        ]
+        'pending_interactions': [interaction.to_pending_item() for interaction in interactions]
     })
 
 
@@ -167,65 +207,47 @@ def send_user_message(task_id):
         }
         
     Returns:
-        JSON: 作成されたインタラクション
+        JSON: 作成されたインタラクション（resumed: タスクの再開を開始した場合はtrue）
     """
-    task = Task.query.get_or_404(task_id)
+    # 再開の判定にはステータスのみ必要
+    task_status = db.session.query(Task.status).filter(Task.id == task_id).scalar()
+    if task_status is None:
+        abort(404)
     
     data = request.get_json()
     message = data.get('message')
     
     if not message:
-        return jsonify({'error': 'Message is required'}), 400
+        return ojsonify({'error': 'Message is required'}, 400)
     
     # ユーザーメッセージをインタラクションとして記録
-    interaction = TaskInteraction(
-        task_id=task_id,
-        interaction_type='user_message',
-        content=message,
-        requires_response=False,  # 自由なメッセージなので応答は必須ではない
-        created_at=datetime.utcnow()
-    )
-    db.session.add(interaction)
+    # （ORMを経由せずにINSERTし、コミット後の再読み込みを行わない）
+    values = {
+        'task_id': task_id,
+        'interaction_type': 'user_message',
+        'content': message,
+        'extra_data': {},
+        'requires_response': False,  # 自由なメッセージなので応答は必須ではない
+        'created_at': datetime.utcnow()
+    }
+    result = db.session.execute(insert(TaskInteraction).values(**values))
+    interaction_id = result.inserted_primary_key[0]
+    db.session.commit()
     
     # タスクが完了/失敗している場合、自動的に再開
-    if task.status in ['completed', 'failed']:
-        print(f"Task {task_id} is {task.status}. Resuming task with user message...")
-        
-        # 元のタスクの説明を保存（参照用）
-        original_description = task.description
-        
-        # タスクの説明を更新（ユーザーのメッセージを新しいタスクとして実行）
-        # 前回の結果を参照するように指示を追加
-        task.description = f"""前回のタスク結果を参照して、以下の追加指示に従ってください：
-
-【追加指示】
-{message}
-
-【注意】
-- 前回の会話履歴と結果を参照してください
-- 元のタスク: {original_description}
-- 新しいタスクを最初から実行するのではなく、前回の結果を基に追加指示に応答してください"""
-        
-        task.status = 'running'
-        task.detailed_status = 'user_interaction'
-        
-        # タスクを非同期で再実行
-        from app.services.execution_service import ExecutionService
-        execution_service = ExecutionService()
-        
-        # コミット後に非同期実行
-        db.session.commit()
-        execution_service.execute_task_async(task_id)
-    else:
-        db.session.commit()
-    
-    return jsonify({
-        'id': interaction.id,
-        'interaction_type': interaction.interaction_type,
-        'content': interaction.content,
-        'metadata': interaction.extra_data,
-        'requires_response': interaction.requires_response,
-        'response': interaction.response,
-        'created_at': interaction.created_at.isoformat() if interaction.created_at else None,
-        'responded_at': interaction.responded_at.isoformat() if interaction.responded_at else None
-    }), 201
+    # （説明の書き換えと再実行はワーカー側で行い、ここでは記録したインタラクションをすぐに返す）
+    resumed = task_status in ['completed', 'failed']
+    if resumed:
+        execution_service.dispatch_resume(task_id, message)
+    
+    return ojsonify({
+        'id': interaction_id,
+        'interaction_type': values['interaction_type'],
+        'content': message,
+        'metadata': values['extra_data'],
+        'requires_response': False,
+        'response': None,
+        'created_at': values['created_at'],
+        'responded_at': None,
+        'resumed': resumed
+    }, 201)
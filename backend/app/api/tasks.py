@@ -1,310 +1,354 @@
-from flask import Blueprint, request, jsonify
+import logging
+from datetime import datetime
+
+from flask import Blueprint, request
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import joinedload, selectinload
+from app.api.responses import api_endpoint, ojsonify
+from app.api.response_cache import cached_response, etag_validated, invalidate_on_write
+from app.api.validation import compile_validator
 from app import db
-from app.models import Task, Agent
+from app.models import Task, Agent, TaskInteraction, ExecutionLog
+from app.services.execution_service import ExecutionService
 from app.services.task_service import TaskService
 
 tasks_bp = Blueprint('tasks', __name__)
+invalidate_on_write(tasks_bp, 'tasks')
 task_service = TaskService()
+execution_service = ExecutionService()
+logger = logging.getLogger(__name__)
+
+# サブタスク付きでシリアライズする際のロードオプション
+# （サブタスクは1回のIN、担当エージェントは結合でまとめて取得しN+1を避ける）
+_TASK_WITH_SUBTASKS_OPTIONS = (
+    joinedload(Task.agent),
+    selectinload(Task.subtasks).joinedload(Task.agent),
+)
+
+# POST /api/tasks のリクエストボディ（解析済みのJSONを1回で検証し、不正な場合はDBアクセス前に400を返す）
+_TASK_POST_VALIDATOR = compile_validator({
+    'type': 'object',
+    'required': ['description'],
+    'properties': {
+        'title': {'type': 'string'},
+        'description': {'type': 'string'},
+        'priority': {'type': 'string'},
+        'assigned_to': {'type': ['integer', 'null']},
+        'mode': {'type': 'string'},
+        'deadline': {'type': ['string', 'null']},
+        'additional_tool_names': {'type': ['array', 'null'], 'items': {'type': 'string'}},
+        'team_member_ids': {'type': ['array', 'null'], 'items': {'type': 'integer'}},
+        'leader_agent_id': {'type': ['integer', 'null']}
+    }
+})
+
+# タスク一覧のページサイズ（limit省略時・上限）
+_TASKS_PAGE_DEFAULT = 50
+_TASKS_PAGE_MAX = 200
+
+
+def _parse_task_cursor(cursor):
+    """
+    タスク一覧のカーソル（"<created_atのISO 8601>,<id>"）を解析
+    
+    Args:
+        cursor: 前ページのレスポンスのnext_cursor
+        
+    Returns:
+        Tuple[datetime, int]: (作成日時, タスクID)
+        
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    created_at, _, task_id = cursor.rpartition(',')
+    try:
+        return datetime.fromisoformat(created_at), int(task_id)
+    except ValueError:
+        raise ValueError(f'Invalid cursor: {cursor}')
+
+
+def _tasks_state():
+    """
+    タスク一覧の変更検出用の値を1回のクエリで取得
+    
+    タスクの件数・最終更新日時に加え、詳細ステータスに影響するインタラクション、
+    担当エージェント名に影響するエージェントの変更も含めます。
+    """
+    return tuple(db.session.query(
+        db.session.query(func.count(Task.id)).scalar_subquery(),
+        db.session.query(func.max(Task.updated_at)).scalar_subquery(),
+        db.session.query(func.max(TaskInteraction.id)).scalar_subquery(),
+        db.session.query(func.max(TaskInteraction.responded_at)).scalar_subquery(),
+        db.session.query(func.max(Agent.updated_at)).scalar_subquery()
+    ).one())
 
 
 @tasks_bp.route('', methods=['GET'])
+@etag_validated(_tasks_state)
+@cached_response('tasks')
+@api_endpoint
 def get_tasks():
     """タスク一覧を取得"""
-    try:
-        # クエリパラメータでフィルタリング
-        status = request.args.get('status')
-        agent_id = request.args.get('agent_id', type=int)
-        updated_since = request.args.get('updated_since')  # ISO 8601形式のタイムスタンプ
-        
-        query = Task.query
-        
-        if status:
-            query = query.filter_by(status=status)
-        if agent_id:
-            query = query.filter_by(assigned_to=agent_id)
-        
-        # 指定時刻以降に更新されたタスクのみ取得（差分更新用）
-        if updated_since:
-            from datetime import datetime
-            try:
-                since_dt = datetime.fromisoformat(updated_since.replace('Z', '+00:00'))
-                query = query.filter(Task.updated_at >= since_dt)
-            except ValueError:
-                pass  # 無効な日時形式の場合は無視
-        
-        # 親タスクのみ取得（サブタスクは除外）
-        query = query.filter_by(parent_task_id=None)
-        
-        tasks = query.order_by(Task.created_at.desc()).all()
-        
-        return jsonify({
+    # クエリパラメータでフィルタリング
+    status = request.args.get('status')
+    agent_id = request.args.get('agent_id', type=int)
+    updated_since = request.args.get('updated_since')  # ISO 8601形式のタイムスタンプ
+    
+    query = Task.query.options(*_TASK_WITH_SUBTASKS_OPTIONS)
+    
+    if status:
+        query = query.filter_by(status=status)
+    if agent_id:
+        query = query.filter_by(assigned_to=agent_id)
+    
+    # 指定時刻以降に更新されたタスクのみ取得（差分更新用）
+    if updated_since:
+        try:
+            since_dt = datetime.fromisoformat(updated_since.replace('Z', '+00:00'))
+            query = query.filter(Task.updated_at >= since_dt)
+        except ValueError:
+            pass  # 無効な日時形式の場合は無視
+    
+    # 親タスクのみ取得（サブタスクは除外）
+    query = query.filter_by(parent_task_id=None)
+    query = query.order_by(Task.created_at.desc(), Task.id.desc())
+    
+    # limit・cursorが指定されていない場合は従来どおり全件を返す
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        tasks = query.all()
+        return ojsonify({
             'success': True,
             'data': [task.to_dict(include_subtasks=True) for task in tasks]
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        }, 200)
+    
+    # キーセットページネーション（OFFSETを使わず、前ページ最後のタスクより後ろを取得）
+    limit = min(max(request.args.get('limit', _TASKS_PAGE_DEFAULT, type=int), 1), _TASKS_PAGE_MAX)
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor_created_at, cursor_id = _parse_task_cursor(cursor)
+        query = query.filter(or_(
+            Task.created_at < cursor_created_at,
+            and_(Task.created_at == cursor_created_at, Task.id < cursor_id)
+        ))
+    
+    # 1件多く取得し、次のページがあるかを判定
+    tasks = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = f'{tasks[-1].created_at.isoformat()},{tasks[-1].id}'
+    
+    return ojsonify({
+        'success': True,
+        'data': [task.to_dict(include_subtasks=True) for task in tasks],
+        'next_cursor': next_cursor
+    }, 200)
 
 
 @tasks_bp.route('/<int:task_id>', methods=['GET'])
+@api_endpoint
 def get_task(task_id):
     """特定のタスクを取得"""
-    try:
-        task = Task.query.get_or_404(task_id)
-        return jsonify({
-            'success': True,
-            'data': task.to_dict(include_subtasks=True)
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 404
+    task = Task.query.options(*_TASK_WITH_SUBTASKS_OPTIONS).get_or_404(task_id)
+    return ojsonify({
+        'success': True,
+        'data': task.to_dict(include_subtasks=True)
+    }, 200)
 
 
 @tasks_bp.route('', methods=['POST'])
+@api_endpoint
 def create_task():
     """新しいタスクを作成"""
-    try:
-        data = request.get_json()
-        
-        # 必須フィールドのチェック
-        if 'description' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required field: description'
-            }), 400
-        
-        # タスクの作成
-        task = task_service.create_task(
-            title=data.get('title', data['description'][:50]),
-            description=data['description'],
-            priority=data.get('priority', 'medium'),
-            assigned_to=data.get('assigned_to'),
-            mode=data.get('mode', 'single'),
-            deadline=data.get('deadline'),
-            additional_tool_names=data.get('additional_tool_names'),
-            team_member_ids=data.get('team_member_ids'),
-            leader_agent_id=data.get('leader_agent_id')
-        )
-        
-        return jsonify({
-            'success': True,
-            'data': task.to_dict(),
-            'message': 'Task created successfully'
-        }), 201
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    data = request.get_json()
+    
+    # 必須フィールド・型のチェック
+    error = _TASK_POST_VALIDATOR(data)
+    if error:
+        return error
+    
+    # タスクの作成
+    task = task_service.create_task(
+        title=data.get('title', data['description'][:50]),
+        description=data['description'],
+        priority=data.get('priority', 'medium'),
+        assigned_to=data.get('assigned_to'),
+        mode=data.get('mode', 'single'),
+        deadline=data.get('deadline'),
+        additional_tool_names=data.get('additional_tool_names'),
+        team_member_ids=data.get('team_member_ids'),
+        leader_agent_id=data.get('leader_agent_id')
+    )
+    
+    return ojsonify({
+        'success': True,
+        'data': task.to_dict(),
+        'message': 'Task created successfully'
+    }, 201)
 
 
 @tasks_bp.route('/<int:task_id>', methods=['PUT'])
+@api_endpoint
 def update_task(task_id):
     """タスクを更新"""
-    try:
-        task = Task.query.get_or_404(task_id)
-        data = request.get_json()
-        
-        # 更新可能なフィールド
-        updatable_fields = ['title', 'description', 'priority', 'status',
-                            'assigned_to', 'deadline', 'result',
-                            'error_message', 'additional_tool_names',
-                            'team_member_ids', 'leader_agent_id']
-        
-        for field in updatable_fields:
-            if field in data:
-                setattr(task, field, data[field])
-        
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'data': task.to_dict(),
-            'message': 'Task updated successfully'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    task = Task.query.get_or_404(task_id)
+    data = request.get_json()
+    
+    # 更新可能なフィールド
+    updatable_fields = ['title', 'description', 'priority', 'status',
+                        'assigned_to', 'deadline', 'result',
+                        'error_message', 'additional_tool_names',
+                        'team_member_ids', 'leader_agent_id']
+    
+    for field in updatable_fields:
+        if field in data:
+            setattr(task, field, data[field])
+    
+    db.session.commit()
+    
+    return ojsonify({
+        'success': True,
+        'data': task.to_dict(),
+        'message': 'Task updated successfully'
+    }, 200)
 
 
 @tasks_bp.route('/<int:task_id>', methods=['DELETE'])
+@api_endpoint
 def delete_task(task_id):
     """タスクを削除"""
-    try:
-        task = Task.query.get_or_404(task_id)
-        
-        # 強制削除フラグをチェック
-        force = request.args.get('force', 'false').lower() == 'true'
-        
-        # 実行中のタスクは通常削除できないが、forceフラグがあれば削除可能
-        if task.status == 'running' and not force:
-            return jsonify({
-                'success': False,
-                'error': 'Cannot delete running task. Use force=true to delete anyway.'
-            }), 400
-        
-        # 実行中のタスクを強制削除する場合、まずキャンセル状態に変更
-        if task.status == 'running' and force:
-            task.status = 'cancelled'
-            db.session.commit()
-        
-        db.session.delete(task)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': 'Task deleted successfully'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
+    task = Task.query.get_or_404(task_id)
+    
+    # 強制削除フラグをチェック
+    force = request.args.get('force', 'false').lower() == 'true'
+    
+    # 実行中のタスクは通常削除できないが、forceフラグがあれば削除可能
+    if task.status == 'running' and not force:
+        return ojsonify({
             'success': False,
-            'error': str(e)
-        }), 500
+            'error': 'Cannot delete running task. Use force=true to delete anyway.'
+        }, 400)
+    
+    # 実行中のタスクを強制削除する場合、まずキャンセル状態に変更
+    if task.status == 'running' and force:
+        task.status = 'cancelled'
+        db.session.commit()
+    
+    db.session.delete(task)
+    db.session.commit()
+    
+    return ojsonify({
+        'success': True,
+        'message': 'Task deleted successfully'
+    }, 200)
 
 
 @tasks_bp.route('/<int:task_id>/execute', methods=['POST'])
+@api_endpoint
 def execute_task(task_id):
     """タスクを実行"""
-    try:
-        task = Task.query.get_or_404(task_id)
-        
-        # デバッグログ
-        print(f"Task {task_id} details:")
-        print(f"  - Status: {task.status}")
-        print(f"  - Assigned to: {task.assigned_to}")
-        print(f"  - Title: {task.title}")
-        
-        # タスクの状態チェック
-        if task.status == 'running':
-            error_msg = 'Task is already running'
-            print(f"Error: {error_msg}")
-            return jsonify({
+    task = Task.query.get_or_404(task_id)
+    
+    # デバッグログ（引数は出力時のみ整形される）
+    logger.debug(
+        "Task %s details: status=%s, assigned_to=%s, title=%s",
+        task_id, task.status, task.assigned_to, task.title
+    )
+    
+    # タスクの状態チェック
+    if task.status == 'running':
+        error_msg = 'Task is already running'
+        logger.debug("Task %s: %s", task_id, error_msg)
+        return ojsonify({
+            'success': False,
+            'error': error_msg
+        }, 400)
+    
+    # エージェントが未割り当ての場合、最初のエージェントを自動割り当て
+    if not task.assigned_to:
+        first_agent = Agent.query.first()
+        if not first_agent:
+            error_msg = 'No agents available. Please create an agent first.'
+            logger.debug("Task %s: %s", task_id, error_msg)
+            return ojsonify({
                 'success': False,
                 'error': error_msg
-            }), 400
-        
-        # エージェントが未割り当ての場合、最初のエージェントを自動割り当て
-        if not task.assigned_to:
-            first_agent = Agent.query.first()
-            if not first_agent:
-                error_msg = 'No agents available. Please create an agent first.'
-                print(f"Error: {error_msg}")
-                return jsonify({
-                    'success': False,
-                    'error': error_msg
-                }), 400
-            
-            task.assigned_to = first_agent.id
-            db.session.commit()
-            print(f"Auto-assigned task to agent: {first_agent.name} (ID: {first_agent.id})")
-        
-        # タスク実行（非同期）
-        from app.services.execution_service import ExecutionService
-        execution_service = ExecutionService()
-        execution_service.execute_task_async(task.id)
+            }, 400)
         
-        return jsonify({
-            'success': True,
-            'message': 'Task execution started',
-            'data': task.to_dict()
-        }), 200
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        task.assigned_to = first_agent.id
+        db.session.commit()
+        logger.debug("Auto-assigned task %s to agent: %s (ID: %s)", task_id, first_agent.name, first_agent.id)
+    
+    # タスク実行（非同期）
+    execution_service.dispatch_task(task.id)
+    
+    return ojsonify({
+        'success': True,
+        'message': 'Task execution started',
+        'data': task.to_dict()
+    }, 202)
+
 
 @tasks_bp.route('/<int:task_id>/toggle-auto-mode', methods=['POST'])
+@api_endpoint
 def toggle_auto_mode(task_id):
     """タスクの自動/対話モードを切り替え"""
-    try:
-        task = Task.query.get_or_404(task_id)
-        
-        # auto_modeを切り替え
-        task.auto_mode = not task.auto_mode
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'data': task.to_dict(),
-            'message': f'Auto mode {"enabled" if task.auto_mode else "disabled"}'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    task = Task.query.get_or_404(task_id)
+    
+    # auto_modeを切り替え
+    task.auto_mode = not task.auto_mode
+    db.session.commit()
+    
+    return ojsonify({
+        'success': True,
+        'data': task.to_dict(),
+        'message': f'Auto mode {"enabled" if task.auto_mode else "disabled"}'
+    }, 200)
 
 
 @tasks_bp.route('/<int:task_id>/cancel', methods=['POST'])
+@api_endpoint
 def cancel_task(task_id):
     """タスクをキャンセル"""
-    try:
-        task = Task.query.get_or_404(task_id)
-        
-        # 既にキャンセル済み、完了済み、失敗済みの場合はエラー
-        if task.status in ['cancelled', 'completed', 'failed']:
-            return jsonify({
-                'success': False,
-                'error': f'Task is already {task.status}'
-            }), 400
-        
-        # pending, running, またはその他の状態（入力待ちなど）はキャンセル可能
-        task.status = 'cancelled'
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'data': task.to_dict(),
-            'message': 'Task cancelled successfully'
-        }), 200
-        
-    except Exception as e:
-        import traceback
-        error_details = {
-            'error': str(e),
-            'type': type(e).__name__,
-            'traceback': traceback.format_exc()
-        }
-        print(f"Task execution error: {error_details}")
-        return jsonify({
+    task = Task.query.get_or_404(task_id)
+    
+    # 既にキャンセル済み、完了済み、失敗済みの場合はエラー
+    if task.status in ['cancelled', 'completed', 'failed']:
+        return ojsonify({
             'success': False,
-            'error': str(e),
-            'details': error_details
-        }), 500
+            'error': f'Task is already {task.status}'
+        }, 400)
+    
+    # pending, running, またはその他の状態（入力待ちなど）はキャンセル可能
+    task.status = 'cancelled'
+    db.session.commit()
+    
+    return ojsonify({
+        'success': True,
+        'data': task.to_dict(),
+        'message': 'Task cancelled successfully'
+    }, 200)
 
 
 @tasks_bp.route('/<int:task_id>/logs', methods=['GET'])
+@cached_response('tasks')
+@api_endpoint
 def get_task_logs(task_id):
     """タスクの実行ログを取得"""
-    try:
-        task = Task.query.get_or_404(task_id)
-        logs = task.execution_logs.order_by('created_at').all()
-        
-        return jsonify({
-            'success': True,
-            'data': [log.to_dict() for log in logs]
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
+    # タスクを読み込まずにログを直接取得（エージェント名・ツール名は結合で取得）
+    logs = ExecutionLog.query.options(
+        joinedload(ExecutionLog.agent),
+        joinedload(ExecutionLog.tool)
+    ).filter_by(task_id=task_id).order_by(ExecutionLog.created_at).all()
+    
+    # 結果が空の場合のみタスクの存在を確認
+    if not logs and not db.session.query(Task.query.filter_by(id=task_id).exists()).scalar():
+        return ojsonify({
             'success': False,
-            'error': str(e)
-        }), 500
+            'error': 'Task not found'
+        }, 404)
+    
+    return ojsonify({
+        'success': True,
+        'data': [log.to_dict() for log in logs]
+    }, 200)
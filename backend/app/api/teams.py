@@ -1,187 +1,178 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from app.api.responses import api_endpoint, ojsonify
+from app.api.response_cache import cached_response, invalidate_on_write
 from app import db
 from app.models import Team, Agent
 
 teams_bp = Blueprint('teams', __name__)
+invalidate_on_write(teams_bp, 'teams')
+
+
+def _existing_agent_ids(agent_ids):
+    """
+    指定したIDのうち存在するエージェントのIDを取得（IDカラムのみを1クエリで取得）
+    
+    Args:
+        agent_ids: エージェントIDのイテラブル（Noneは無視）
+        
+    Returns:
+        Set[int]: 存在するエージェントのID
+    """
+    agent_ids = {agent_id for agent_id in agent_ids if agent_id is not None}
+    if not agent_ids:
+        return set()
+    return set(db.session.scalars(select(Agent.id).where(Agent.id.in_(agent_ids))))
 
 
 @teams_bp.route('', methods=['GET'])
+@cached_response('teams')
+@api_endpoint
 def get_teams():
     """チーム一覧を取得"""
-    try:
-        # クエリパラメータでフィルタリング
-        is_active = request.args.get('is_active')
-        
-        query = Team.query
-        
-        if is_active is not None:
-            query = query.filter_by(is_active=is_active.lower() == 'true')
-        
-        teams = query.order_by(Team.created_at.desc()).all()
-        
-        return jsonify({
-            'success': True,
-            'data': [team.to_dict(include_members=True) for team in teams]
-        }), 200
-        
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    # クエリパラメータでフィルタリング
+    is_active = request.args.get('is_active')
+    
+    query = Team.query.options(joinedload(Team.leader_agent))
+    
+    if is_active is not None:
+        query = query.filter_by(is_active=is_active.lower() == 'true')
+    
+    teams = query.order_by(Team.created_at.desc()).all()
+    
+    # 全チームのメンバー情報は1回のクエリでまとめて取得
+    members_by_id = Team.get_members_by_id(
+        member_id for team in teams for member_id in (team.member_ids or [])
+    )
+    
+    return ojsonify({
+        'success': True,
+        'data': [team.to_dict(include_members=True, members_by_id=members_by_id) for team in teams]
+    }, 200)
 
 
 @teams_bp.route('/<int:team_id>', methods=['GET'])
+@cached_response('teams')
+@api_endpoint
 def get_team(team_id):
     """特定のチームを取得"""
-    try:
-        team = Team.query.get_or_404(team_id)
-        return jsonify({
-            'success': True,
-            'data': team.to_dict(include_members=True)
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 404
+    team = Team.query.get_or_404(team_id)
+    return ojsonify({
+        'success': True,
+        'data': team.to_dict(include_members=True)
+    }, 200)
 
 
 @teams_bp.route('', methods=['POST'])
+@api_endpoint
 def create_team():
     """新しいチームを作成"""
-    try:
-        data = request.get_json()
-        
-        # 必須フィールドのチェック
-        if 'name' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required field: name'
-            }), 400
-        
-        if 'leader_agent_id' not in data:
-            return jsonify({
-                'success': False,
-                'error': 'Missing required field: leader_agent_id'
-            }), 400
-        
-        # リーダーエージェントの存在確認
-        leader = Agent.query.get(data['leader_agent_id'])
-        if not leader:
-            return jsonify({
-                'success': False,
-                'error': f'Leader agent {data["leader_agent_id"]} not found'
-            }), 404
-        
-        # メンバーエージェントの存在確認
-        member_ids = data.get('member_ids', [])
-        if member_ids:
-            members = Agent.query.filter(Agent.id.in_(member_ids)).all()
-            if len(members) != len(member_ids):
-                return jsonify({
-                    'success': False,
-                    'error': 'One or more member agents not found'
-                }), 404
-        
-        # チームの作成
-        team = Team(
-            name=data['name'],
-            description=data.get('description'),
-            leader_agent_id=data['leader_agent_id'],
-            member_ids=member_ids,
-            is_active=data.get('is_active', True)
-        )
-        
-        db.session.add(team)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'data': team.to_dict(include_members=True),
-            'message': 'Team created successfully'
-        }), 201
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
+    data = request.get_json()
+    
+    # 必須フィールドのチェック
+    if 'name' not in data:
+        return ojsonify({
+            'success': False,
+            'error': 'Missing required field: name'
+        }, 400)
+    
+    if 'leader_agent_id' not in data:
+        return ojsonify({
+            'success': False,
+            'error': 'Missing required field: leader_agent_id'
+        }, 400)
+    
+    # リーダー・メンバーエージェントの存在確認（1クエリでまとめて確認）
+    member_ids = data.get('member_ids', [])
+    found_ids = _existing_agent_ids([data['leader_agent_id'], *(member_ids or [])])
+    if data['leader_agent_id'] not in found_ids:
+        return ojsonify({
             'success': False,
-            'error': str(e)
-        }), 500
+            'error': f'Leader agent {data["leader_agent_id"]} not found'
+        }, 404)
+    
+    if not found_ids.issuperset(member_ids or []):
+        return ojsonify({
+            'success': False,
+            'error': 'One or more member agents not found'
+        }, 404)
+    
+    # チームの作成
+    team = Team(
+        name=data['name'],
+        description=data.get('description'),
+        leader_agent_id=data['leader_agent_id'],
+        member_ids=member_ids,
+        is_active=data.get('is_active', True)
+    )
+    
+    db.session.add(team)
+    db.session.commit()
+    
+    return ojsonify({
+        'success': True,
+        'data': team.to_dict(include_members=True),
+        'message': 'Team created successfully'
+    }, 201)
 
 
 @teams_bp.route('/<int:team_id>', methods=['PUT'])
+@api_endpoint
 def update_team(team_id):
     """チームを更新"""
-    try:
-        team = Team.query.get_or_404(team_id)
-        data = request.get_json()
-        
-        # 更新可能なフィールド
-        if 'name' in data:
-            team.name = data['name']
-        
-        if 'description' in data:
-            team.description = data['description']
-        
-        if 'leader_agent_id' in data:
-            # リーダーエージェントの存在確認
-            leader = Agent.query.get(data['leader_agent_id'])
-            if not leader:
-                return jsonify({
-                    'success': False,
-                    'error': f'Leader agent {data["leader_agent_id"]} not found'
-                }), 404
-            team.leader_agent_id = data['leader_agent_id']
-        
-        if 'member_ids' in data:
-            # メンバーエージェントの存在確認
-            member_ids = data['member_ids']
-            if member_ids:
-                members = Agent.query.filter(Agent.id.in_(member_ids)).all()
-                if len(members) != len(member_ids):
-                    return jsonify({
-                        'success': False,
-                        'error': 'One or more member agents not found'
-                    }), 404
-            team.member_ids = member_ids
-        
-        if 'is_active' in data:
-            team.is_active = data['is_active']
-        
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'data': team.to_dict(include_members=True),
-            'message': 'Team updated successfully'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    team = Team.query.get_or_404(team_id)
+    data = request.get_json()
+    
+    # 更新可能なフィールド
+    if 'name' in data:
+        team.name = data['name']
+    
+    if 'description' in data:
+        team.description = data['description']
+    
+    # リーダー・メンバーエージェントの存在確認（1クエリでまとめて確認）
+    found_ids = _existing_agent_ids([data.get('leader_agent_id'), *(data.get('member_ids') or [])])
+    
+    if 'leader_agent_id' in data:
+        if data['leader_agent_id'] not in found_ids:
+            return ojsonify({
+                'success': False,
+                'error': f'Leader agent {data["leader_agent_id"]} not found'
+            }, 404)
+        team.leader_agent_id = data['leader_agent_id']
+    
+    if 'member_ids' in data:
+        member_ids = data['member_ids']
+        if not found_ids.issuperset(member_ids or []):
+            return ojsonify({
+                'success': False,
+                'error': 'One or more member agents not found'
+            }, 404)
+        team.member_ids = member_ids
+    
+    if 'is_active' in data:
+        team.is_active = data['is_active']
+    
+    db.session.commit()
+    
+    return ojsonify({
+        'success': True,
+        'data': team.to_dict(include_members=True),
+        'message': 'Team updated successfully'
+    }, 200)
 
 
 @teams_bp.route('/<int:team_id>', methods=['DELETE'])
+@api_endpoint
 def delete_team(team_id):
     """チームを削除"""
-    try:
-        team = Team.query.get_or_404(team_id)
-        
-        db.session.delete(team)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': 'Team deleted successfully'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    team = Team.query.get_or_404(team_id)
+    
+    db.session.delete(team)
+    db.session.commit()
+    
+    return ojsonify({
+        'success': True,
+        'message': 'Team deleted successfully'
+    }, 200)
@@ -1,12 +1,19 @@
-from flask import Blueprint, request, jsonify
+import functools
+import logging
+from collections import Counter
+
+import orjson
+
+from flask import Blueprint, Response, request, stream_with_context
+from app.api.responses import ojsonify, stream_sse
+from app.api.task_analysis import build_llm, get_active_setting
+from app.event_loop import iter_async, run_async
 from app.tools import ToolRegistry
-from app.tools.dynamic_tool_generator import DynamicToolGenerator
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.chat_models import ChatOllama
+from app.tools.dynamic_tool_generator import DynamicToolGenerator, validate_code
+from app.tools.process_pool import run_in_process
 
 tools_bp = Blueprint('tools', __name__)
+logger = logging.getLogger(__name__)
 
 
 @tools_bp.route('', methods=['GET'])
@@ -23,16 +30,16 @@ def get_tools():
         if category:
             tools_info = [t for t in tools_info if t['category'] == category]
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': tools_info
-        }), 200
+        }, 200)
         
     except Exception as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 
 @tools_bp.route('/<string:tool_name>', methods=['GET'])
@@ -41,61 +48,121 @@ def get_tool(tool_name):
     try:
         tool = ToolRegistry.get_tool(tool_name)
         if not tool:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': f'Tool not found: {tool_name}'
-            }), 404
+            }, 404)
         
         # ツール情報を取得
-        tools_info = ToolRegistry.get_tools_info()
-        tool_info = next((t for t in tools_info if t['name'] == tool_name), None)
+        tool_info = ToolRegistry.get_tool_info(tool_name)
         
         if not tool_info:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': f'Tool info not found: {tool_name}'
-            }), 404
+            }, 404)
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': tool_info
-        }), 200
+        }, 200)
         
     except Exception as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
+
+
+# カテゴリ一覧のキャッシュ: (ToolRegistryのバージョン, カテゴリ情報のリスト)
+_categories_cache = (-1, [])
+
+
+@functools.lru_cache(maxsize=256)
+def _label(category: str) -> str:
+    """カテゴリ名の表示用ラベルを作成（例: file_operations -> File Operations）"""
+    return category.replace('_', ' ').title()
+
+
+def _get_categories_data():
+    """
+    カテゴリ情報のリストを取得（ツールの登録内容が変わるまでキャッシュ）
+    
+    Returns:
+        List[Dict]: カテゴリ名順のカテゴリ情報（value, label, count）
+    """
+    global _categories_cache
+    version = ToolRegistry.version()
+    cached_version, categories_data = _categories_cache
+    if cached_version == version:
+        return categories_data
+    
+    # ツール一覧を1回走査してカテゴリごとの件数を数える
+    counts = Counter(t['category'] for t in ToolRegistry.get_tools_info())
+    categories_data = [
+        {
+            'value': cat,
+            'label': _label(cat),
+            'count': count
+        }
+        for cat, count in sorted(counts.items())
+    ]
+    _categories_cache = (version, categories_data)
+    return categories_data
 
 
 @tools_bp.route('/categories', methods=['GET'])
 def get_categories():
     """ツールカテゴリ一覧を取得"""
     try:
-        # ToolRegistryから全ツールを取得してカテゴリを抽出
-        tools_info = ToolRegistry.get_tools_info()
-        categories = list(set(t['category'] for t in tools_info))
-        
-        # カテゴリ情報を整形
-        categories_data = [
-            {
-                'value': cat,
-                'label': cat.replace('_', ' ').title(),
-                'count': sum(1 for t in tools_info if t['category'] == cat)
-            }
-            for cat in sorted(categories)
-        ]
+        categories_data = _get_categories_data()
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': categories_data
-        }), 200
+        }, 200)
         
     except Exception as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
+
+
+# これより長い文字列の実行結果はストリーミングで返す
+_TEST_RESULT_STREAM_THRESHOLD = 1024 * 1024
+# ストリーミング時に1回でシリアライズする文字数
+_TEST_RESULT_CHUNK_SIZE = 64 * 1024
+
+
+def _stream_test_result(tool_name, parameters, result):
+    """
+    文字列の実行結果を分割してシリアライズし、test_toolと同じ形式のJSONをストリーミングで返す
+    
+    レスポンス全体のバイト列を組み立てないため、結果が大きくても結果の文字列以上のメモリを使用しません。
+    
+    Args:
+        tool_name: ツール名
+        parameters: 実行時のパラメータ
+        result: 実行結果（文字列）
+        
+    Returns:
+        Response: ストリーミングJSONレスポンス
+    """
+    def generate():
+        yield (
+            b'{"success":true,"message":"Tool test completed","data":{"tool_name":'
+            + orjson.dumps(tool_name)
+            + b',"parameters":'
+            + orjson.dumps(parameters)
+            + b',"result":"'
+        )
+        for start in range(0, len(result), _TEST_RESULT_CHUNK_SIZE):
+            # 区切りごとに文字列としてシリアライズし、前後の引用符を除いて連結する
+            yield orjson.dumps(result[start:start + _TEST_RESULT_CHUNK_SIZE])[1:-1]
+        yield b'"}}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 
 @tools_bp.route('/<string:tool_name>/test', methods=['POST'])
@@ -104,10 +171,10 @@ def test_tool(tool_name):
     try:
         tool = ToolRegistry.get_tool(tool_name)
         if not tool:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': f'Tool not found: {tool_name}'
-            }), 404
+            }, 404)
         
         data = request.get_json() or {}
         parameters = data.get('parameters', {})
@@ -115,7 +182,10 @@ def test_tool(tool_name):
         # ツールを実行
         result = tool.invoke(parameters)
         
-        return jsonify({
+        if isinstance(result, str) and len(result) > _TEST_RESULT_STREAM_THRESHOLD:
+            return _stream_test_result(tool_name, parameters, result)
+        
+        return ojsonify({
             'success': True,
             'data': {
                 'tool_name': tool_name,
@@ -123,13 +193,13 @@ def test_tool(tool_name):
                 'result': result
             },
             'message': 'Tool test completed'
-        }), 200
+        }, 200)
         
     except Exception as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 
 # MCP関連のエンドポイント（将来の拡張用）
@@ -140,66 +210,104 @@ def get_mcp_tools():
         tools_info = ToolRegistry.get_tools_info()
         mcp_tools = [t for t in tools_info if t.get('is_mcp', False)]
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': mcp_tools
-        }), 200
+        }, 200)
         
     except Exception as e:
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
 
 
 @tools_bp.route('/mcp', methods=['POST'])
 def register_mcp_tool():
     """MCPツールを登録（将来の実装）"""
-    return jsonify({
+    return ojsonify({
         'success': False,
         'error': 'MCP tool registration is not yet implemented'
-    }), 501
+    }, 501)
+
+
+def _parse_generate_request():
+    """
+    ツール生成リクエストを検証し、生成に必要な値を取得
+    
+    Returns:
+        tuple: ((description, category, llm_setting), None) または (None, エラーレスポンス)
+    """
+    data = request.get_json()
+    if not data:
+        return None, ojsonify({
+            'success': False,
+            'error': 'Request body is required'
+        }, 400)
+    
+    description = data.get('description')
+    if not description:
+        return None, ojsonify({
+            'success': False,
+            'error': 'description is required'
+        }, 400)
+    
+    category = data.get('category', 'custom')
+    provider = data.get('provider')  # オプション: 使用するLLMプロバイダー
+    
+    # LLM設定を取得（有効な設定は短時間キャッシュされる）
+    llm_setting = get_active_setting(provider)
+    if provider:
+        # 指定されたプロバイダーを使用
+        if not llm_setting:
+            return None, ojsonify({
+                'success': False,
+                'error': f'LLM provider "{provider}" not found or inactive'
+            }, 400)
+    else:
+        # デフォルト: 最初のアクティブなLLM設定を使用
+        if not llm_setting:
+            return None, ojsonify({
+                'success': False,
+                'error': 'No active LLM setting found. Please configure an LLM provider in Settings.'
+            }, 400)
+    
+    return (description, category, llm_setting), None
+
+
+def _register_generated_tool(tool_instance, category, description):
+    """
+    生成したツールをToolRegistryに登録し、ツール情報を返す
+    
+    Args:
+        tool_instance: 生成されたツールのインスタンス
+        category: ツールのカテゴリ
+        description: 生成に使用した説明
+        
+    Returns:
+        Dict: 登録したツールの情報
+    """
+    ToolRegistry.register(
+        tool_instance=tool_instance,
+        category=category,
+        metadata={
+            'is_builtin': False,
+            'is_mcp': False,
+            'is_dynamic': True,
+            'description': description
+        }
+    )
+    return ToolRegistry.get_tool_info(tool_instance.name)
 
 
 @tools_bp.route('/generate', methods=['POST'])
 def generate_tool():
     """AIを使用してツールを動的に生成"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'Request body is required'
-            }), 400
-        
-        description = data.get('description')
-        if not description:
-            return jsonify({
-                'success': False,
-                'error': 'description is required'
-            }), 400
-        
-        category = data.get('category', 'custom')
-        provider = data.get('provider')  # オプション: 使用するLLMプロバイダー
-        
-        # LLM設定を取得
-        from app.models.llm_setting import LLMSetting
-        if provider:
-            # 指定されたプロバイダーを使用
-            llm_setting = LLMSetting.query.filter_by(provider=provider, is_active=True).first()
-            if not llm_setting:
-                return jsonify({
-                    'success': False,
-                    'error': f'LLM provider "{provider}" not found or inactive'
-                }), 400
-        else:
-            # デフォルト: 最初のアクティブなLLM設定を使用
-            llm_setting = LLMSetting.query.filter_by(is_active=True).first()
-            if not llm_setting:
-                return jsonify({
-                    'success': False,
-                    'error': 'No active LLM setting found. Please configure an LLM provider in Settings.'
-                }), 400
+        params, error = _parse_generate_request()
+        if error:
+            return error
+        description, category, llm_setting = params
         
         # LangChain LLMインスタンスを作成
         llm = _create_llm_instance(llm_setting)
@@ -207,92 +315,155 @@ def generate_tool():
         # DynamicToolGeneratorを使用してツールを生成
         generator = DynamicToolGenerator(llm)
         
-        # asyncメソッドを同期的に実行
-        import asyncio
-        tool_instance, tool_code = asyncio.run(
+        # asyncメソッドを共有のイベントループで実行（リクエストごとにループを作成しない）
+        tool_instance, tool_code = run_async(
             generator.generate_tool_from_description(
                 description=description,
                 user_requirements={"category": category}
             )
         )
         
-        # ToolRegistryに登録
-        ToolRegistry.register(
-            tool_instance=tool_instance,
-            category=category,
-            metadata={
-                'is_builtin': False,
-                'is_mcp': False,
-                'is_dynamic': True,
-                'description': description
-            }
-        )
+        # ToolRegistryに登録し、生成されたツール情報を返す
+        tool_info = _register_generated_tool(tool_instance, category, description)
         
-        # 生成されたツール情報を返す
-        tools_info = ToolRegistry.get_tools_info()
-        tool_info = next((t for t in tools_info if t['name'] == tool_instance.name), None)
-        
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': tool_info,
             'message': f'Tool "{tool_instance.name}" generated successfully'
-        }), 201
+        }, 201)
         
     except ValueError as e:
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': f'Validation error: {str(e)}'
-        }), 400
+        }, 400)
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
+
+
+@tools_bp.route('/generate/stream', methods=['POST'])
+def generate_tool_stream():
+    """
+    AIを使用してツールを動的に生成し、途中経過をServer-Sent Eventsで送信
+    
+    リクエストボディは /generate と同じです。
+    生成には数十秒かかるため、LLMの出力をトークン単位で送信します。
+    
+    Returns:
+        text/event-stream: 以下のイベント（data: にJSON）
+            - {"event": "stage", "stage": "spec" | "code" | "validate"}
+            - {"event": "token", "stage": "spec" | "code", "content": "..."}
+            - {"event": "done", "data": ツール情報, "message": "..."}（成功時、最後に1回）
+            - {"event": "error", "error": "..."}（失敗時、最後に1回）
+    """
+    # リクエストの検証エラーはストリーミング開始前に通常のJSONで返す
+    params, error = _parse_generate_request()
+    if error:
+        return error
+    description, category, llm_setting = params
+    
+    try:
+        generator = DynamicToolGenerator(_create_llm_instance(llm_setting))
+    except ValueError as e:
+        return ojsonify({
+            'success': False,
+            'error': f'Validation error: {str(e)}'
+        }, 400)
+    
+    def events():
+        try:
+            for event in iter_async(
+                generator.stream_tool_from_description(
+                    description=description,
+                    user_requirements={"category": category}
+                )
+            ):
+                if event['event'] != 'tool':
+                    yield event
+                    continue
+                
+                tool_instance = event['tool']
+                yield {
+                    'event': 'done',
+                    'data': _register_generated_tool(tool_instance, category, description),
+                    'message': f'Tool "{tool_instance.name}" generated successfully'
+                }
+        except ValueError as e:
+            yield {'event': 'error', 'error': f'Validation error: {str(e)}'}
+        except Exception as e:
+            logger.exception("Tool generation stream failed")
+            yield {'event': 'error', 'error': str(e)}
+    
+    return stream_sse(events())
+
+
+# register_custom_tool のコード検証のタイムアウト秒数
+_CODE_VALIDATION_TIMEOUT = 5
 
 
 @tools_bp.route('/register', methods=['POST'])
 def register_custom_tool():
-    """手動でツールコードを登録"""
+    """
+    手動でツールコードを登録
+    
+    Request Body:
+        JSON: {"code": "ツールのコード", "category": "カテゴリ（省略時はcustom）"}
+        または Content-Type: application/x-python でツールのコードをそのまま送信
+        （カテゴリはクエリパラメータ category で指定）
+    """
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({
-                'success': False,
-                'error': 'Request body is required'
-            }), 400
+        if request.mimetype == 'application/x-python':
+            # コードをそのまま受け取る（JSONの解析を行わない）
+            tool_code = request.get_data(as_text=True)
+            category = request.args.get('category', 'custom')
+        else:
+            data = request.get_json()
+            if not data:
+                return ojsonify({
+                    'success': False,
+                    'error': 'Request body is required'
+                }, 400)
+            
+            tool_code = data.get('code')
+            category = data.get('category', 'custom')
         
-        tool_code = data.get('code')
         if not tool_code:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'code is required'
-            }), 400
-        
-        category = data.get('category', 'custom')
+            }, 400)
         
         # アクティブなLLM設定を取得（検証用）
-        from app.models.llm_setting import LLMSetting
-        default_setting = LLMSetting.query.filter_by(is_active=True).first()
+        default_setting = get_active_setting()
         if not default_setting:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': 'No active LLM setting found. Please configure an LLM provider in Settings.'
-            }), 400
+            }, 400)
         
         llm = _create_llm_instance(default_setting)
         generator = DynamicToolGenerator(llm)
         
-        # コードを検証
-        is_valid, error_msg = generator._validate_code(tool_code)
+        # コードを検証（リクエストスレッドでCPUを占有しないよう、専用のプロセスプールで実行）
+        try:
+            is_valid, error_msg = run_in_process(validate_code, tool_code, timeout=_CODE_VALIDATION_TIMEOUT)
+        except TimeoutError:
+            return ojsonify({
+                'success': False,
+                'error': 'Code validation timed out'
+            }, 400)
         if not is_valid:
-            return jsonify({
+            return ojsonify({
                 'success': False,
                 'error': f'Code validation failed: {error_msg}'
-            }), 400
+            }, 400)
         
         # ツールインスタンスを作成（tool_specはNoneでOK）
         tool_instance = generator._create_dynamic_tool(None, tool_code)
@@ -311,80 +482,51 @@ def register_custom_tool():
         )
         
         # 生成されたツール情報を返す
-        tools_info = ToolRegistry.get_tools_info()
-        tool_info = next((t for t in tools_info if t['name'] == tool_instance.name), None)
+        tool_info = ToolRegistry.get_tool_info(tool_instance.name)
         
-        return jsonify({
+        return ojsonify({
             'success': True,
             'data': tool_info,
             'message': f'Tool "{tool_instance.name}" registered successfully'
-        }), 201
+        }, 201)
         
     except ValueError as e:
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': f'Validation error: {str(e)}'
-        }), 400
+        }, 400)
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return jsonify({
+        return ojsonify({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
+
+
+# ツール生成・登録に使用できるプロバイダー
+_TOOL_LLM_PROVIDERS = frozenset({"openai", "anthropic", "gemini", "ollama"})
 
 
 def _create_llm_instance(llm_setting):
     """
     LLM設定からLangChain LLMインスタンスを作成
     
+    タスク分析と同じキャッシュを使用し、同じ設定値のインスタンスは再利用します
+    （HTTPクライアントの接続も再利用され、LLM設定の更新・削除時はclear_llm_cacheで破棄される）。
+    
     Args:
-        llm_setting: LLMSetting モデルインスタンス
+        llm_setting: get_active_settingで取得したActiveLLMSetting
         
     Returns:
         LangChain LLMインスタンス
+        
+    Raises:
+        ValueError: ツール生成に対応していないプロバイダーの場合
     """
-    provider = llm_setting.provider
-    api_key = llm_setting.get_api_key()
-    model = llm_setting.default_model
-    temperature = llm_setting.config.get('temperature', 0.7) if llm_setting.config else 0.7
-    max_tokens = llm_setting.config.get('max_tokens', 2000) if llm_setting.config else 2000
-    
-    if provider == "openai":
-        kwargs = {
-            "model": model or "gpt-4",
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-            "api_key": api_key
-        }
-        if llm_setting.base_url:
-            kwargs["base_url"] = llm_setting.base_url
-        return ChatOpenAI(**kwargs)
-    
-    elif provider == "anthropic":
-        return ChatAnthropic(
-            model=model or "claude-3-5-sonnet-20241022",
-            temperature=temperature,
-            max_tokens=max_tokens,
-            api_key=api_key
-        )
-    
-    elif provider == "gemini":
-        return ChatGoogleGenerativeAI(
-            model=model or "gemini-2.0-flash-exp",
-            temperature=temperature,
-            max_output_tokens=max_tokens,
-            google_api_key=api_key
-        )
-    
-    elif provider == "ollama":
-        return ChatOllama(
-            model=model or "llama2",
-            temperature=temperature,
-            base_url=llm_setting.base_url or "http://localhost:11434"
-        )
-    
-    else:
+    provider = llm_setting.setting_key[0]
+    if provider not in _TOOL_LLM_PROVIDERS:
         raise ValueError(f"Unsupported LLM provider: {provider}")
+    return build_llm(*llm_setting.setting_key)
@@ -0,0 +1,56 @@
+"""
+リクエストボディのバリデーション
+
+JSON Schemaをfastjsonschemaで検証関数にコンパイルし、
+不正なリクエストはDBへアクセスする前に400で返します。
+更新時に値が変わったかの判定もここにまとめます。
+"""
+import fastjsonschema
+import orjson
+from fastjsonschema import JsonSchemaValueException
+
+from app.api.responses import error_response, missing_field_response
+
+
+def json_equal(a, b):
+    """
+    JSONカラムの値が同じかを判定（キー順序の違いは無視し、1と1.0・Trueと1は区別する）
+
+    Args:
+        a: 比較する値
+        b: 比較する値
+
+    Returns:
+        bool: シリアライズ結果が同じ場合はTrue
+    """
+    if a is b:
+        return True
+    return orjson.dumps(a, option=orjson.OPT_SORT_KEYS) == orjson.dumps(b, option=orjson.OPT_SORT_KEYS)
+
+
+def compile_validator(schema):
+    """
+    JSON Schemaから検証関数を作成（モジュール読み込み時に一度だけ呼び出す）
+
+    Args:
+        schema: JSON Schema
+
+    Returns:
+        Callable: リクエストボディを受け取り、不正な場合はエラーレスポンス、正常な場合はNoneを返す関数
+    """
+    validate = fastjsonschema.compile(schema)
+    required = tuple(schema.get('required', ()))
+
+    def validator(data):
+        try:
+            validate(data)
+        except JsonSchemaValueException as e:
+            # 必須フィールドの不足は従来と同じメッセージで返す
+            if e.rule == 'required' and isinstance(data, dict):
+                for field in required:
+                    if field not in data:
+                        return missing_field_response(field)
+            return error_response(e.message, 400)
+        return None
+
+    return validator
@@ -0,0 +1,44 @@
+"""
+Celeryタスク
+
+タスク実行をWebプロセスから切り離し、Celeryワーカーで実行します。
+ワーカーは app.celery_worker から起動します（Flaskアプリの設定をCeleryに反映するため）。
+"""
+from flask import current_app
+
+from app import celery
+
+# タスク実行用のキュー（LLM呼び出しを含む長時間タスクを他のタスクと分ける）
+TASK_EXECUTION_QUEUE = 'task_execution'
+
+
+@celery.task(name='app.run_task', acks_late=True, reject_on_worker_lost=True)
+def run_task(task_id: int):
+    """
+    タスクを実行
+
+    Args:
+        task_id: タスクID
+    """
+    from app.services.execution_service import ExecutionService
+
+    app = current_app._get_current_object()
+    # SocketIOの送信にリクエストコンテキストが必要なため作成する
+    with app.test_request_context():
+        ExecutionService().execute_task(task_id)
+
+
+@celery.task(name='app.resume_task', acks_late=True, reject_on_worker_lost=True)
+def resume_task(task_id: int, message: str):
+    """
+    完了/失敗したタスクをユーザーのメッセージで再開
+
+    Args:
+        task_id: タスクID
+        message: 追加指示（ユーザーのメッセージ）
+    """
+    from app.services.execution_service import ExecutionService
+
+    app = current_app._get_current_object()
+    with app.test_request_context():
+        ExecutionService().resume_task(task_id, message)
@@ -0,0 +1,25 @@
+"""
+Celeryワーカーのエントリーポイント
+
+    celery -A app.celery_worker.celery worker -Q task_execution,default --loglevel=info
+
+Flaskアプリを作成してCeleryの設定を反映し、各タスクをアプリケーションコンテキスト内で実行します。
+ワーカーからのWebSocket送信をクライアントに届けるには SOCKETIO_MESSAGE_QUEUE を設定してください。
+"""
+from app import celery, create_app
+
+flask_app = create_app()
+
+
+class ContextTask(celery.Task):
+    """アプリケーションコンテキスト内で実行するタスク"""
+
+    def __call__(self, *args, **kwargs):
+        with flask_app.app_context():
+            return self.run(*args, **kwargs)
+
+
+celery.Task = ContextTask
+
+# タスクを登録
+import app.celery_tasks  # noqa: E402,F401
@@ -9,6 +9,20 @@ load_dotenv()
 basedir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
 
+def _engine_options(database_uri):
+    """データベースURIに応じたSQLAlchemyエンジンオプションを生成"""
+    # SQLiteはSQLAlchemy側でNullPool/SingletonThreadPoolが使われるためプール設定は渡さない
+    if database_uri.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+
+
 class Config:
     """基本設定"""
     
@@ -21,6 +35,7 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f'sqlite:///{db_path}')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
     
     # Redis
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
@@ -28,6 +43,12 @@ class Config:
     # Celery
     CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+    CELERY_PREFETCH_MULTIPLIER = int(os.getenv('CELERY_PREFETCH_MULTIPLIER', 1))
+    CELERY_BROKER_POOL_LIMIT = int(os.getenv('CELERY_BROKER_POOL_LIMIT', 50))
+    CELERY_VISIBILITY_TIMEOUT = int(os.getenv('CELERY_VISIBILITY_TIMEOUT', 5400))
+    
+    # タスク実行方式（thread: Webプロセス内のスレッド / celery: Celeryワーカー）
+    TASK_EXECUTION_BACKEND = os.getenv('TASK_EXECUTION_BACKEND', 'thread')
     
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(',')
@@ -45,31 +66,59 @@ class Config:
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'logs/app.log')
+    LOG_BUFFER_CAPACITY = int(os.getenv('LOG_BUFFER_CAPACITY', 1024))
+    LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', 30))
     
     # WebSocket
-    SOCKETIO_ASYNC_MODE = 'threading'
+    # eventlet/geventを使う場合は該当パッケージを別途インストールして指定
+    SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
     SOCKETIO_CORS_ALLOWED_ORIGINS = CORS_ORIGINS
+    SOCKETIO_PING_TIMEOUT = int(os.getenv('SOCKETIO_PING_TIMEOUT', 60))
+    SOCKETIO_PING_INTERVAL = int(os.getenv('SOCKETIO_PING_INTERVAL', 25))
+    # Celeryワーカーなど別プロセスからの送信を中継するメッセージキュー（例: redis://localhost:6379/0）
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    
+    # Cache（Flask-Caching: 頻繁にポーリングされる読み取り系APIの短時間キャッシュ）
+    # 複数プロセスで共有する場合は CACHE_TYPE=RedisCache（Redis側は maxmemory-policy allkeys-lfu を推奨）
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'SimpleCache')
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', REDIS_URL)
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 10))
+    # GETレスポンスキャッシュ（新鮮とみなす秒数 / DBエラー時に古いレスポンスを返せる秒数）
+    RESPONSE_CACHE_FRESH_SECONDS = int(os.getenv('RESPONSE_CACHE_FRESH_SECONDS', 5))
+    RESPONSE_CACHE_STALE_SECONDS = int(os.getenv('RESPONSE_CACHE_STALE_SECONDS', 60))
     
     # Session
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
+    
+    # 起動時にdb.create_all()を実行するか
+    AUTO_CREATE_TABLES = False
 
 
 class DevelopmentConfig(Config):
     """開発環境設定"""
     DEBUG = True
     SQLALCHEMY_ECHO = False  # SQLクエリログを無効化（必要な場合はTrueに）
+    AUTO_CREATE_TABLES = True
 
 
 class ProductionConfig(Config):
     """本番環境設定"""
     DEBUG = False
     SQLALCHEMY_ECHO = False
+    # パケット単位のログは出力しない
+    SOCKETIO_LOGGER = False
+    SOCKETIO_ENGINEIO_LOGGER = False
+    # 本番環境のスキーマは setup.py / migrations/ で管理する
+    AUTO_CREATE_TABLES = os.getenv('AUTO_CREATE_TABLES', 'false').lower() == 'true'
 
 
 class TestingConfig(Config):
     """テスト環境設定"""
     TESTING = True
+    AUTO_CREATE_TABLES = True
+    CACHE_TYPE = 'NullCache'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
 
 
 # 環境に応じた設定を選択
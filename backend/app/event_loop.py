@@ -0,0 +1,83 @@
+"""
+バックグラウンドのイベントループ
+
+同期のFlaskハンドラからコルーチンを実行するための、プロセス内で共有する常駐イベントループです。
+asyncio.run のようにリクエストごとにループを作り直さないため、
+LLMクライアントの非同期HTTP接続（コネクションプール・TLSセッション）がリクエスト間で再利用されます。
+"""
+import asyncio
+import queue
+import threading
+from typing import Any, AsyncIterator, Coroutine, Iterator, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """共有のイベントループを取得（初回呼び出し時にデーモンスレッドで起動）"""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever,
+                name="async-runner",
+                daemon=True
+            ).start()
+            _loop = loop
+        return _loop
+
+
+def run_async(coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+    """
+    コルーチンを共有のイベントループで実行し、結果を待つ
+
+    Args:
+        coro: 実行するコルーチン
+        timeout: タイムアウト秒数（Noneの場合は無制限）
+
+    Returns:
+        Any: コルーチンの戻り値
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    return future.result(timeout)
+
+
+def iter_async(agen: AsyncIterator[Any], timeout: Optional[float] = None) -> Iterator[Any]:
+    """
+    非同期イテレータを共有のイベントループで実行し、同期のイテレータとして値を順に返す
+
+    ストリーミングレスポンスのジェネレータから使用します。
+    途中で閉じられた場合（クライアントの切断など）は非同期イテレータの実行をキャンセルします。
+
+    Args:
+        agen: 実行する非同期イテレータ
+        timeout: 次の値を待つタイムアウト秒数（Noneの場合は無制限）
+
+    Yields:
+        Any: 非同期イテレータが返した値
+    """
+    items: queue.Queue = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put((item, None))
+        except BaseException as e:
+            items.put((done, e))
+            raise
+        items.put((done, None))
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_event_loop())
+    try:
+        while True:
+            item, error = items.get(timeout=timeout)
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        future.cancel()
@@ -0,0 +1,50 @@
+"""
+orjsonでJSONボディを解析するリクエストクラス
+
+request.get_json() の解析を標準ライブラリのjsonからorjsonに置き換えます。
+create_app で app.request_class に設定するため、各エンドポイントの変更は不要です。
+"""
+import orjson
+from flask import Request
+from werkzeug.exceptions import BadRequest
+
+# get_jsonの結果が未解析であることを示す番兵
+_NOT_LOADED = object()
+
+
+class OrjsonRequest(Request):
+    """get_jsonをorjsonで解析するリクエストクラス"""
+
+    _orjson_cache = _NOT_LOADED
+
+    def get_json(self, force=False, silent=False, cache=True):
+        """
+        リクエストボディをJSONとして解析
+
+        Args:
+            force: Content-Typeに関係なく解析する場合はTrue
+            silent: 解析に失敗した場合に例外ではなくNoneを返す場合はTrue
+            cache: 解析結果をキャッシュする場合はTrue
+
+        Returns:
+            解析結果（Content-TypeがJSONでない場合はNone）
+        """
+        if cache and self._orjson_cache is not _NOT_LOADED:
+            return self._orjson_cache
+
+        if not (force or self.is_json):
+            return None
+
+        try:
+            rv = orjson.loads(self.get_data(cache=cache))
+        except orjson.JSONDecodeError as e:
+            if silent:
+                return None
+            return self.on_json_loading_failed(e)
+
+        if cache:
+            self._orjson_cache = rv
+        return rv
+
+    def on_json_loading_failed(self, e):
+        raise BadRequest(f"Failed to decode JSON object: {e}")
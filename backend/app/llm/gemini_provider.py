@@ -1,10 +1,41 @@
 """
 Google Gemini LLM Provider
 """
+from itertools import islice
 from typing import Dict, Any, Optional, List
 import google.generativeai as genai
 from .base_provider import BaseLLMProvider
 
+# Default safety settings (shared by all instances; never mutated)
+_DEFAULT_SAFETY_SETTINGS = tuple(
+    {"category": category, "threshold": "BLOCK_MEDIUM_AND_ABOVE"}
+    for category in (
+        "HARM_CATEGORY_HARASSMENT",
+        "HARM_CATEGORY_HATE_SPEECH",
+        "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "HARM_CATEGORY_DANGEROUS_CONTENT",
+    )
+)
+
+# Default generation config, overridden by the matching provider config keys
+_DEFAULT_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 2048,
+}
+
+# Message role -> Gemini role (anything else is treated as "model")
+_ROLE_MAP = {"user": "user", "system": "user", "assistant": "model"}
+
+# generation_config key -> provider config key
+_GENERATION_CONFIG_KEYS = (
+    ("temperature", "temperature"),
+    ("top_p", "top_p"),
+    ("top_k", "top_k"),
+    ("max_output_tokens", "max_tokens"),
+)
+
 
 class GeminiProvider(BaseLLMProvider):
     """Google Gemini LLM Provider implementation"""
@@ -32,30 +63,15 @@ class GeminiProvider(BaseLLMProvider):
         """Initialize Gemini client"""
         try:
             generation_config = {
-                "temperature": self.config.get("temperature", 0.7),
-                "top_p": self.config.get("top_p", 0.95),
-                "top_k": self.config.get("top_k", 40),
-                "max_output_tokens": self.config.get("max_tokens", 2048),
+                **_DEFAULT_GENERATION_CONFIG,
+                **{
+                    key: self.config[config_key]
+                    for key, config_key in _GENERATION_CONFIG_KEYS
+                    if config_key in self.config
+                }
             }
             
-            safety_settings = self.config.get("safety_settings", [
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-                },
-            ])
+            safety_settings = self.config.get("safety_settings", _DEFAULT_SAFETY_SETTINGS)
             
             self.client = genai.GenerativeModel(
                 model_name=self.model,
@@ -122,16 +138,14 @@ class GeminiProvider(BaseLLMProvider):
             raise Exception("Gemini client not initialized")
         
         try:
+            # Convert all but the last message to Gemini format as history
+            history = [
+                {"role": _ROLE_MAP.get(msg["role"], "model"), "parts": [msg["content"]]}
+                for msg in islice(messages, len(messages) - 1)
+            ]
+            
             # Start chat session
-            chat = self.client.start_chat(history=[])
-            
-            # Convert messages to Gemini format and send
-            for msg in messages[:-1]:  # All but last message as history
-                role = "user" if msg["role"] in ["user", "system"] else "model"
-                chat.history.append({
-                    "role": role,
-                    "parts": [msg["content"]]
-                })
+            chat = self.client.start_chat(history=history)
             
             # Send last message
             last_message = messages[-1]["content"]
@@ -0,0 +1,77 @@
+"""
+ログハンドラ
+"""
+import logging
+import os
+import threading
+from logging.handlers import MemoryHandler, RotatingFileHandler
+
+
+class FastRotatingFileHandler(RotatingFileHandler):
+    """
+    ローテーション判定を軽量化したRotatingFileHandler
+
+    標準のshouldRolloverは出力のたびにファイルの存在確認と種別確認を行うため、
+    通常ファイルかどうかはファイルを開いた時点で一度だけ判定してキャッシュし、
+    出力ごとの処理は stream.tell() のみにします。
+    """
+
+    _is_regular_file = True
+
+    def _open(self):
+        stream = super()._open()
+        # /dev/null などの通常ファイル以外はローテーションしない
+        self._is_regular_file = os.path.isfile(self.baseFilename)
+        return stream
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        if self.maxBytes <= 0 or not self._is_regular_file:
+            return False
+
+        pos = self.stream.tell()
+        if not pos:
+            return False
+        msg = "%s\n" % self.format(record)
+        return pos + len(msg) >= self.maxBytes
+
+
+class PeriodicFlushMemoryHandler(MemoryHandler):
+    """
+    一定間隔でフラッシュするMemoryHandler
+
+    レコードをバッファに溜めて書き込み回数を減らします。
+    バッファが満杯になった時、flushLevel以上のレコードを受け取った時、
+    flush_interval秒ごと、およびclose時に出力先へ書き出します。
+    """
+
+    def __init__(self, capacity, flushLevel=logging.ERROR, target=None,
+                 flushOnClose=True, flush_interval=30.0):
+        super().__init__(capacity, flushLevel=flushLevel, target=target,
+                         flushOnClose=flushOnClose)
+        self.flush_interval = flush_interval
+        self._stop_event = threading.Event()
+        self._flush_thread = None
+        if flush_interval and flush_interval > 0:
+            self._start_flush_thread()
+            # fork後の子プロセス（gunicornのpreload_appなど）ではスレッドが引き継がれないため再作成
+            os.register_at_fork(after_in_child=self._start_flush_thread)
+
+    def _start_flush_thread(self):
+        if self._stop_event.is_set():
+            return
+        self._flush_thread = threading.Thread(
+            target=self._flush_periodically,
+            name="log-flush",
+            daemon=True
+        )
+        self._flush_thread.start()
+
+    def _flush_periodically(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stop_event.set()
+        super().close()
@@ -1,5 +1,6 @@
 from datetime import datetime
 import json
+from sqlalchemy import case, func
 from app import db
 
 
@@ -43,23 +44,42 @@ class Agent(db.Model):
     # Supervisor Pattern用リレーションシップ
     supervisor = db.relationship('Agent', remote_side=[id], backref='workers', foreign_keys=[supervisor_id])
     
-    @property
-    def tool_names_list(self):
-        """tool_namesをリストとして取得"""
-        if not self.tool_names:
+    @staticmethod
+    def parse_tool_names(tool_names):
+        """tool_namesカラムの値（JSON文字列）をリストに変換"""
+        if not tool_names:
             return []
-        if isinstance(self.tool_names, list):
-            return self.tool_names
+        if isinstance(tool_names, list):
+            return tool_names
         try:
-            return json.loads(self.tool_names) if self.tool_names else []
+            return json.loads(tool_names)
         except (json.JSONDecodeError, TypeError):
             return []
     
+    @property
+    def tool_names_list(self):
+        """tool_namesをリストとして取得（カラムの値が変わるまでパース結果をキャッシュ）"""
+        raw = self.tool_names
+        cache = self.__dict__.get('_tool_names_cache')
+        if cache is None or cache[0] is not raw:
+            cache = (raw, self.parse_tool_names(raw))
+            self.__dict__['_tool_names_cache'] = cache
+        return cache[1]
+    
     def __repr__(self):
         return f'<Agent {self.name}>'
     
-    def to_dict(self):
-        """辞書形式に変換"""
+    def to_dict(self, tasks_count=None):
+        """
+        辞書形式に変換
+        
+        Args:
+            tasks_count: 事前に集計したタスク数（Noneの場合はここでCOUNTクエリを発行）
+        """
+        if tasks_count is None:
+            tasks_count = self.tasks.count()
+        tool_names = self.tool_names_list
+        
         data = {
             'id': self.id,
             'name': self.name,
@@ -69,14 +89,14 @@ class Agent(db.Model):
             'llm_model': self.llm_model,
             'llm_config': self.llm_config,
             'personality': self.personality,
-            'tool_names': self.tool_names_list,
+            'tool_names': tool_names,
             'agent_type': self.agent_type,
             'supervisor_id': self.supervisor_id,
             'status': self.status,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'tasks_count': self.tasks.count(),
-            'tools_count': len(self.tool_names_list)
+            'tasks_count': tasks_count,
+            'tools_count': len(tool_names)
         }
         
         # Supervisorの場合、ワーカー数を追加
@@ -93,10 +113,16 @@ class Agent(db.Model):
         return data
     
     def get_statistics(self):
-        """統計情報を取得"""
-        total_tasks = self.tasks.count()
-        completed_tasks = self.tasks.filter_by(status='completed').count()
-        failed_tasks = self.tasks.filter_by(status='failed').count()
+        """統計情報を取得（1回の集計クエリで算出）"""
+        from app.models.task import Task
+        
+        total_tasks, completed_tasks, failed_tasks = db.session.query(
+            func.count(Task.id),
+            func.sum(case((Task.status == 'completed', 1), else_=0)),
+            func.sum(case((Task.status == 'failed', 1), else_=0))
+        ).filter(Task.assigned_to == self.id).one()
+        completed_tasks = completed_tasks or 0
+        failed_tasks = failed_tasks or 0
         
         success_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
         
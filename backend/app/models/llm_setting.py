@@ -21,6 +21,11 @@ class LLMSetting(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # 有効なLLM設定の検索用
+        db.Index('ix_llmsetting_provider_active', provider, is_active),
+    )
+    
     def __repr__(self):
         return f'<LLMSetting {self.provider}>'
     
@@ -40,12 +45,17 @@ class LLMSetting(db.Model):
             cipher = self._get_cipher()
             self.api_key_encrypted = cipher.encrypt(api_key.encode()).decode()
     
+    @classmethod
+    def decrypt_api_key(cls, api_key_encrypted) -> str:
+        """暗号化されたAPIキーを復号化（カラム単位で取得した値用）"""
+        if api_key_encrypted:
+            cipher = cls._get_cipher()
+            return cipher.decrypt(api_key_encrypted.encode()).decode()
+        return ''
+    
     def get_api_key(self) -> str:
         """APIキーを復号化して取得"""
-        if self.api_key_encrypted:
-            cipher = self._get_cipher()
-            return cipher.decrypt(self.api_key_encrypted.encode()).decode()
-        return ''
+        return self.decrypt_api_key(self.api_key_encrypted)
     
     def to_dict(self, include_api_key=False):
         """辞書形式に変換"""
@@ -0,0 +1,60 @@
+"""
+モデルの辞書変換関数の生成
+
+to_dict のように属性ごとに条件分岐を行う変換は、一覧APIで件数分繰り返すと
+Pythonのオーバーヘッドが大きくなるため、フィールド定義から分岐のない関数を
+import時に一度だけ生成して使用します。
+"""
+
+# 値の変換方法
+RAW = 'raw'                # そのまま
+ISOFORMAT = 'isoformat'    # 日時をISO 8601文字列に（Noneの場合はNone）
+OR_LIST = 'or_list'        # 偽値の場合は空リスト
+OR_DICT = 'or_dict'        # 偽値の場合は空の辞書
+CALL = 'call'              # 引数なしでメソッドを呼び出した結果
+
+_TEMPLATES = {
+    RAW: '{v}',
+    ISOFORMAT: '{v}.isoformat() if {v} is not None else None',
+    OR_LIST: '{v} or []',
+    OR_DICT: '{v} or {{}}',
+}
+
+
+def compile_to_dict(name, fields, doc=None):
+    """
+    フィールド定義から辞書変換関数を生成
+
+    各属性は一度だけ読み出してローカル変数に束縛し、単一の辞書リテラルを返す関数を
+    exec で生成します（キーの順序はfieldsの順序）。
+
+    Args:
+        name: 生成する関数名
+        fields: (キー, 属性名またはメソッド名, 変換方法) のシーケンス
+        doc: 生成する関数のdocstring
+
+    Returns:
+        Callable[[object], Dict]: 1引数（モデルのインスタンス）を受け取る関数
+    """
+    lines = [f'def {name}(self):']
+    items = []
+    for i, (key, attr, conversion) in enumerate(fields):
+        if not attr.isidentifier():
+            raise ValueError(f'Invalid attribute name: {attr}')
+        var = f'_v{i}'
+        if conversion == CALL:
+            lines.append(f'    {var} = self.{attr}()')
+            expr = var
+        elif conversion in _TEMPLATES:
+            lines.append(f'    {var} = self.{attr}')
+            expr = _TEMPLATES[conversion].format(v=var)
+        else:
+            raise ValueError(f'Unknown conversion: {conversion}')
+        items.append(f'{key!r}: {expr}')
+    lines.append('    return {' + ', '.join(items) + '}')
+
+    namespace = {}
+    exec(compile('\n'.join(lines), f'<to_dict {name}>', 'exec'), namespace)
+    func = namespace[name]
+    func.__doc__ = doc
+    return func
@@ -1,12 +1,19 @@
 from datetime import datetime
 import json
 from app import db
+from app.models.serialization import compile_to_dict, RAW, ISOFORMAT, OR_LIST, CALL
 
 
 class Task(db.Model):
     """タスクモデル"""
     
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # エージェントごとの実行中タスクの存在確認用
+        db.Index('idx_tasks_assigned_to_status', 'assigned_to', 'status'),
+        # 親タスク一覧（parent_task_id IS NULL、作成日時の新しい順）
+        db.Index('idx_tasks_parent_task_id_created_at', 'parent_task_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -75,36 +82,40 @@ class Task(db.Model):
     # リレーションシップ
     agent = db.relationship('Agent', foreign_keys=[assigned_to], back_populates='tasks')
     leader_agent = db.relationship('Agent', foreign_keys=[leader_agent_id])
-    parent_task = db.relationship('Task', remote_side=[id], backref=db.backref('subtasks', cascade='all, delete-orphan'))
+    parent_task = db.relationship('Task', remote_side=[id], back_populates='subtasks')
+    subtasks = db.relationship('Task', back_populates='parent_task', cascade='all, delete-orphan', lazy='select')
     execution_logs = db.relationship('ExecutionLog', back_populates='task', lazy='dynamic', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Task {self.title}>'
     
+    # to_dictの基本フィールド（エージェント・サブタスク以外）
+    _base_dict = compile_to_dict('_base_dict', (
+        ('id', 'id', RAW),
+        ('title', 'title', RAW),
+        ('description', 'description', RAW),
+        ('priority', 'priority', RAW),
+        ('status', 'status', RAW),
+        ('detailed_status', 'get_detailed_status', CALL),  # 詳細ステータスを追加
+        ('assigned_to', 'assigned_to', RAW),
+        ('parent_task_id', 'parent_task_id', RAW),
+        ('mode', 'mode', RAW),
+        ('auto_mode', 'auto_mode', RAW),
+        ('additional_tool_names', 'additional_tool_names', OR_LIST),
+        ('team_member_ids', 'team_member_ids', OR_LIST),
+        ('leader_agent_id', 'leader_agent_id', RAW),
+        ('result', 'result', RAW),
+        ('error_message', 'error_message', RAW),
+        ('deadline', 'deadline', ISOFORMAT),
+        ('created_at', 'created_at', ISOFORMAT),
+        ('updated_at', 'updated_at', ISOFORMAT),
+        ('started_at', 'started_at', ISOFORMAT),
+        ('completed_at', 'completed_at', ISOFORMAT),
+    ))
+    
     def to_dict(self, include_subtasks=False):
         """辞書形式に変換"""
-        data = {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'priority': self.priority,
-            'status': self.status,
-            'detailed_status': self.get_detailed_status(),  # 詳細ステータスを追加
-            'assigned_to': self.assigned_to,
-            'parent_task_id': self.parent_task_id,
-            'mode': self.mode,
-            'auto_mode': self.auto_mode,
-            'additional_tool_names': self.additional_tool_names or [],
-            'team_member_ids': self.team_member_ids or [],
-            'leader_agent_id': self.leader_agent_id,
-            'result': self.result,
-            'error_message': self.error_message,
-            'deadline': self.deadline.isoformat() if self.deadline else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'started_at': self.started_at.isoformat() if self.started_at else None,
-            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-        }
+        data = self._base_dict()
         
         # エージェント情報
         if self.agent:
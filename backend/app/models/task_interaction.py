@@ -3,6 +3,7 @@
 """
 from datetime import datetime
 from app import db
+from app.models.serialization import compile_to_dict, RAW, ISOFORMAT
 
 
 class TaskInteraction(db.Model):
@@ -12,6 +13,17 @@ class TaskInteraction(db.Model):
     エージェントの思考過程、ツール実行、ユーザーへの質問などを記録
     """
     __tablename__ = 'task_interactions'
+    __table_args__ = (
+        # タスクごとのインタラクション一覧（作成日時順）・ETag用の集計用
+        db.Index('idx_task_interactions_task_id_created_at', 'task_id', 'created_at'),
+        # 応答待ちインタラクションのみの部分インデックス（応答待ち一覧用）
+        # 条件はクエリ側（requires_response == true()）と同じ形にしないと使用されない
+        db.Index(
+            'idx_task_interactions_pending', 'task_id', 'created_at',
+            sqlite_where=db.text('requires_response = 1 AND response IS NULL'),
+            postgresql_where=db.text('requires_response = true AND response IS NULL')
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'), nullable=False)
@@ -33,7 +45,8 @@ class TaskInteraction(db.Model):
     # 追加のメタデータ（JSON形式）
     # 例: {"tool_name": "web_search", "parameters": {...}}
     # 注: metadataはSQLAlchemyの予約語のためextra_dataを使用
-    extra_data = db.Column(db.JSON, nullable=True)
+    # 常に辞書（未指定時は空の辞書）を保存し、変換時の型チェックを不要にする
+    extra_data = db.Column(db.JSON, nullable=True, default=dict)
     
     # ユーザーの回答が必要か
     requires_response = db.Column(db.Boolean, default=False)
@@ -48,19 +61,38 @@ class TaskInteraction(db.Model):
     # リレーション
     task = db.relationship('Task', backref=db.backref('interactions', lazy='dynamic', cascade='all, delete-orphan'))
     
-    def to_dict(self):
-        """辞書形式に変換"""
-        return {
-            'id': self.id,
-            'task_id': self.task_id,
-            'interaction_type': self.interaction_type,
-            'content': self.content,
-            'metadata': self.extra_data,  # APIではmetadataとして返す
-            'requires_response': self.requires_response,
-            'response': self.response,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'responded_at': self.responded_at.isoformat() if self.responded_at else None
-        }
+    to_dict = compile_to_dict('to_dict', (
+        ('id', 'id', RAW),
+        ('task_id', 'task_id', RAW),
+        ('interaction_type', 'interaction_type', RAW),
+        ('content', 'content', RAW),
+        ('metadata', 'extra_data', RAW),  # APIではmetadataとして返す
+        ('requires_response', 'requires_response', RAW),
+        ('response', 'response', RAW),
+        ('created_at', 'created_at', ISOFORMAT),
+        ('responded_at', 'responded_at', ISOFORMAT),
+    ), doc="辞書形式に変換")
+    
+    # 一覧API用（日時はorjsonがISO 8601形式で直接シリアライズする）
+    to_list_item = compile_to_dict('to_list_item', (
+        ('id', 'id', RAW),
+        ('interaction_type', 'interaction_type', RAW),
+        ('content', 'content', RAW),
+        ('metadata', 'extra_data', RAW),
+        ('requires_response', 'requires_response', RAW),
+        ('response', 'response', RAW),
+        ('created_at', 'created_at', RAW),
+        ('responded_at', 'responded_at', RAW),
+    ), doc="一覧用の辞書に変換")
+    
+    # 応答待ち一覧API用
+    to_pending_item = compile_to_dict('to_pending_item', (
+        ('id', 'id', RAW),
+        ('interaction_type', 'interaction_type', RAW),
+        ('content', 'content', RAW),
+        ('metadata', 'extra_data', RAW),
+        ('created_at', 'created_at', RAW),
+    ), doc="応答待ち一覧用の辞書に変換")
     
     def __repr__(self):
         return f'<TaskInteraction {self.id}: {self.interaction_type}>'
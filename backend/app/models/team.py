@@ -28,8 +28,15 @@ class Team(db.Model):
     def __repr__(self):
         return f'<Team {self.name}>'
     
-    def to_dict(self, include_members=False):
-        """辞書形式に変換"""
+    def to_dict(self, include_members=False, members_by_id=None):
+        """
+        辞書形式に変換
+        
+        Args:
+            include_members: メンバー情報を含める場合はTrue
+            members_by_id: 事前にまとめて取得したメンバー情報（エージェントID→{id, name, role}）
+                           Noneの場合はここでメンバーを取得
+        """
         data = {
             'id': self.id,
             'name': self.name,
@@ -51,15 +58,30 @@ class Team(db.Model):
         
         # メンバー情報（詳細が必要な場合）
         if include_members and self.member_ids:
-            from app.models.agent import Agent
-            members = Agent.query.filter(Agent.id.in_(self.member_ids)).all()
+            if members_by_id is None:
+                members_by_id = self.get_members_by_id(self.member_ids)
             data['members'] = [
-                {
-                    'id': member.id,
-                    'name': member.name,
-                    'role': member.role
-                }
-                for member in members
+                members_by_id[member_id]
+                for member_id in sorted(set(self.member_ids))
+                if member_id in members_by_id
             ]
         
         return data
+    
+    @staticmethod
+    def get_members_by_id(member_ids):
+        """
+        メンバー情報をまとめて取得（複数チームのメンバーも1回のクエリで取得）
+        
+        Args:
+            member_ids: エージェントIDのイテラブル
+            
+        Returns:
+            Dict[int, Dict]: エージェントID→{id, name, role}
+        """
+        from app.models.agent import Agent
+        member_ids = set(member_ids)
+        if not member_ids:
+            return {}
+        rows = db.session.query(Agent.id, Agent.name, Agent.role).filter(Agent.id.in_(member_ids)).all()
+        return {row.id: row._asdict() for row in rows}
@@ -33,8 +33,16 @@ class Tool(db.Model):
     def __repr__(self):
         return f'<Tool {self.name}>'
     
-    def to_dict(self):
-        """辞書形式に変換"""
+    def to_dict(self, usage_count=None):
+        """
+        辞書形式に変換
+        
+        Args:
+            usage_count: 事前に集計した使用回数（Noneの場合はここでCOUNTクエリを発行）
+        """
+        if usage_count is None:
+            usage_count = self.get_usage_count()
+        
         return {
             'id': self.id,
             'name': self.name,
@@ -46,7 +54,7 @@ class Tool(db.Model):
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'usage_count': self.get_usage_count()
+            'usage_count': usage_count
         }
     
     def get_usage_count(self):
@@ -20,6 +20,11 @@ class ToolApprovalRequest(db.Model):
     responded_at = db.Column(db.DateTime, nullable=True)
     response_note = db.Column(db.Text, nullable=True)
     
+    __table_args__ = (
+        # 承認リクエスト一覧（ステータス・エージェントで絞り込み、新しい順）用
+        db.Index('ix_approval_status_agent_requested', status, agent_id, requested_at.desc()),
+    )
+    
     # Relationships
     agent = db.relationship('Agent', backref='tool_approval_requests')
     task = db.relationship('Task', backref='tool_approval_requests')
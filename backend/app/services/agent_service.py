@@ -1,5 +1,5 @@
 from app import db
-from app.models import Agent
+from app.models import Agent, Task
 
 
 class AgentService:
@@ -61,9 +61,11 @@ class AgentService:
         if not agent:
             raise ValueError(f'Agent {agent_id} not found')
         
-        # 実行中のタスクがある場合は削除できない
-        running_tasks = agent.tasks.filter_by(status='running').count()
-        if running_tasks > 0:
+        # 実行中のタスクがある場合は削除できない（EXISTSで最初の1件が見つかれば打ち切る）
+        has_running_tasks = db.session.query(
+            db.exists().where(Task.assigned_to == agent_id, Task.status == 'running')
+        ).scalar()
+        if has_running_tasks:
             raise ValueError('Cannot delete agent with running tasks')
         
         db.session.delete(agent)
@@ -84,16 +86,19 @@ class AgentService:
         
         return query.all()
     
-    def get_workers(self, supervisor_id):
-        """Supervisorのワーカーエージェント一覧を取得"""
-        supervisor = Agent.query.get(supervisor_id)
-        if not supervisor:
+    def check_supervisor(self, supervisor_id):
+        """指定したエージェントがSupervisorであることを確認（エージェントタイプのみ取得）"""
+        agent_type = db.session.query(Agent.agent_type).filter(Agent.id == supervisor_id).scalar()
+        if agent_type is None:
             raise ValueError(f'Agent {supervisor_id} not found')
         
-        if supervisor.agent_type != 'supervisor':
+        if agent_type != 'supervisor':
             raise ValueError(f'Agent {supervisor_id} is not a supervisor')
-        
-        return supervisor.workers
+    
+    def get_workers(self, supervisor_id):
+        """Supervisorのワーカーエージェント一覧を取得"""
+        self.check_supervisor(supervisor_id)
+        return Agent.query.filter_by(supervisor_id=supervisor_id).all()
     
     def assign_supervisor(self, worker_id, supervisor_id):
         """ワーカーエージェントにSupervisorを割り当て"""
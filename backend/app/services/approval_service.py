@@ -5,6 +5,7 @@ Approval Service
 import time
 from datetime import datetime
 from typing import List, Optional
+from sqlalchemy.orm import selectinload
 from app import db
 from app.models.tool_approval import ToolApprovalRequest
 from app.websocket.events import emit_tool_approval_request
@@ -163,7 +164,11 @@ class ApprovalService:
         Returns:
             承認リクエストのリスト
         """
-        query = ToolApprovalRequest.query.filter_by(status='pending')
+        # to_dictが参照するエージェント・タスクは一括ロード
+        query = ToolApprovalRequest.query.options(
+            selectinload(ToolApprovalRequest.agent),
+            selectinload(ToolApprovalRequest.task)
+        ).filter_by(status='pending')
         
         if agent_id:
             query = query.filter_by(agent_id=agent_id)
@@ -6,7 +6,6 @@ from datetime import datetime
 from typing import Dict, Any, List
 import threading
 import os
-import sqlite3
 from app import db
 from app.models import Task, Agent, ExecutionLog, TaskInteraction
 from app.services.llm_service import LLMService
@@ -14,15 +13,17 @@ from app.services.tool_service import ToolService
 from app.agents.langgraph_agent import LangGraphAgent
 from app.agents.supervisor_agent import SupervisorAgent
 from app.agents.dynamic_team_agent import DynamicTeamAgent
+from app.agents.checkpointer import get_checkpointer
 from app.tools import ToolRegistry, create_human_input_tool
 from app.websocket.events import (
     emit_task_interaction_new,
     emit_task_started,
     emit_task_progress,
     emit_task_completed,
-    emit_task_failed
+    emit_task_failed,
+    emit_agent_token
 )
-from langgraph.checkpoint.sqlite import SqliteSaver
+from langchain_core.messages import AIMessageChunk
 
 
 class ExecutionService:
@@ -39,8 +40,89 @@ class ExecutionService:
         # タスクIDとスレッドのマッピング
         self.running_threads = {}
     
+    def dispatch_task(self, task_id: int):
+        """
+        タスクの実行を開始（TASK_EXECUTION_BACKENDに応じてCeleryワーカーまたはスレッドで実行）
+        
+        Args:
+            task_id: タスクID
+        """
+        from flask import current_app
+        
+        if current_app.config.get('TASK_EXECUTION_BACKEND') == 'celery':
+            from app.celery_tasks import TASK_EXECUTION_QUEUE, run_task
+            run_task.apply_async(args=[task_id], queue=TASK_EXECUTION_QUEUE)
+            return {"message": "Task execution queued"}
+        return self.execute_task_async(task_id)
+    
+    def dispatch_resume(self, task_id: int, message: str):
+        """
+        完了/失敗したタスクの再開を開始（TASK_EXECUTION_BACKENDに応じてCeleryワーカーまたはスレッドで実行）
+        
+        Args:
+            task_id: タスクID
+            message: 再開時の追加指示（ユーザーのメッセージ）
+        """
+        from flask import current_app
+        
+        if current_app.config.get('TASK_EXECUTION_BACKEND') == 'celery':
+            from app.celery_tasks import TASK_EXECUTION_QUEUE, resume_task
+            resume_task.apply_async(args=[task_id, message], queue=TASK_EXECUTION_QUEUE)
+            return {"message": "Task resume queued"}
+        return self._run_in_background(task_id, lambda: self.resume_task(task_id, message))
+    
+    def resume_task(self, task_id: int, message: str):
+        """
+        完了/失敗したタスクをユーザーのメッセージを追加指示として再実行
+        
+        タスクの説明を追加指示の形に書き換えてから実行します。
+        他のリクエストが先に再開していた場合（既に完了/失敗ではない場合）は何もしません。
+        
+        Args:
+            task_id: タスクID
+            message: 追加指示（ユーザーのメッセージ）
+            
+        Returns:
+            Optional[Dict[str, Any]]: 実行結果（再開しなかった場合はNone）
+        """
+        original_description = db.session.query(Task.description).filter(Task.id == task_id).scalar()
+        
+        # タスクの説明を更新（ユーザーのメッセージを新しいタスクとして実行）
+        # 前回の結果を参照するように指示を追加
+        description = f"""前回のタスク結果を参照して、以下の追加指示に従ってください：
+
+【追加指示】
+{message}
+
+【注意】
+- 前回の会話履歴と結果を参照してください
+- 元のタスク: {original_description}
+- 新しいタスクを最初から実行するのではなく、前回の結果を基に追加指示に応答してください"""
+        
+        # 完了/失敗のままの場合のみ再開（同じタスクの二重再開を防ぐ）
+        resumed = Task.query.filter(
+            Task.id == task_id,
+            Task.status.in_(['completed', 'failed'])
+        ).update({'description': description, 'status': 'running'}, synchronize_session=False)
+        db.session.commit()
+        
+        if not resumed:
+            return None
+        return self.execute_task(task_id)
+    
     def execute_task_async(self, task_id: int):
         """タスクをバックグラウンドスレッドで実行"""
+        self._run_in_background(task_id, lambda: self.execute_task(task_id))
+        return {"message": "Task execution started in background"}
+    
+    def _run_in_background(self, task_id: int, target):
+        """
+        タスクの処理をバックグラウンドスレッドで実行
+        
+        Args:
+            task_id: タスクID
+            target: スレッド内（アプリケーションコンテキスト内）で呼び出す関数
+        """
         def run_in_thread():
             # 新しいアプリケーションコンテキストを作成
             from app import create_app, socketio
@@ -49,7 +131,7 @@ class ExecutionService:
                 # SocketIOのアプリケーションコンテキストも設定
                 with app.test_request_context():
                     try:
-                        self.execute_task(task_id)
+                        target()
                     except Exception as e:
                         print(f"Error in background task execution: {e}")
                         import traceback
@@ -150,12 +232,6 @@ class ExecutionService:
             print(f"  - Has api_key: {'api_key' in llm_config}")
             print(f"  - Has base_url: {'base_url' in llm_config}")
             
-            # データベースパスを設定（タスクごとに異なるthread_idを使用するため、共通のDBを使用）
-            import os
-            data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-            os.makedirs(data_dir, exist_ok=True)
-            db_path = os.path.join(data_dir, "agent_memory.db")
-            
             langgraph_agent = LangGraphAgent(
                 agent_config={
                     'name': agent.name,
@@ -165,8 +241,8 @@ class ExecutionService:
                 llm_provider=agent.llm_provider,
                 llm_config=llm_config,
                 tools=tools,
-                enable_memory=True,
-                db_path=db_path
+                # タスクごとに異なるthread_idを使用するため、共通のデフォルトDBを使用
+                enable_memory=True
             )
             
             # タスクを実行
@@ -482,7 +558,7 @@ class ExecutionService:
             task_id=task_id,
             interaction_type=interaction_type,
             content=content,
-            metadata=metadata or {},
+            extra_data=metadata or {},
             requires_response=requires_response,
             created_at=datetime.utcnow()
         )
@@ -592,14 +668,8 @@ class ExecutionService:
             for worker in workers:
                 print(f"  - {worker.name} ({worker.role})")
                 
-                # データベースパスを設定
-            data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-            os.makedirs(data_dir, exist_ok=True)
-            db_path = os.path.join(data_dir, "agent_memory.db")
-            
-            # SqliteSaverを作成
-            conn = sqlite3.connect(db_path, check_same_thread=False)
-            checkpointer = SqliteSaver(conn)
+            # 共有のSqliteSaverを取得（WALモードの長寿命接続）
+            checkpointer = get_checkpointer()
             
             # SupervisorAgentを作成（ToolRegistryはクラスメソッドで使用されるため、インスタンスは不要）
             # 各ワーカーのLLM設定を取得して設定
@@ -834,14 +904,8 @@ class ExecutionService:
             for member in members:
                 print(f"  - {member.name} ({member.role})")
             
-            # データベースパスを設定
-            data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-            os.makedirs(data_dir, exist_ok=True)
-            db_path = os.path.join(data_dir, "agent_memory.db")
-            
-            # SqliteSaverを作成
-            conn = sqlite3.connect(db_path, check_same_thread=False)
-            checkpointer = SqliteSaver(conn)
+            # 共有のSqliteSaverを取得（WALモードの長寿命接続）
+            checkpointer = get_checkpointer()
             
             # リーダーとメンバーのLLM設定を取得してLLMインスタンスを作成
             leader_llm_config = self._get_llm_config(leader)
@@ -938,7 +1002,19 @@ class ExecutionService:
             final_state = None
             print("Starting stream_execute loop...")
             step_count = 0
-            for step in team_agent.stream_execute(task.description):
+            for mode, step in team_agent.stream_execute(task.description):
+                if mode == 'messages':
+                    # LLMのトークン出力をそのままWebSocketへ転送
+                    chunk, chunk_metadata = step
+                    if isinstance(chunk, AIMessageChunk) and isinstance(chunk.content, str) and chunk.content:
+                        emit_agent_token(
+                            task.id,
+                            chunk_metadata.get('langgraph_node', ''),
+                            chunk_metadata.get('agent_name', ''),
+                            chunk.content
+                        )
+                    continue
+                
                 step_count += 1
                 print(f"Stream step {step_count}: {list(step.keys()) if step else 'empty'}")
                 
@@ -954,7 +1030,6 @@ class ExecutionService:
                     if messages:
                         last_message = messages[-1]
                         content = getattr(last_message, 'content', str(last_message))
-                        print(f"Logging interaction: [{node_name}] {content[:100]}...")
                         self._log_interaction(
                             task_id=task.id,
                             interaction_type='info',
@@ -1,7 +1,7 @@
 """
 ツールモジュール（LangChain標準）
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from langchain_core.tools import BaseTool
 from app.tools.web_search_tool import WebSearchTool
 from app.tools.file_tool import FileReadTool, FileWriteTool, FileListTool
@@ -18,6 +18,10 @@ class ToolRegistry:
     
     _tools: List[BaseTool] = []
     _tool_metadata: Dict[str, Dict[str, Any]] = {}
+    # 登録内容の変更ごとに増えるバージョン（ツール情報のキャッシュの無効化に使用）
+    _version: int = 0
+    # (バージョン, ツール情報のリスト, ツール名 -> ツール情報)
+    _tools_info_cache: Tuple[int, List[Dict[str, Any]], Dict[str, Dict[str, Any]]] = (-1, [], {})
     
     @classmethod
     def register(cls, tool_instance: BaseTool, category: str = "general", metadata: Dict[str, Any] | None = None):
@@ -36,6 +40,7 @@ class ToolRegistry:
             "is_mcp": False,
             **(metadata or {})
         }
+        cls._version += 1
     
     @classmethod
     def register_mcp_tool(cls, tool_instance: BaseTool, category: str = "mcp", metadata: Dict[str, Any] | None = None):
@@ -54,6 +59,7 @@ class ToolRegistry:
             "is_mcp": True,
             **(metadata or {})
         }
+        cls._version += 1
     
     @classmethod
     def get_tool(cls, name: str) -> BaseTool:
@@ -81,14 +87,61 @@ class ToolRegistry:
         """
         return cls._tools.copy()
     
+    @classmethod
+    def version(cls) -> int:
+        """
+        登録内容のバージョンを取得（ツールの登録・クリアのたびに変わる）
+        
+        Returns:
+            int: バージョン
+        """
+        return cls._version
+    
     @classmethod
     def get_tools_info(cls) -> List[Dict[str, Any]]:
         """
         すべてのツール情報を取得（フロントエンド用）
         
+        登録内容が変わるまでは同じリストを返すため、呼び出し元で変更しないでください。
+        
         Returns:
             List[Dict]: ツール情報のリスト
         """
+        return cls._get_tools_info_cache()[1]
+    
+    @classmethod
+    def get_tool_info(cls, name: str) -> Dict[str, Any] | None:
+        """
+        名前でツール情報を取得（フロントエンド用）
+        
+        Args:
+            name: ツール名
+            
+        Returns:
+            Optional[Dict]: ツール情報（見つからない場合はNone）
+        """
+        return cls._get_tools_info_cache()[2].get(name)
+    
+    @classmethod
+    def _get_tools_info_cache(cls):
+        """現在のバージョンのツール情報のキャッシュを取得（登録内容が変わっていれば作り直す）"""
+        cache = cls._tools_info_cache
+        if cache[0] == cls._version:
+            return cache
+        
+        version = cls._version
+        tools_info = cls._build_tools_info()
+        by_name = {}
+        for info in tools_info:
+            # 同名のツールが複数ある場合はget_toolと同じく先に登録されたものを使用
+            by_name.setdefault(info["name"], info)
+        cache = (version, tools_info, by_name)
+        cls._tools_info_cache = cache
+        return cache
+    
+    @classmethod
+    def _build_tools_info(cls) -> List[Dict[str, Any]]:
+        """登録済みツールの情報のリストを作成"""
         tools_info = []
         for tool in cls._tools:
             metadata = cls._tool_metadata.get(tool.name, {})
@@ -136,6 +189,7 @@ class ToolRegistry:
         """すべてのツールをクリア"""
         cls._tools = []
         cls._tool_metadata = {}
+        cls._version += 1
 
 
 # 基本ツールを登録
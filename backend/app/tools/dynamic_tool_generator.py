@@ -5,11 +5,63 @@ import json
 import re
 import sys
 import subprocess
-from typing import Dict, Any, Optional, List
+from typing import AsyncIterator, Dict, Any, Optional, List
 from langchain_core.tools import BaseTool
 from langchain_core.language_models import BaseChatModel
 
 
+def validate_code(code: str) -> tuple[bool, str]:
+    """
+    ツールのコードを検証（構文・危険なパターン・必須要素）
+    
+    プロセスプールから呼び出せるよう（picklableにするため）モジュールレベルに定義しています。
+    
+    Args:
+        code: ツールのPythonコード
+    
+    Returns:
+        tuple[bool, str]: (検証に成功したか, エラーメッセージ)
+    """
+    try:
+        # 構文チェック
+        compile(code, '<string>', 'exec')
+        
+        # 危険なコードのチェック
+        dangerous_patterns = [
+            r'\beval\s*\(',
+            r'\bexec\s*\(',
+            r'__import__',
+            r'os\.system',
+            r'subprocess\.call',
+            r'subprocess\.run',
+            r'subprocess\.Popen',
+            r'\bopen\s*\([^)]*["\']w',  # ファイル書き込み
+            r'rm\s+-rf',
+            r'del\s+',
+        ]
+        
+        for pattern in dangerous_patterns:
+            if re.search(pattern, code):
+                return False, f"Dangerous pattern detected: {pattern}"
+        
+        # 必須要素のチェック
+        if 'class' not in code:
+            return False, "No class definition found"
+        
+        if 'BaseTool' not in code:
+            return False, "Class must inherit from BaseTool"
+        
+        if 'def _run' not in code:
+            return False, "_run method not found"
+        
+        return True, ""
+    
+    except SyntaxError as e:
+        return False, f"Syntax error: {str(e)}"
+    except Exception as e:
+        return False, f"Validation error: {str(e)}"
+
+
 class DynamicToolGenerator:
     """
     AIを使用して動的にツールを生成
@@ -55,13 +107,69 @@ class DynamicToolGenerator:
         
         return dynamic_tool, tool_code
     
+    async def stream_tool_from_description(
+        self,
+        description: str,
+        user_requirements: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        自然言語の説明からツールを生成し、途中経過をイベントとして順に返す
+        
+        generate_tool_from_descriptionと同じ手順で、LLMの出力をトークン単位で返します。
+        
+        Args:
+            description: ツールの説明（自然言語）
+            user_requirements: 追加要件
+            
+        Yields:
+            Dict[str, Any]: 以下のいずれかのイベント
+                - {"event": "stage", "stage": "spec" | "code" | "validate"}
+                - {"event": "token", "stage": "spec" | "code", "content": str}
+                - {"event": "tool", "tool": BaseTool, "code": str}（最後に1回）
+        """
+        # Step 1: AIにツール仕様を生成させる
+        yield {"event": "stage", "stage": "spec"}
+        chunks = []
+        async for chunk in self.llm.astream(self._tool_spec_prompt(description, user_requirements)):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield {"event": "token", "stage": "spec", "content": chunk.content}
+        tool_spec = self._parse_tool_spec("".join(chunks))
+        
+        # Step 2: AIにPythonコードを生成させる
+        yield {"event": "stage", "stage": "code"}
+        chunks = []
+        async for chunk in self.llm.astream(self._tool_code_prompt(tool_spec)):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield {"event": "token", "stage": "code", "content": chunk.content}
+        tool_code = self._clean_tool_code("".join(chunks))
+        
+        # Step 3: コードを検証
+        yield {"event": "stage", "stage": "validate"}
+        is_valid, error = self._validate_code(tool_code)
+        if not is_valid:
+            raise ValueError(f"Generated code is invalid: {error}")
+        
+        # Step 4: DynamicToolを作成
+        yield {"event": "tool", "tool": self._create_dynamic_tool(tool_spec, tool_code), "code": tool_code}
+    
     async def _generate_tool_spec(
         self,
         description: str,
         user_requirements: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """ツール仕様を生成"""
-        prompt = f"""あなたはツール設計の専門家です。以下の説明から、LangChain標準ツールの仕様を生成してください。
+        response = await self.llm.ainvoke(self._tool_spec_prompt(description, user_requirements))
+        return self._parse_tool_spec(response.content)
+    
+    def _tool_spec_prompt(
+        self,
+        description: str,
+        user_requirements: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """ツール仕様生成用のプロンプトを作成"""
+        return f"""あなたはツール設計の専門家です。以下の説明から、LangChain標準ツールの仕様を生成してください。
 
 ユーザーの説明:
 {description}
@@ -87,10 +195,9 @@ class DynamicToolGenerator:
     "dependencies": ["必要なPythonパッケージ（標準ライブラリ以外）"],
     "implementation_notes": "実装時の注意点"
 }}"""
-        
-        response = await self.llm.ainvoke(prompt)
-        content = response.content
-        
+    
+    def _parse_tool_spec(self, content: str) -> Dict[str, Any]:
+        """LLMの出力からツール仕様（JSON）を取り出す"""
         # JSONを抽出
         json_match = re.search(r'\{.*\}', content, re.DOTALL)
         if json_match:
@@ -102,7 +209,12 @@ class DynamicToolGenerator:
     
     async def _generate_tool_code(self, tool_spec: Dict[str, Any]) -> str:
         """ツールのPythonコードを生成"""
-        prompt = f"""以下のツール仕様に基づいて、LangChain標準のBaseToolを継承したPythonクラスを生成してください。
+        response = await self.llm.ainvoke(self._tool_code_prompt(tool_spec))
+        return self._clean_tool_code(response.content)
+    
+    def _tool_code_prompt(self, tool_spec: Dict[str, Any]) -> str:
+        """コード生成用のプロンプトを作成"""
+        return f"""以下のツール仕様に基づいて、LangChain標準のBaseToolを継承したPythonクラスを生成してください。
 
 ツール仕様:
 {json.dumps(tool_spec, indent=2, ensure_ascii=False)}
@@ -119,10 +231,9 @@ class DynamicToolGenerator:
 
 Pythonコードのみを出力してください（```pythonなどのマークダウン記法不要）:
 """
-        
-        response = await self.llm.ainvoke(prompt)
-        tool_code = response.content
-        
+    
+    def _clean_tool_code(self, tool_code: str) -> str:
+        """LLMの出力からマークダウンのコードブロック記法を取り除く"""
         # マークダウンのコードブロックを削除
         tool_code = re.sub(r'```python\n?', '', tool_code)
         tool_code = re.sub(r'```\n?', '', tool_code)
@@ -132,44 +243,7 @@ Pythonコードのみを出力してください（```pythonなどのマーク
     
     def _validate_code(self, code: str) -> tuple[bool, str]:
         """生成されたコードを検証"""
-        try:
-            # 構文チェック
-            compile(code, '<string>', 'exec')
-            
-            # 危険なコードのチェック
-            dangerous_patterns = [
-                r'\beval\s*\(',
-                r'\bexec\s*\(',
-                r'__import__',
-                r'os\.system',
-                r'subprocess\.call',
-                r'subprocess\.run',
-                r'subprocess\.Popen',
-                r'\bopen\s*\([^)]*["\']w',  # ファイル書き込み
-                r'rm\s+-rf',
-                r'del\s+',
-            ]
-            
-            for pattern in dangerous_patterns:
-                if re.search(pattern, code):
-                    return False, f"Dangerous pattern detected: {pattern}"
-            
-            # 必須要素のチェック
-            if 'class' not in code:
-                return False, "No class definition found"
-            
-            if 'BaseTool' not in code:
-                return False, "Class must inherit from BaseTool"
-            
-            if 'def _run' not in code:
-                return False, "_run method not found"
-            
-            return True, ""
-            
-        except SyntaxError as e:
-            return False, f"Syntax error: {str(e)}"
-        except Exception as e:
-            return False, f"Validation error: {str(e)}"
+        return validate_code(code)
     
     def _extract_imports(self, code: str) -> List[str]:
         """
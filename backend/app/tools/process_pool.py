@@ -0,0 +1,149 @@
+"""
+CPU負荷の高いツールのプロセスプール実行
+
+ツールの metadata に {"cpu_bound": True} が設定されている場合、
+ツール本体の実行を別プロセスで行い、GILに縛られずに並列実行できるようにします。
+ツールコードの検証など短時間で終わる処理は、run_in_process でツールとは別の小さなプールで実行します。
+"""
+import logging
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+logger = logging.getLogger(__name__)
+
+# 子プロセスの起動方法
+# サーバープロセスは多数のスレッド（gthreadワーカー・ログのフラッシュ・イベントループ）を持つため、
+# 他のスレッドが保持していたロック（ロギングのハンドラ等）を引き継いでデッドロックしないよう、forkは使用しない
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# プロセス数の上限（Gunicornのワーカーごとにプールが作られるため、CPUコア数より小さく抑える）
+_MAX_WORKERS = int(os.getenv('TOOL_PROCESS_POOL_WORKERS', min(4, os.cpu_count() or 1)))
+
+# run_in_process 用のプロセス数（実行時間の制限の無いcpu_boundツールの実行待ちに巻き込まれないよう別プールにする）
+_SHORT_TASK_WORKERS = 2
+
+_executor: ProcessPoolExecutor | None = None
+_short_task_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """共有のProcessPoolExecutorを取得（初回呼び出し時に生成）"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=_MAX_WORKERS,
+                mp_context=multiprocessing.get_context(_START_METHOD)
+            )
+        return _executor
+
+
+def _get_short_task_executor() -> ProcessPoolExecutor:
+    """run_in_process 用のProcessPoolExecutorを取得（初回呼び出し時に生成）"""
+    global _short_task_executor
+    with _executor_lock:
+        if _short_task_executor is None:
+            _short_task_executor = ProcessPoolExecutor(
+                max_workers=_SHORT_TASK_WORKERS,
+                mp_context=multiprocessing.get_context(_START_METHOD)
+            )
+        return _short_task_executor
+
+
+def _call_with_time_limit(fn: Callable[..., Any], args: tuple, seconds: Optional[float]) -> Any:
+    """
+    子プロセスで実行時間を制限して関数を呼び出す（制限時間は実行開始から数える）
+
+    SIGALRMの使えない環境（Windows）では制限せずに実行します。
+    """
+    if seconds is None or not hasattr(signal, "setitimer"):
+        return fn(*args)
+
+    def on_timeout(signum, frame):
+        raise TimeoutError(f"Timed out after {seconds} seconds")
+
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        return fn(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def run_in_process(fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+    """
+    短時間で終わる関数を専用のプロセスプールで実行し、結果を待つ
+
+    タイムアウトは子プロセスで関数の実行が始まってから数えるため、
+    実行待ちや子プロセスの起動にかかった時間は含みません。
+
+    Args:
+        fn: 実行する関数（picklableにするためモジュールレベルに定義されたもの）
+        *args: 関数の引数
+        timeout: 実行時間の上限秒数（Noneの場合は無制限）
+
+    Returns:
+        Any: 関数の戻り値
+
+    Raises:
+        TimeoutError: 実行時間が上限を超えた場合
+    """
+    return _get_short_task_executor().submit(_call_with_time_limit, fn, args, timeout).result()
+
+
+def _invoke_tool(tool: BaseTool, tool_input: Dict[str, Any]) -> Any:
+    """子プロセスでツールを実行（picklableにするためモジュールレベルに定義）"""
+    return tool.invoke(tool_input)
+
+
+def is_cpu_bound(tool: BaseTool) -> bool:
+    """ツールがCPUバウンドとして宣言されているか"""
+    return bool((tool.metadata or {}).get("cpu_bound", False))
+
+
+def offload_cpu_bound_tools(tools: List[BaseTool]) -> List[BaseTool]:
+    """
+    CPUバウンドなツールをプロセスプールで実行するツールに置き換える
+
+    pickleできないツール（動的生成ツールなど）や引数スキーマの無いツールはそのまま返します。
+
+    Args:
+        tools: ツールのリスト
+
+    Returns:
+        List[BaseTool]: 置き換え後のツールのリスト
+    """
+    result = []
+    for tool in tools:
+        # 引数スキーマが無いツールは置き換え先の引数を定義できないため対象外
+        if not is_cpu_bound(tool) or tool.args_schema is None:
+            result.append(tool)
+            continue
+
+        try:
+            pickle.dumps(tool)
+        except Exception as e:
+            logger.warning("Tool %s is cpu_bound but not picklable, running in-thread: %s", tool.name, e)
+            result.append(tool)
+            continue
+
+        def _invoke_in_pool(_tool: BaseTool = tool, **kwargs: Any) -> Any:
+            return _get_executor().submit(_invoke_tool, _tool, kwargs).result()
+
+        result.append(StructuredTool.from_function(
+            func=_invoke_in_pool,
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            metadata=tool.metadata,
+        ))
+    return result
@@ -82,6 +82,16 @@ def emit_task_completed(task_id, result):
     }, room=f'task_{task_id}')
 
 
+def emit_agent_token(task_id, node, agent_name, token):
+    """LLMのトークン受信イベントを送信"""
+    socketio.emit('agent_token', {
+        'task_id': task_id,
+        'node': node,
+        'agent_name': agent_name,
+        'token': token
+    }, room=f'task_{task_id}')
+
+
 def emit_task_failed(task_id, error):
     """タスク失敗イベントを送信"""
     socketio.emit('task_failed', {
@@ -135,7 +145,7 @@ def emit_task_interaction_new(task_id, interaction):
             'id': interaction.id,
             'interaction_type': interaction.interaction_type,
             'content': interaction.content,
-            'metadata': interaction.metadata,
+            'metadata': interaction.extra_data,
             'requires_response': interaction.requires_response,
             'created_at': interaction.created_at.isoformat() if interaction.created_at else None
         }
@@ -0,0 +1,45 @@
+"""
+Gunicorn設定（本番環境用）
+
+起動: gunicorn -c gunicorn.conf.py run:app
+
+各値は環境変数で上書きできます。
+WebSocket（Flask-SocketIO, threadingモード）は1接続につき1スレッドを使用するため、
+gthreadワーカーのスレッド数は同時接続数に合わせて設定してください。
+
+ワーカーを複数にする場合は以下が必要です。
+- TASK_EXECUTION_BACKEND=celery（実行中タスクのスレッドがワーカーの再起動で中断されないように）
+- SOCKETIO_MESSAGE_QUEUE（他のワーカー・Celeryワーカーからの送信を中継）
+- ロードバランサーのスティッキーセッション（Socket.IOのlong-pollingは同じワーカーに届く必要がある）
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', 5000)}")
+
+# 上記の前提を満たさない構成では1ワーカーで起動する（満たす場合の目安: CPUコア数 × 2 + 1）
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 50))
+
+# アプリケーション（ORMのメタデータ・Celeryアプリなど）をマスターで一度だけ読み込み、ワーカーで共有する
+preload_app = True
+
+# 長時間稼働によるメモリ増加を抑えるため、一定数のリクエストごとにワーカーを再起動
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """マスターで作成されたDB接続をワーカー間で共有しないよう破棄する"""
+    from app import db
+    from run import app
+
+    with app.app_context():
+        db.engine.dispose()
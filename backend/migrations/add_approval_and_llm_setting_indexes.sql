@@ -0,0 +1,10 @@
+-- 承認リクエスト一覧・LLM設定検索用インデックスの追加
+-- 実行日: 2026-10-16
+
+-- 承認リクエスト一覧（status・agent_idで絞り込み、requested_atの新しい順）
+CREATE INDEX IF NOT EXISTS ix_approval_status_agent_requested
+    ON tool_approval_requests(status, agent_id, requested_at DESC);
+
+-- 有効なLLM設定の検索（provider・is_active）
+CREATE INDEX IF NOT EXISTS ix_llmsetting_provider_active
+    ON llm_settings(provider, is_active);
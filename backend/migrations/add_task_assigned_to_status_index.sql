@@ -0,0 +1,5 @@
+-- エージェントごとのタスク状態検索用インデックスの追加
+-- 実行日: 2026-10-16
+
+-- 実行中タスクの存在確認（agents削除時）などで使用
+CREATE INDEX IF NOT EXISTS idx_tasks_assigned_to_status ON tasks(assigned_to, status);
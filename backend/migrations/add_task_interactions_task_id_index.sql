@@ -0,0 +1,5 @@
+-- タスクごとのインタラクション検索用インデックスの追加
+-- 実行日: 2026-10-16
+
+-- インタラクション一覧の取得（作成日時順）とETag用の集計で使用
+CREATE INDEX IF NOT EXISTS idx_task_interactions_task_id_created_at ON task_interactions(task_id, created_at);
@@ -0,0 +1,15 @@
+-- タスク一覧・応答待ちインタラクション検索用インデックスの追加
+-- 実行日: 2026-10-16
+
+-- 親タスク一覧（parent_task_id IS NULL、created_atの新しい順）
+CREATE INDEX IF NOT EXISTS idx_tasks_parent_task_id_created_at ON tasks(parent_task_id, created_at);
+
+-- 応答待ちインタラクション（応答待ちの行のみを含む部分インデックス）
+-- SQLite
+CREATE INDEX IF NOT EXISTS idx_task_interactions_pending
+    ON task_interactions(task_id, created_at)
+    WHERE requires_response = 1 AND response IS NULL;
+-- PostgreSQLの場合は以下を使用
+-- CREATE INDEX IF NOT EXISTS idx_task_interactions_pending
+--     ON task_interactions(task_id, created_at)
+--     WHERE requires_response = true AND response IS NULL;
@@ -0,0 +1,10 @@
+-- インタラクションのメタデータ（extra_data）を辞書に統一
+-- 実行日: 2026-10-16
+
+-- NULL・辞書以外の値を空の辞書に置き換える（APIは変換時に型チェックを行わない）
+-- SQLite
+UPDATE task_interactions SET extra_data = '{}'
+    WHERE extra_data IS NULL OR json_type(extra_data) != 'object';
+-- PostgreSQLの場合は以下を使用
+-- UPDATE task_interactions SET extra_data = '{}'
+--     WHERE extra_data IS NULL OR json_typeof(extra_data) != 'object';
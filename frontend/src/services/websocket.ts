@@ -6,6 +6,7 @@ import type {
   TaskFailedEvent,
   AgentStatusChangedEvent,
   LogMessageEvent,
+  AgentTokenEvent,
 } from '@/types'
 
 class WebSocketService {
@@ -80,6 +81,11 @@ class WebSocketService {
       this.emit('log_message', data)
     })
 
+    // LLM token streaming events
+    this.socket.on('agent_token', (data: AgentTokenEvent) => {
+      this.emit('agent_token', data)
+    })
+
     // Task interaction events
     this.socket.on('task_interaction_new', (data: any) => {
       this.emit('task_interaction_new', data)
@@ -174,3 +174,10 @@ export interface LogMessageEvent {
   task_id: number
   log: ExecutionLog
 }
+
+export interface AgentTokenEvent {
+  task_id: number
+  node: string
+  agent_name: string
+  token: string
+}